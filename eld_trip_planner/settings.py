@@ -37,6 +37,10 @@ CORS_ALLOWED_ORIGINS = [
     "https://eld-trip-planner-frontend.vercel.app"  # Allow your frontend to access Django on Vercel
 ]
 
+# Serverless deployments set API_ONLY=True to boot only what the JSON API needs: no admin,
+# sessions, messages, static files or template engine. Run `manage.py startup_profile` to compare.
+API_ONLY = config('API_ONLY', default=False, cast=bool)
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -51,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'planner.middleware.ServerTimingMiddleware',  # Outermost so its total covers the whole request
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -61,6 +66,20 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if API_ONLY:
+    INSTALLED_APPS = [
+        'planner',
+        'corsheaders'
+    ]
+
+    MIDDLEWARE = [
+        'planner.middleware.ServerTimingMiddleware',
+        'django.middleware.security.SecurityMiddleware',
+        'corsheaders.middleware.CorsMiddleware',
+        'django.middleware.common.CommonMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    ]
+
 ROOT_URLCONF = 'eld_trip_planner.urls'
 
 TEMPLATES = [
@@ -79,6 +98,9 @@ TEMPLATES = [
     },
 ]
 
+if API_ONLY:
+    TEMPLATES = []
+
 WSGI_APPLICATION = 'eld_trip_planner.wsgi.application'
 
 
@@ -136,3 +158,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 STATIC_ROOT = BASE_DIR / "staticfiles_build" / "static"
 
+REST_FRAMEWORK = {
+    # DRF's defaults, with JSON rendering timed for the Server-Timing header (PLANNER_METRICS=True)
+    'DEFAULT_RENDERER_CLASSES': [
+        'planner.renderers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+if API_ONLY:
+    REST_FRAMEWORK.update({
+        # Without django.contrib.auth every request is anonymous and only JSON is spoken
+        'DEFAULT_RENDERER_CLASSES': ['planner.renderers.TimedJSONRenderer'],
+        'DEFAULT_PARSER_CLASSES': ['rest_framework.parsers.JSONParser'],
+        'DEFAULT_AUTHENTICATION_CLASSES': [],
+        'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+        'UNAUTHENTICATED_USER': None,
+    })
@@ -0,0 +1,129 @@
+import json
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import polyline
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+
+from ..services.geocode_cache import normalize_address
+from ..services.route_format import POLYLINE_PRECISION
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+
+def _query(url):
+    return {name: values[0] for name, values in parse_qs(urlparse(url).query).items()}
+
+
+def fixture_key(url):
+    """Key a recorded response by what was asked, ignoring the API key"""
+    query = _query(url)
+    if "geocode" in urlparse(url).path:
+        return "geocode", normalize_address(query.get("text", ""))
+    return "directions", f"{query.get('start', '')}|{query.get('end', '')}"
+
+
+def pack_directions(route):
+    """Store a directions response with its geometry as an encoded polyline to keep fixtures small"""
+    route = json.loads(json.dumps(route))
+    for feature in route.get("features", []):
+        geometry = feature.get("geometry", {})
+        geometry["coordinates"] = polyline.encode(
+            [(point[0], point[1]) for point in geometry.get("coordinates", [])], POLYLINE_PRECISION, geojson=True
+        )
+    return route
+
+
+def unpack_directions(route):
+    for feature in route.get("features", []):
+        geometry = feature.get("geometry", {})
+        if isinstance(geometry.get("coordinates"), str):
+            geometry["coordinates"] = [
+                list(point) for point in polyline.decode(geometry["coordinates"], POLYLINE_PRECISION, geojson=True)
+            ]
+    return route
+
+
+class Scenario:
+    """A recorded trip: the planner input plus every ORS response needed to plan it"""
+
+    def __init__(self, name, trip, geocode=None, directions=None):
+        self.name = name
+        self.trip = trip
+        self.geocode = geocode or {}
+        self.directions = directions or {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as fixture_file:
+            data = json.load(fixture_file)
+        return cls(
+            data["name"],
+            data["trip"],
+            data.get("geocode"),
+            {key: unpack_directions(route) for key, route in data.get("directions", {}).items()},
+        )
+
+    def save(self, path):
+        data = {
+            "name": self.name,
+            "trip": self.trip,
+            "geocode": self.geocode,
+            "directions": {key: pack_directions(route) for key, route in self.directions.items()},
+        }
+        with open(path, "w") as fixture_file:
+            json.dump(data, fixture_file, indent=1)
+            fixture_file.write("\n")
+
+    def response_body(self, url):
+        kind, key = fixture_key(url)
+        return (self.geocode if kind == "geocode" else self.directions).get(key)
+
+
+def load_scenarios(names=None, directory=FIXTURES_DIR):
+    """Scenarios from the fixtures directory, all of them or only the given names, sorted by name"""
+    scenarios = [Scenario.load(path) for path in sorted(Path(directory).glob("*.json"))]
+    if names:
+        scenarios = [scenario for scenario in scenarios if scenario.name in names]
+    return scenarios
+
+
+class FixtureAdapter(HTTPAdapter):
+    """Transport adapter answering ORS requests from recorded scenarios instead of the network"""
+
+    def __init__(self, scenarios, **kwargs):
+        super().__init__(**kwargs)
+        self.scenarios = scenarios
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        body = None
+        for scenario in self.scenarios:
+            body = scenario.response_body(request.url)
+            if body is not None:
+                break
+
+        response = Response()
+        response.request = request
+        response.url = request.url
+        response.status_code = 200 if body is not None else 404
+        response.headers["Content-Type"] = "application/json"
+        response._content = json.dumps(body if body is not None else {"error": "No recorded response"}).encode()
+        return response
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Transport adapter that calls the real upstream and keeps every successful response"""
+
+    def __init__(self, scenario, **kwargs):
+        super().__init__(**kwargs)
+        self.scenario = scenario
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            kind, key = fixture_key(request.url)
+            (self.scenario.geocode if kind == "geocode" else self.scenario.directions)[key] = response.json()
+        return response
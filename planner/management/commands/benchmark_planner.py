@@ -0,0 +1,209 @@
+import json
+import math
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from decouple import config
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from planner.benchmarks.fixtures import FIXTURES_DIR, FixtureAdapter, RecordingAdapter, Scenario, load_scenarios
+from planner.models import GeocodedLocation, PlanJob
+from planner.services.eld_service import eld_service
+from planner.services.geocode_cache import geocode_cache
+from planner.services.http_client import ors_client
+from planner.services.route_cache import route_cache
+from planner.services.route_service import get_route_service
+
+BASELINE_PATH = Path(FIXTURES_DIR).parent / "baseline.json"
+
+
+def percentile(samples, percent):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def reset_caches():
+    """Start every iteration cold so that each one goes through the whole pipeline"""
+    route_cache.entries.clear()
+    geocode_cache.memory.clear()
+    GeocodedLocation.objects.all().delete()
+    PlanJob.objects.all().delete()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark RouteService.calculate_trip_details, ELDService.generate_log_sheets and the planner "
+        "endpoint against recorded ORS responses, optionally failing on a regression from the baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", action="append", help="Only run this scenario, may be repeated")
+        parser.add_argument("--iterations", type=int, default=20, help="Timed runs per stage")
+        parser.add_argument("--warmup", type=int, default=2, help="Untimed runs per stage")
+        parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Baseline results file")
+        parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+        parser.add_argument("--check", action="store_true", help="Fail when a result regresses past --threshold")
+        parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown, 0.25 is 25%%")
+        parser.add_argument("--record", action="store_true", help="Re-record the fixtures from the live ORS API")
+
+    def handle(self, *args, **options):
+        scenarios = load_scenarios(options["scenario"])
+        if not scenarios:
+            raise CommandError(f"No benchmark scenarios found in {FIXTURES_DIR}")
+
+        # Trips, plan jobs and cache rows go to a throwaway database
+        if connection.vendor == "sqlite":
+            # Lookups run on worker threads, which an in-memory SQLite database would lock out
+            connection.settings_dict["TEST"]["NAME"] = str(Path(tempfile.gettempdir()) / "benchmark_planner.sqlite3")
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        adapters = dict(ors_client.session.adapters)
+        try:
+            if options["record"]:
+                self.record(scenarios)
+                return
+
+            adapter = FixtureAdapter(scenarios)
+            ors_client.session.mount("https://", adapter)
+            results = {
+                scenario.name: self.run_scenario(scenario, adapter, options["iterations"], options["warmup"])
+                for scenario in scenarios
+            }
+        finally:
+            for prefix, original in adapters.items():
+                ors_client.session.mount(prefix, original)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.report(results)
+        baseline_path = Path(options["baseline"])
+        if options["check"]:
+            self.check_baseline(results, baseline_path, options["threshold"])
+        if options["save_baseline"]:
+            baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(f"Saved baseline to {baseline_path}")
+
+    def record(self, scenarios):
+        if not config("OPEN_ROUTE_API", default=""):
+            raise CommandError("Recording needs OPEN_ROUTE_API set to a real OpenRouteService key")
+
+        for scenario in scenarios:
+            recorded = Scenario(scenario.name, scenario.trip)
+            ors_client.session.mount("https://", RecordingAdapter(recorded))
+            reset_caches()
+            trip = scenario.trip
+            details, _ = get_route_service().calculate_trip_details(
+                trip["current_location"], trip["pickup_location"], trip["dropoff_location"], trip["current_cycle_used"]
+            )
+            if not details["to_pickup"] or not details["pickup_to_dropoff"]:
+                raise CommandError(f"Could not route scenario {scenario.name}")
+            recorded.save(FIXTURES_DIR / f"{scenario.name}.json")
+            self.stdout.write(f"Recorded {scenario.name}: {len(recorded.geocode)} geocodes, {len(recorded.directions)} legs")
+
+    def run_scenario(self, scenario, adapter, iterations, warmup):
+        trip = scenario.trip
+        client = Client()
+        url = reverse("spotter-planner")
+        results = {}
+
+        def plan():
+            return get_route_service().calculate_trip_details(
+                trip["current_location"], trip["pickup_location"], trip["dropoff_location"], trip["current_cycle_used"]
+            )
+
+        details, summary = plan()
+        if not details["to_pickup"] or not details["pickup_to_dropoff"]:
+            raise CommandError(f"Scenario {scenario.name} could not be planned from its fixtures")
+
+        stages = {
+            "calculate_trip_details": (reset_caches, plan),
+            "generate_log_sheets": (
+                None,
+                lambda: eld_service.generate_log_sheets(details, trip["current_cycle_used"], route_summary=summary),
+            ),
+            "view": (reset_caches, lambda: client.post(url, data=trip, content_type="application/json")),
+        }
+        for stage, (setup, run) in stages.items():
+            results[stage] = self.measure(setup, run, iterations, warmup)
+
+        # Upstream calls and payload sizes of one cold request in each geometry format
+        reset_caches()
+        adapter.requests = 0
+        response = client.post(url, data=trip, content_type="application/json")
+        results["view"]["upstream_requests"] = adapter.requests
+        results["view"]["response_bytes"] = len(response.content)
+        reset_caches()
+        response = client.post(f"{url}?geometry=polyline", data=trip, content_type="application/json")
+        results["view"]["polyline_response_bytes"] = len(response.content)
+        return results
+
+    def measure(self, setup, run, iterations, warmup):
+        samples = []
+        for iteration in range(warmup + iterations):
+            if setup:
+                setup()
+            started = time.perf_counter()
+            run()
+            if iteration >= warmup:
+                samples.append((time.perf_counter() - started) * 1000)
+
+        # Allocations are traced in a separate run, tracemalloc would skew the timings
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            run()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "p50_ms": round(percentile(samples, 50), 3),
+            "p95_ms": round(percentile(samples, 95), 3),
+            "p99_ms": round(percentile(samples, 99), 3),
+            "mean_ms": round(sum(samples) / len(samples), 3),
+            "peak_alloc_kb": round(peak / 1024, 1),
+            "retained_alloc_kb": round(current / 1024, 1),
+        }
+
+    def report(self, results):
+        for scenario, stages in results.items():
+            self.stdout.write(scenario)
+            for stage, result in stages.items():
+                line = (
+                    f"  {stage:<24} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                    f"p99 {result['p99_ms']:9.2f} ms  peak {result['peak_alloc_kb']:9.1f} KB"
+                )
+                if "response_bytes" in result:
+                    line += (
+                        f"  {result['response_bytes']} bytes ({result['polyline_response_bytes']} as polyline), "
+                        f"{result['upstream_requests']} upstream requests"
+                    )
+                self.stdout.write(line)
+
+    def check_baseline(self, results, baseline_path, threshold):
+        try:
+            baseline = json.loads(baseline_path.read_text())
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Cannot read baseline {baseline_path}: {error}")
+
+        regressions = []
+        for scenario, stages in results.items():
+            for stage, result in stages.items():
+                expected = baseline.get(scenario, {}).get(stage)
+                if not expected:
+                    continue
+                for metric in ("p50_ms", "p95_ms", "peak_alloc_kb", "response_bytes", "polyline_response_bytes"):
+                    if metric in result and expected.get(metric) and result[metric] > expected[metric] * (1 + threshold):
+                        regressions.append(f"{scenario} {stage} {metric}: {result[metric]} > {expected[metric]}")
+
+        if regressions:
+            raise CommandError("Regressed past the baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions past {threshold:.0%} of {baseline_path}"))
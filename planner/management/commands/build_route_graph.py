@@ -0,0 +1,59 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from planner.services.geometry import haversine
+from planner.services.route_graph import MICRODEGREES, write_graph
+from planner.services.routing_backends import ROUTE_GRAPH_PATH
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the memory-mapped road graph used by ROUTING_BACKEND=local from a CSV edge list with "
+        "from_lon,from_lat,to_lon,to_lat columns and optional length (meters), speed (km/h) and oneway"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("edges", help="CSV edge list, e.g. exported from OpenStreetMap with osmium or osmnx")
+        parser.add_argument("--output", default=ROUTE_GRAPH_PATH, help="Graph file to write")
+        parser.add_argument("--default-speed", type=float, default=80, help="km/h for edges without a speed")
+        parser.add_argument("--max-speed", type=float, default=105, help="HGV speed cap in km/h")
+
+    def handle(self, *args, **options):
+        nodes = []
+        node_ids = {}
+        edges = []
+
+        def node_for(lon, lat):
+            # Endpoints are matched at the precision the graph stores them with
+            key = (round(float(lon) * MICRODEGREES), round(float(lat) * MICRODEGREES))
+            if key not in node_ids:
+                node_ids[key] = len(nodes)
+                nodes.append((key[0] / MICRODEGREES, key[1] / MICRODEGREES))
+            return node_ids[key]
+
+        try:
+            with open(options["edges"], newline="") as edges_file:
+                for line, row in enumerate(csv.DictReader(edges_file), start=2):
+                    try:
+                        source = node_for(row["from_lon"], row["from_lat"])
+                        target = node_for(row["to_lon"], row["to_lat"])
+                        length = float(row.get("length") or haversine(*nodes[source], *nodes[target]))
+                        speed = min(float(row.get("speed") or options["default_speed"]), options["max_speed"])
+                    except (KeyError, TypeError, ValueError) as error:
+                        raise CommandError(f"{options['edges']}:{line}: invalid edge ({error})")
+                    if source == target or speed <= 0:
+                        continue
+
+                    duration = length / (speed / 3.6)
+                    edges.append((source, target, length, duration))
+                    if (row.get("oneway") or "").strip().lower() not in ("1", "yes", "true"):
+                        edges.append((target, source, length, duration))
+        except OSError as error:
+            raise CommandError(f"Cannot read {options['edges']}: {error}")
+
+        if not edges:
+            raise CommandError("No usable edges in the edge list")
+
+        write_graph(options["output"], nodes, edges)
+        self.stdout.write(f"Wrote {len(nodes)} nodes and {len(edges)} edges to {options['output']}")
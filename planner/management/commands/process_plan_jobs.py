@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from planner.services.plan_jobs import plan_job_queue
+from planner.services.plan_memo import purge_plan_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued trip plans from the PlanJob table, for deployments that want a dedicated worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep when the queue is empty")
+
+    def handle(self, *args, **options):
+        while True:
+            requeued = plan_job_queue.requeue_stale()
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+            purged = purge_plan_jobs()
+            if purged:
+                self.stdout.write(f"Purged {purged} expired job(s)")
+
+            count = plan_job_queue.drain()
+            if count:
+                self.stdout.write(f"Processed {count} job(s)")
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,117 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: load the WSGI app the way the lambda does, then send it one GET so the
+# URLconf, views and services are loaded as they would be by the first request after a cold start
+COLD_START_SCRIPT = """
+import io, json, os, sys, time
+started = time.perf_counter()
+from eld_trip_planner.wsgi import app
+loaded = time.perf_counter()
+environ = {
+    "REQUEST_METHOD": "GET", "PATH_INFO": sys.argv[1], "QUERY_STRING": "", "SERVER_NAME": "localhost",
+    "SERVER_PORT": "80", "HTTP_ACCEPT": "application/json", "wsgi.input": io.BytesIO(), "wsgi.url_scheme": "http",
+}
+statuses = []
+b"".join(app(environ, lambda status, headers: statuses.append(status)))
+answered = time.perf_counter()
+sizes = {}
+for name, module in list(sys.modules.items()):
+    path = getattr(module, "__file__", None)
+    if path and os.path.isfile(path):
+        sizes[name.split(".")[0]] = sizes.get(name.split(".")[0], 0) + os.path.getsize(path)
+print(json.dumps({
+    "wsgi_ms": (loaded - started) * 1000,
+    "first_request_ms": (answered - loaded) * 1000,
+    "status": statuses[0] if statuses else None,
+    "sizes": sizes,
+}))
+"""
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure a cold start of the WSGI app in a fresh interpreter: import time broken down by package, "
+        "the time of the first request and the size of the module files it loaded"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile",
+            choices=("full", "api-only", "both"),
+            default="both",
+            help="Startup profile to measure, api-only sets API_ONLY=True",
+        )
+        parser.add_argument("--path", default="/api/spotter-planner/", help="Path of the first request")
+        parser.add_argument("--runs", type=int, default=3, help="Cold starts per profile, the fastest is kept")
+        parser.add_argument("--top", type=int, default=15, help="Packages to list, slowest first")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        profiles = ("full", "api-only") if options["profile"] == "both" else (options["profile"],)
+        if options["runs"] < 1:
+            raise CommandError("--runs must be at least 1")
+        results = {}
+        for profile in profiles:
+            # Page cache and CPU noise only ever slow a run down, so the fastest is the most representative
+            runs = [self.measure(profile, options["path"]) for _ in range(options["runs"])]
+            results[profile] = min(runs, key=lambda run: run["wsgi_ms"] + run["first_request_ms"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for profile, result in results.items():
+            self.report(profile, result, options["top"])
+
+    def measure(self, profile, path):
+        env = dict(os.environ, API_ONLY=str(profile == "api-only"))
+        env.setdefault("DJANGO_SETTINGS_MODULE", "eld_trip_planner.settings")
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", COLD_START_SCRIPT, path],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        if completed.returncode != 0:
+            raise CommandError(f"The {profile} cold start failed:\n{completed.stderr[-2000:]}")
+
+        packages = defaultdict(int)
+        modules = 0
+        for line in completed.stderr.splitlines():
+            match = IMPORT_TIME_LINE.match(line)
+            if match:
+                packages[match.group(3).split(".")[0]] += int(match.group(1))
+                modules += 1
+
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        sizes = result.pop("sizes")
+        result.update(
+            modules=modules,
+            import_ms=sum(packages.values()) / 1000,
+            size_kb=sum(sizes.values()) / 1024,
+            packages={
+                package: {"import_ms": microseconds / 1000, "size_kb": sizes.get(package, 0) / 1024}
+                for package, microseconds in sorted(packages.items(), key=lambda item: -item[1])
+            },
+        )
+        return result
+
+    def report(self, profile, result, top):
+        self.stdout.write(
+            f"{profile}: WSGI app loaded in {result['wsgi_ms']:.1f} ms, first request ({result['status']}) "
+            f"in {result['first_request_ms']:.1f} ms"
+        )
+        self.stdout.write(
+            f"  {result['modules']} modules imported in {result['import_ms']:.1f} ms, "
+            f"{result['size_kb']:.1f} KB of module files"
+        )
+        for package, stats in list(result["packages"].items())[:top]:
+            self.stdout.write(f"  {package:<24} {stats['import_ms']:8.1f} ms  {stats['size_kb']:9.1f} KB")
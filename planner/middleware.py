@@ -0,0 +1,46 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .services import metrics
+
+
+class ServerTimingMiddleware:
+    """Collect the planner spans of each request and report them in a Server-Timing header.
+
+    Does nothing unless PLANNER_METRICS is on. Streaming responses only report the work done
+    before the first byte was sent.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not metrics.PLANNER_METRICS:
+            return self.get_response(request)
+
+        request_metrics, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        response["Server-Timing"] = request_metrics.server_timing()
+        return response
+
+    async def __acall__(self, request):
+        if not metrics.PLANNER_METRICS:
+            return await self.get_response(request)
+
+        request_metrics, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        response["Server-Timing"] = request_metrics.server_timing()
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0003_planjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planjob',
+            name='idempotency_key',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='planjob',
+            name='input_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
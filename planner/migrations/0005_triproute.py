@@ -0,0 +1,26 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0004_planjob_memoization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('leg_distances', models.JSONField()),
+                ('leg_durations', models.JSONField()),
+                ('leg_starts', models.JSONField()),
+                ('index', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='route', to='planner.trip')),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0005_triproute'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='planjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('idempotency_key__isnull', False), models.Q(('status', 'failed'), _negated=True)), fields=('idempotency_key',), name='unique_live_idempotency_key'),
+        ),
+    ]
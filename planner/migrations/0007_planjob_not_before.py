@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0006_planjob_unique_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planjob',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -8,4 +8,78 @@ class Trip(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"Trip: {self.current_location} to {self.dropoff_location}"
\ No newline at end of file
+        return f"Trip: {self.current_location} to {self.dropoff_location}"
+
+
+class TripRoute(models.Model):
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, related_name='route')
+    leg_distances = models.JSONField()  # Meters per leg
+    leg_durations = models.JSONField()  # Seconds per leg
+    leg_starts = models.JSONField()  # Index of the first vertex of every leg
+    index = models.BinaryField()  # RouteIndex.to_bytes(), the geometry and cumulative meters and seconds
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Route of {self.trip}"
+
+
+class GeocodedLocation(models.Model):
+    query = models.CharField(max_length=255, unique=True)  # Normalized address text
+    longitude = models.FloatField()
+    latitude = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Geocode: {self.query} -> ({self.longitude}, {self.latitude})"
+
+class PlanJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='plan_jobs')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    route_format = models.JSONField(default=dict)  # Requested ?geometry= and ?tolerance=
+    result = models.JSONField(null=True, blank=True)  # Same body as the synchronous planner response
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    input_hash = models.CharField(max_length=64, blank=True, db_index=True)  # Hash of the normalized trip input
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    not_before = models.DateTimeField(null=True, blank=True)  # A retried job waits out its backoff until then
+
+    class Meta:
+        ordering = ['created_at']
+        constraints = [
+            # One live job per key, so concurrent requests with the same key cannot both compute it
+            models.UniqueConstraint(
+                fields=['idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False) & ~models.Q(status='failed'),
+                name='unique_live_idempotency_key',
+            ),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    @property
+    def duration(self):
+        """Seconds spent computing the plan"""
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+
+    def __str__(self):
+        return f"PlanJob {self.pk} ({self.status}) for {self.trip}"
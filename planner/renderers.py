@@ -0,0 +1,13 @@
+from rest_framework.renderers import JSONRenderer
+
+from .services import metrics
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that records how long rendering took and how many bytes it produced"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with metrics.span("render"):
+            content = super().render(data, accepted_media_type, renderer_context)
+        metrics.increment("response_bytes", len(content))
+        return content
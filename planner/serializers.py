@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Trip
+from .models import PlanJob, Trip
 
 class TripSerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,4 +10,56 @@ class TripInputSerializer(serializers.Serializer):
     current_location = serializers.CharField(max_length=255)
     pickup_location = serializers.CharField(max_length=255)
     dropoff_location = serializers.CharField(max_length=255)
-    current_cycle_used = serializers.FloatField()
\ No newline at end of file
+    current_cycle_used = serializers.FloatField(min_value=0, max_value=70)
+
+class TripBatchInputSerializer(serializers.Serializer):
+    trips = TripInputSerializer(many=True, allow_empty=False, max_length=1000)
+
+class FleetDriverSerializer(serializers.Serializer):
+    driver_id = serializers.CharField(max_length=64)
+    current_location = serializers.CharField(max_length=255)
+    current_cycle_used = serializers.FloatField(min_value=0, max_value=70)
+    # Hours left in the current shift, ignored once off_duty_hours covers a 10-hour rest
+    drive_remaining = serializers.FloatField(min_value=0, max_value=11, default=11)
+    duty_remaining = serializers.FloatField(min_value=0, max_value=14, default=14)
+    driving_since_break = serializers.FloatField(min_value=0, max_value=11, required=False, allow_null=True)
+    off_duty_hours = serializers.FloatField(min_value=0, default=10)  # Consecutive hours off duty so far
+
+class FleetFeasibilitySerializer(serializers.Serializer):
+    pickup_location = serializers.CharField(max_length=255)
+    dropoff_location = serializers.CharField(max_length=255)
+    deadline = serializers.DateTimeField()  # Latest arrival at the dropoff
+    start_time = serializers.DateTimeField(required=False)  # Defaults to now
+    drivers = FleetDriverSerializer(many=True, allow_empty=False, max_length=1000)
+
+class TripReplanSerializer(serializers.Serializer):
+    longitude = serializers.FloatField(min_value=-180, max_value=180)  # Reported position of the truck
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    reported_at = serializers.DateTimeField(required=False)  # Defaults to now
+    current_cycle_used = serializers.FloatField(min_value=0, max_value=70)
+    # Hours left in the current shift, as for FleetDriverSerializer but on duty by default
+    drive_remaining = serializers.FloatField(min_value=0, max_value=11, default=11)
+    duty_remaining = serializers.FloatField(min_value=0, max_value=14, default=14)
+    driving_since_break = serializers.FloatField(min_value=0, max_value=11, required=False, allow_null=True)
+    off_duty_hours = serializers.FloatField(min_value=0, default=0)
+    picked_up = serializers.BooleanField(required=False, allow_null=True, default=None)  # Inferred when null
+    miles_since_fuel = serializers.FloatField(min_value=0, default=0)
+
+class RouteFormatSerializer(serializers.Serializer):
+    geometry = serializers.ChoiceField(choices=['geojson', 'polyline'], default='geojson')
+    tolerance = serializers.FloatField(min_value=0, required=False)  # Simplification tolerance in meters
+    stream = serializers.BooleanField(default=False)  # Stream newline-delimited JSON records
+
+class PlanJobSerializer(serializers.ModelSerializer):
+    trip = TripSerializer(read_only=True)
+    duration = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = PlanJob
+        fields = [
+            'id', 'trip', 'status', 'result', 'error', 'attempts', 'created_at', 'started_at', 'finished_at',
+            'not_before', 'duration'
+        ]
+
+class PlanJobWaitSerializer(serializers.Serializer):
+    wait = serializers.FloatField(min_value=0, max_value=30, default=0)  # Long-poll for up to this many seconds
\ No newline at end of file
@@ -0,0 +1,61 @@
+import csv
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+class LocalDataset:
+    """A CSV or SQLite file shipped with the deployment, read into an index on first use.
+
+    CSV files need the columns named in columns and may have the optional ones, SQLite files a
+    table with all of them. Rows are tuples in that order, optional values None when missing from
+    a CSV. Without a path, or when the file cannot be read, the index is built from no rows.
+    Subclasses set table, columns, optional and description and turn the rows into an index in build.
+    """
+
+    table = None
+    columns = ()
+    optional = ()
+    description = "entries"  # What a row is, for the log
+
+    def __init__(self, path):
+        self.path = path
+        self._index = None
+        self._lock = threading.Lock()
+
+    def build(self, rows):
+        raise NotImplementedError
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self.build(self._read())
+                    if self.path:
+                        logger.info("Loaded %s %s from %s", len(self._index), self.description, self.path)
+        return self._index
+
+    def _read(self):
+        if not self.path:
+            return []
+        try:
+            if str(self.path).endswith(SQLITE_SUFFIXES):
+                connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+                try:
+                    names = ", ".join(self.columns + self.optional)
+                    return connection.execute(f"SELECT {names} FROM {self.table}").fetchall()
+                finally:
+                    connection.close()
+            with open(self.path, newline="") as dataset_file:
+                return [
+                    tuple(row[name] for name in self.columns) + tuple(row.get(name) for name in self.optional)
+                    for row in csv.DictReader(dataset_file)
+                ]
+        except (OSError, KeyError, sqlite3.Error) as error:
+            logger.warning("Could not load %s from %s: %s", self.description, self.path, error)
+            return []
@@ -0,0 +1,48 @@
+from .hos_engine import DRIVING, OFF_DUTY, ON_DUTY, SLEEPER_BERTH
+
+MINUTES_PER_DAY = 24 * 60
+
+# Byte stored per minute, off duty is zero so an untouched grid reads as a day off
+STATUS_CODES = {OFF_DUTY: 0, SLEEPER_BERTH: 1, DRIVING: 2, ON_DUTY: 3}
+STATUS_NAMES = {code: status for status, code in STATUS_CODES.items()}
+TOTAL_KEYS = {OFF_DUTY: "off_duty", SLEEPER_BERTH: "sleeper_berth", DRIVING: "driving", ON_DUTY: "on_duty"}
+
+
+def _clock(minute):
+    return f"{minute // 60:02}:{minute % 60:02}"
+
+
+class DutyGrid:
+    """One day of duty statuses at one-minute resolution, stored as a 1,440-byte array"""
+
+    def __init__(self):
+        self.minutes = bytearray(MINUTES_PER_DAY)
+
+    def fill(self, start, end, status):
+        """Mark minutes [start, end) of the day with status"""
+        self.minutes[start:end] = bytes((STATUS_CODES[status],)) * (end - start)
+
+    def totals(self):
+        """Hours spent in each duty status, counted in C by bytearray.count"""
+        return {
+            TOTAL_KEYS[status]: self.minutes.count(code) / 60
+            for status, code in STATUS_CODES.items()
+        }
+
+    def runs(self):
+        """Run-length encoded statuses: one {"status", "start", "end"} entry per change"""
+        runs = []
+        minutes = self.minutes
+        start = 0
+        while start < MINUTES_PER_DAY:
+            code = minutes[start]
+            # The run ends where the nearest different status starts
+            end = MINUTES_PER_DAY
+            for other in STATUS_NAMES:
+                if other != code:
+                    found = minutes.find(other, start, end)
+                    if found != -1:
+                        end = found
+            runs.append({"status": STATUS_NAMES[code], "start": _clock(start), "end": _clock(end)})
+            start = end
+        return runs
@@ -1,184 +1,321 @@
+from bisect import bisect_right
+from collections import deque
 from datetime import datetime, timedelta
 
+from . import metrics
+from .eld_grid import MINUTES_PER_DAY, DutyGrid
+from .hos_engine import DRIVING, OFF_DUTY, ON_DUTY, RESTED, SLEEPER_BERTH, HOSSimulator, ShiftState
+from .poi_index import FUEL_KINDS, PARKING_KINDS, POI_SNAP_WINDOW_MINUTES
+from .route_summary import METERS_TO_MILES, RouteSummary
+
+
+# Where each kind of stop the HOS simulation plans can be made
+STOP_KINDS = {
+    "30-minute break": PARKING_KINDS,
+    "10-hour rest period": PARKING_KINDS,
+    "34-hour restart": PARKING_KINDS,
+    "Fueling": FUEL_KINDS,
+}
+
+
+def plan_start_time(trip_details=None):
+    """Local time a plan starts at, to the minute: the one its trip details were planned for, else now"""
+    if trip_details and trip_details.get("start_time"):
+        return datetime.fromisoformat(trip_details["start_time"])
+    return datetime.now().replace(second=0, microsecond=0)
+
+
 class ELDService:
+    """Builds ELD log sheets. Only holds the HOS limits, so one instance serves every thread"""
+
     def __init__(self):
         self.max_driving_hours = 11  # Maximum driving hours per day
         self.max_on_duty_hours = 14  # Maximum on-duty hours per day
         self.min_off_duty_hours = 10  # Minimum off-duty hours required
         self.max_weekly_hours = 70  # Maximum hours in 8 days (70-hour rule)
-    
-    def generate_log_sheets(self, trip_details, current_cycle_used):
+        self.fuel_every_miles = 1000  # Fuel at least once every 1,000 miles
+        self.pickup_dropoff_minutes = 60  # 1 hour on duty for each of pickup and dropoff
+        self.simulator = HOSSimulator(
+            max_driving_hours=self.max_driving_hours,
+            max_on_duty_hours=self.max_on_duty_hours,
+            min_off_duty_hours=self.min_off_duty_hours,
+            max_cycle_hours=self.max_weekly_hours,
+            stop_window_minutes=POI_SNAP_WINDOW_MINUTES,
+        )
+
+    def generate_log_sheets(self, trip_details, current_cycle_used, route_summary=None):
         """Generate ELD log sheets for the entire trip"""
-        total_duration = trip_details['total_duration']
-        stops = trip_details['stops']
-        
-        # Start with current time as the beginning of the trip
-        current_time = datetime.now()
-        # Initialize cycle
-        remaining_drive_time = self.max_driving_hours - current_cycle_used
-        remaining_duty_time = self.max_on_duty_hours - current_cycle_used
-        
-        # Initialize logs
-        log_sheets = []
-        current_log = self._initialize_log_sheet(current_time.date())
-        
-        # Initial on-duty status the driver is going to pick up the load
-    
-        # Check if there is to pick up coordinate so that you drive and head to pick up location
-        if len(trip_details['to_pickup']['features'][0]['geometry']['coordinates']) > 0:
-            current_status = "D"
-            current_log['events'].append({
-                "time": current_time.strftime("%H:%M"),
-                "status": current_status,
-                "location": trip_details['to_pickup']['features'][0]['geometry']['coordinates'][0] if 'to_pickup' in trip_details else "Unknown"
-            })
-            
-        # Get both drop off location and pick up location duration taken
-        pickup_location_duration = (trip_details['to_pickup']['features'][0]['properties']['summary']['duration'] / 3600) if 'to_pickup' in trip_details else 0
-        dropoff_location_duration = (trip_details['pickup_to_dropoff']['features'][0]['properties']['summary']['duration'] / 3600) if 'pickup_to_dropoff' in trip_details else 0
-                
-        # Simulate the trip hour by hour
-        hours_simulated = 0
-        pickup_location_hours = 0
-        while hours_simulated < total_duration:
-            # CHeck if pickup location has been reached
-            if hours_simulated < pickup_location_duration:
-                updated_time = current_time + timedelta(hours=pickup_location_duration)
-                current_time += timedelta(hours=pickup_location_duration)
-                # Add pickup
-                current_status = "ON"
-                current_log['events'].append({
-                    "time": updated_time.strftime("%H:%M"),
-                    "status": current_status,
-                    "location": trip_details['pickup_to_dropoff']['features'][0]['geometry']['coordinates'][0] if 'pickup_to_dropoff' in trip_details else "Unknown",
-                    "remarks": "Pickup location"
-                })
-                
-                current_time += timedelta(hours=1)
-                
-                current_status = "D"
-                current_log['events'].append({
-                    "time": current_time.strftime("%H:%M"),
-                    "status": current_status,
-                    "location": trip_details['pickup_to_dropoff']['features'][0]['geometry']['coordinates'][0] if 'pickup_to_dropoff' in trip_details else "Unknown",
-                })
-                
-            hours_simulated += 1               
-            current_time += timedelta(hours=1)
-            
-            # Check if we need to start a new day
-            if current_time.date() != datetime.strptime(current_log['date'], "%Y-%m-%d").date():
-                log_sheets.append(current_log)
-                current_log = self._initialize_log_sheet(current_time.date())
-            
-            # Update remaining times
-            remaining_drive_time -= 1
-            remaining_duty_time -= 1
-            
-            # Check if we need a 30-minute break
-            if hours_simulated % 8 == 0:
-                current_status = "OFF"
-                current_log['events'].append({
-                    "time": current_time.strftime("%H:%M"),
-                    "status": current_status,
-                    "location": "Break location",
-                    "remarks": "30-minute break"
-                })
-                
-                # Add the break time
-                current_time += timedelta(minutes=30)
-                
-                # Back to driving
-                current_status = "D"
-                current_log['events'].append({
-                    "time": current_time.strftime("%H:%M"),
-                    "status": current_status,
-                    "location": "Break location"
-                })
-            
-            # Check if we need a 10-hour break
-            if remaining_drive_time <= 0 or remaining_duty_time <= 0:
-                current_status = "SB"  # Sleeper berth
-                current_log['events'].append({
-                    "time": current_time.strftime("%H:%M"),
-                    "status": current_status,
-                    "location": "Rest location",
-                    "remarks": "10-hour rest period"
-                })
-                
-                # Add the rest time
-                current_time += timedelta(hours=10)
-                
-                # Reset counters
-                remaining_drive_time = self.max_driving_hours
-                remaining_duty_time = self.max_on_duty_hours
-                
-                # Check if we need to start a new day
-                if current_time.date() != datetime.strptime(current_log['date'], "%Y-%m-%d").date():
-                    log_sheets.append(current_log)
-                    current_log = self._initialize_log_sheet(current_time.date())
-                
-                # Back to driving
-                current_status = "D"
-                current_log['events'].append({
-                    "time": current_time.strftime("%H:%M"),
-                    "status": current_status,
-                    "location": "Rest location"
-                })
-            
-            # Check for fuel stops
-            if trip_details['stops']['fuel_stops']["number_of_fuel_stops"] > 0 and hours_simulated % (total_duration / (trip_details['stops']['fuel_stops']["number_of_fuel_stops"] + 1)) < 1:
-                current_status = "ON"
-                current_log['events'].append({
-                    "time": current_time.strftime("%H:%M"),
-                    "status": current_status,
-                    "location": "Fuel stop",
-                    "remarks": "Fueling"
-                })
-                
-                # Add fueling time
-                current_time += timedelta(minutes=30)
-                
-                # Back to driving
-                current_status = "D"
-                current_log['events'].append({
-                    "time": current_time.strftime("%H:%M"),
-                    "status": current_status,
-                    "location": "Fuel stop"
-                })
-        
-        # Add the final dropoff
-        current_time = current_time + timedelta(hours=total_duration-hours_simulated)
-        
-        current_status = "ON"
-        current_log['events'].append({
-            "time": current_time.strftime("%H:%M"),
-            "status": current_status,
-            "location": trip_details['pickup_to_dropoff']['features'][0]['geometry']['coordinates'][-1] if 'pickup_to_dropoff' in trip_details else "Unknown", # Get the last coordinate to represent final destination, wish there was an easier way
-            "remarks": "Dropoff location"
-        })
-        
-        # Add the final log sheet
-        log_sheets.append(current_log)
-        
-        return log_sheets
-    
+        with metrics.span("log_sheets"):
+            return list(self.iter_log_sheets(trip_details, current_cycle_used, route_summary))
+
+    def iter_log_sheets(self, trip_details, current_cycle_used, route_summary=None):
+        """Yield the ELD log sheets one day at a time, as soon as each day is complete"""
+        if route_summary is None:
+            route_summary = RouteSummary(trip_details['to_pickup'], trip_details['pickup_to_dropoff'])
+
+        # Start when the trip was planned, so the sheets follow the same plan as its stops
+        current_time = plan_start_time(trip_details)
+        periods = self.plan_duty_periods(
+            route_summary, current_cycle_used, current_time.hour * 60 + current_time.minute
+        )
+        yield from self._build_log_sheets(current_time, periods, route_summary.index, route_summary.facilities)
+
+    def replan(self, route_summary, cycle_minutes, start_time, shift=RESTED, picked_up=False, miles_since_fuel=0):
+        """Log sheets and outcome of the rest of a trip from where the driver is now.
+
+        route_summary is the RouteSummary.remaining part of the trip and start_time the time of the
+        driver's update. Nothing is routed again, only the remaining schedule is simulated.
+        """
+        periods = self.plan_duty_periods(
+            route_summary, cycle_minutes / 60, start_time.hour * 60 + start_time.minute, shift, picked_up,
+            miles_since_fuel
+        )
+        with metrics.span("log_sheets"):
+            log_sheets = list(
+                self._build_log_sheets(start_time, periods, route_summary.index, route_summary.facilities)
+            )
+        return log_sheets, self._outcome(periods)
+
+    def plan_duty_periods(
+        self, route_summary, current_cycle_used, start_minute=0, shift=RESTED, picked_up=False, miles_since_fuel=0
+    ):
+        """Run the HOS simulation for the trip and return its duty periods"""
+        tasks, fuel_marks, stop_marks = self._duty_tasks(route_summary, picked_up, miles_since_fuel)
+        with metrics.span("hos_simulation"):
+            periods = self.simulator.simulate(
+                tasks, round(current_cycle_used * 60), fuel_marks, start_minute, shift, stop_marks
+            )
+        metrics.increment("duty_periods", len(periods))
+        return periods
+
+    def _duty_tasks(self, route_summary, picked_up=False, miles_since_fuel=0):
+        """The (status, minutes, remarks) tasks of the trip, the driven minutes it refuels at and the
+        driven minutes it passes somewhere to park at
+        """
+        to_pickup_minutes, to_dropoff_minutes = [round(duration / 60) for duration in route_summary.durations]
+        tasks = [
+            (DRIVING, to_pickup_minutes, None),
+            (ON_DUTY, self.pickup_dropoff_minutes, "Pickup location"),
+            (DRIVING, to_dropoff_minutes, None),
+            (ON_DUTY, self.pickup_dropoff_minutes, "Dropoff location"),
+        ]
+        if picked_up:
+            # Re-planned after the pickup, only the drive to the dropoff is left
+            tasks = tasks[2:]
+
+        # Driven minutes at which the truck reaches every 1,000 miles since it last refueled
+        index = route_summary.index
+        fuel_marks = []
+        miles = max(self.fuel_every_miles - miles_since_fuel, 1)
+        while miles <= route_summary.total_distance:
+            fuel_marks.append(max(1, round(index.time_at_distance(miles / METERS_TO_MILES) / 60)))
+            miles += self.fuel_every_miles
+        facilities = route_summary.facilities
+        if not facilities:
+            return tasks, fuel_marks, ()
+
+        # Refuel at the last fuel station before every 1,000 miles rather than wherever the mark falls
+        fuel_stations = facilities.stop_marks(FUEL_KINDS)
+        for position, mark in enumerate(fuel_marks):
+            station = bisect_right(fuel_stations, mark)
+            if station and mark - fuel_stations[station - 1] <= self.simulator.stop_window:
+                fuel_marks[position] = fuel_stations[station - 1]
+        return tasks, fuel_marks, facilities.stop_marks(PARKING_KINDS)
+
+    def plan_stops(self, route_summary, periods, current_cycle_used):
+        """Breaks, rests, fuel stops and restarts of simulated duty periods, with where each is taken"""
+        stops = {remarks: ([], []) for remarks in STOP_KINDS}
+        for period in periods:
+            if period.remarks in stops:
+                location, facility = self._stop_location(period, route_summary.index, route_summary.facilities)
+                stops[period.remarks][0].append(location)
+                stops[period.remarks][1].append(facility)
+
+        def summary(remarks, count_name):
+            locations, facilities = stops[remarks]
+            return {
+                count_name: len(locations),
+                "location": locations[0] if locations else None,
+                "locations": locations,
+                "facilities": facilities,
+            }
+
+        return {
+            "thirty_min_breaks": summary("30-minute break", "number_of_breaks"),
+            "ten_hour_breaks": summary("10-hour rest period", "number_of_breaks"),
+            "fuel_stops": summary("Fueling", "number_of_fuel_stops"),
+            "cycle_restarts": dict(
+                summary("34-hour restart", "number_of_restarts"),
+                cycle_hours_available=max(0, self.max_weekly_hours - current_cycle_used),
+            ),
+        }
+
+    def _stop_location(self, period, index, facilities):
+        """Where on the route a duty period starts and the facility it was planned at, if any"""
+        if facilities and period.remarks in STOP_KINDS:
+            # Stops are planned where the truck passes a facility whenever one was in reach
+            facility = facilities.at_minute(period.driven, STOP_KINDS[period.remarks])
+            if facility:
+                return facility["location"], facility
+        return self._position_after(index, period.driven), None
+
+    def _position_after(self, index, driven):
+        """Route position after driven minutes, which are rounded per leg and can run past the route's end"""
+        return index.position_at_time(min(driven * 60, index.total_time))
+
+    def driver_state(self, driver):
+        """(cycle minutes used, ShiftState) of a driver described in hours, as FleetDriverSerializer takes it.
+
+        Without driving_since_break the whole shift's driving is assumed to be since the last break,
+        the earliest a 30-minute break can be due.
+        """
+        simulator = self.simulator
+        off_duty = round(driver["off_duty_hours"] * 60)
+        cycle_used = round(driver["current_cycle_used"] * 60)
+        if off_duty >= simulator.restart:
+            # The 34 hours off already restarted the cycle
+            cycle_used = 0
+        if off_duty >= simulator.min_off_duty:
+            return cycle_used, RESTED._replace(off_duty=off_duty)
+
+        driving = max(0, simulator.max_driving - round(driver["drive_remaining"] * 60))
+        elapsed = max(0, simulator.max_window - round(driver["duty_remaining"] * 60))
+        if off_duty >= simulator.break_minutes:
+            since_break = 0
+        elif driver.get("driving_since_break") is not None:
+            since_break = min(round(driver["driving_since_break"] * 60), driving)
+        else:
+            since_break = min(driving, simulator.break_after)
+        return cycle_used, ShiftState(driving, elapsed, since_break, off_duty)
+
+    def evaluate_drivers(self, route_summary, drivers, start_minute=0):
+        """Earliest legal pickup and dropoff of each driver for the same trip, without building log sheets.
+
+        Returns one outcome dict per driver with minutes from the start of the plan. Drivers in the
+        same state share a single simulation, so a fleet costs one run per distinct state.
+        """
+        tasks, fuel_marks, stop_marks = self._duty_tasks(route_summary)
+        outcomes = {}
+        results = []
+        with metrics.span("fleet_simulation"):
+            for driver in drivers:
+                state = self.driver_state(driver)
+                outcome = outcomes.get(state)
+                if outcome is None:
+                    periods = self.simulator.simulate(tasks, state[0], fuel_marks, start_minute, state[1], stop_marks)
+                    outcome = outcomes[state] = self._outcome(periods)
+                results.append(outcome)
+        metrics.increment("fleet_simulations", len(outcomes))
+        return results
+
+    def _outcome(self, periods):
+        """Arrival times and stop counts of a simulated trip"""
+        outcome = {
+            "pickup_minute": None,
+            "dropoff_minute": None,
+            "finish_minute": periods[-1].end if periods else 0,
+            "driving_minutes": 0,
+            "rest_periods": 0,
+            "breaks": 0,
+            "restarts": 0,
+            "fuel_stops": 0,
+        }
+        for period in periods:
+            if period.status == DRIVING:
+                outcome["driving_minutes"] += period.end - period.start
+            elif period.status == SLEEPER_BERTH:
+                outcome["rest_periods"] += 1
+            elif period.status == OFF_DUTY:
+                outcome["restarts" if period.end - period.start >= self.simulator.restart else "breaks"] += 1
+            elif period.remarks == "Fueling":
+                outcome["fuel_stops"] += 1
+            elif period.remarks == "Pickup location":
+                outcome["pickup_minute"] = period.start
+            elif period.remarks == "Dropoff location":
+                outcome["dropoff_minute"] = period.start
+        return outcome
+
+    def _build_log_sheets(self, start_time, periods, index, facilities=()):
+        """Turn duty periods into one log sheet per calendar day, splitting periods exactly at midnight.
+
+        Periods are in time order, so once a period starts on a later day every earlier sheet is
+        final and is yielded straight away instead of being held until the end of the trip.
+        """
+        open_sheets = deque()
+        next_day = 0  # Day of the next sheet to open
+        start_date = start_time.date()
+        start_minute = start_time.hour * 60 + start_time.minute
+
+        def sheet_for(day):
+            nonlocal next_day
+            while next_day <= day:
+                open_sheets.append(self._initialize_log_sheet(start_date + timedelta(days=next_day)))
+                next_day += 1
+            return open_sheets[day - next_day]
+
+        def finished_sheets(before_day):
+            # Sheets are opened in day order, the oldest open one is at the left
+            while open_sheets and next_day - len(open_sheets) < before_day:
+                yield self._finalize_log_sheet(open_sheets.popleft())
+
+        def add_event(minute, status, location, remarks=None, facility=None):
+            event = {
+                "time": f"{minute % MINUTES_PER_DAY // 60:02}:{minute % 60:02}",
+                "status": status,
+                "location": location,
+            }
+            if remarks:
+                event["remarks"] = remarks
+            if facility:
+                event["facility"] = facility["name"]
+            sheet_for(minute // MINUTES_PER_DAY)['events'].append(event)
+
+        for period in periods:
+            start = start_minute + period.start
+            end = start_minute + period.end
+            location, facility = self._stop_location(period, index, facilities)
+            remarks = period.remarks
+            yield from finished_sheets(start // MINUTES_PER_DAY)
+
+            # Log every day the period touches, carrying the status over at each midnight
+            minute = start
+            while minute < end:
+                day = minute // MINUTES_PER_DAY
+                day_end = min(end, (day + 1) * MINUTES_PER_DAY)
+                if period.status == DRIVING and minute != start:
+                    location = self._position_after(index, period.driven + minute - start)
+                add_event(minute, period.status, location, remarks, facility)
+                sheet_for(day)['grid'].fill(
+                    minute - day * MINUTES_PER_DAY, day_end - day * MINUTES_PER_DAY, period.status
+                )
+                minute = day_end
+                remarks = None
+                facility = None
+
+        if periods:
+            # Off duty once the load has been dropped off
+            end = start_minute + periods[-1].end
+            add_event(end, OFF_DUTY, index.position_at_time(index.total_time), "End of trip")
+
+        yield from finished_sheets(next_day)
+
+    def _finalize_log_sheet(self, log_sheet):
+        """Replace the working grid with its run-length encoding and daily totals"""
+        grid = log_sheet['grid']
+        log_sheet['grid'] = grid.runs()
+        log_sheet['totals'] = grid.totals()
+        metrics.increment("log_days")
+        metrics.increment("log_events", len(log_sheet['events']))
+        return log_sheet
+
     def _initialize_log_sheet(self, date):
         """Initialize a new log sheet for a given date"""
         return {
             "date": date.strftime("%Y-%m-%d"),
             "events": [],
-            "grid": self._initialize_grid()
+            "grid": DutyGrid()
         }
-    
-    def _initialize_grid(self):
-        """Initialize the grid for the ELD graph"""
-        # Create a 24-hour grid with 15-minute intervals
-        grid = []
-        for hour in range(24):
-            for minute in range(0, 60, 15):
-                grid.append({
-                    "time": f"{hour:02}:{minute:02}",
-                    "status": None  # Will be filled in based on events
-                })
-        return grid
\ No newline at end of file
+
+
+# Shared by every view and plan job in the process
+eld_service = ELDService()
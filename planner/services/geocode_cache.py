@@ -0,0 +1,117 @@
+import itertools
+import logging
+import re
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from decouple import config
+from django.db import DatabaseError
+from django.utils import timezone
+
+from ..models import GeocodedLocation
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# In-process tier: repeat addresses within a worker never touch the database
+GEOCODE_MEMORY_CACHE_SIZE = config("GEOCODE_MEMORY_CACHE_SIZE", default=4096, cast=int)
+# Database tier: shared by every worker, survives restarts and cold starts
+GEOCODE_DB_CACHE_SIZE = config("GEOCODE_DB_CACHE_SIZE", default=50000, cast=int)
+GEOCODE_CACHE_TTL = config("GEOCODE_CACHE_TTL", default=30 * 24 * 3600, cast=int)  # Seconds
+# last_used_at only orders eviction, so it is refreshed at most this often per row
+GEOCODE_TOUCH_INTERVAL = config("GEOCODE_TOUCH_INTERVAL", default=3600, cast=int)  # Seconds
+GEOCODE_EVICT_EVERY = config("GEOCODE_EVICT_EVERY", default=100, cast=int)  # Writes between eviction passes
+
+
+def normalize_address(location):
+    """Normalize address text so that trivially different spellings share a cache key"""
+    text = re.sub(r"[^\w\s]", " ", location.lower())
+    return " ".join(text.split())[:255]
+
+
+class GeocodeCache:
+    """Two-tier geocode cache: an in-process LRU in front of the GeocodedLocation table"""
+
+    def __init__(self, memory_size=GEOCODE_MEMORY_CACHE_SIZE, db_size=GEOCODE_DB_CACHE_SIZE, ttl=GEOCODE_CACHE_TTL):
+        self.memory = LRUCache(max_entries=memory_size, ttl=ttl)
+        self.db_size = db_size
+        self.ttl = ttl
+        self.touch_interval = timedelta(seconds=GEOCODE_TOUCH_INTERVAL)
+        self.evict_every = GEOCODE_EVICT_EVERY
+        self._writes = itertools.count(1)  # next() is atomic, so threads never evict on the same write
+
+    def get(self, location):
+        """Return [longitude, latitude] for a cached address or None on a miss"""
+        key = normalize_address(location)
+        coords = self.memory.get(key)
+        if coords is not None:
+            return list(coords)
+
+        now = timezone.now()
+        row = (
+            GeocodedLocation.objects.filter(query=key, expires_at__gt=now)
+            .values_list("longitude", "latitude", "last_used_at")
+            .first()
+        )
+        if row is None:
+            return None
+
+        longitude, latitude, last_used_at = row
+        if last_used_at <= now - self.touch_interval:
+            try:
+                GeocodedLocation.objects.filter(query=key).update(last_used_at=now)
+            except DatabaseError:
+                # Only eviction order depends on it, the hit is still good
+                logger.warning("Could not touch geocode cache entry for %r", key, exc_info=True)
+        # Promote to the memory tier so the next lookup skips the database
+        self.memory.set(key, (longitude, latitude))
+        return [longitude, latitude]
+
+    def set(self, location, coords):
+        """Store coordinates for an address in both tiers"""
+        key = normalize_address(location)
+        coords = (coords[0], coords[1])
+        self.memory.set(key, coords)
+
+        now = timezone.now()
+        values = {
+            "longitude": coords[0],
+            "latitude": coords[1],
+            "last_used_at": now,
+            "expires_at": now + timedelta(seconds=self.ttl),
+        }
+        try:
+            if not GeocodedLocation.objects.filter(query=key).update(**values):
+                GeocodedLocation.objects.create(query=key, **values)
+            if next(self._writes) % self.evict_every == 0:
+                self._evict(now)
+        except DatabaseError:
+            # The database tier is only an optimisation, a failed write must not fail the lookup
+            logger.warning("Could not persist geocode cache entry for %r", key, exc_info=True)
+
+    async def aget(self, location):
+        """Async get: memory hits stay on the event loop, only the database tier runs in a thread"""
+        coords = self.memory.get(normalize_address(location))
+        if coords is not None:
+            return list(coords)
+        return await sync_to_async(self.get)(location)
+
+    async def aset(self, location, coords):
+        await sync_to_async(self.set)(location, coords)
+
+    def _evict(self, now):
+        """Drop expired rows, then the least recently used ones beyond the size limit.
+
+        Run every evict_every writes, so the table may briefly hold that many rows over db_size.
+        """
+        GeocodedLocation.objects.filter(expires_at__lte=now).delete()
+        overflow = GeocodedLocation.objects.count() - self.db_size
+        if overflow > 0:
+            stale_ids = list(
+                GeocodedLocation.objects.order_by("last_used_at").values_list("id", flat=True)[:overflow]
+            )
+            GeocodedLocation.objects.filter(id__in=stale_ids).delete()
+
+
+# Shared by every RouteService in the process
+geocode_cache = GeocodeCache()
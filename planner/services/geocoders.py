@@ -0,0 +1,365 @@
+import asyncio
+import logging
+import math
+import threading
+from array import array
+from bisect import bisect_left
+
+from decouple import Csv, config
+from requests import RequestException
+
+from .datasets import LocalDataset
+from .geocode_cache import normalize_address
+from .geometry import haversine
+from .http_client import UpstreamUnavailable, ors_async_client, ors_client
+
+logger = logging.getLogger(__name__)
+
+# Tried in order, e.g. "gazetteer,ors" answers known terminals locally and falls back to ORS
+GEOCODER_BACKENDS = config("GEOCODER_BACKENDS", default="ors", cast=Csv())
+GAZETTEER_PATH = config("GAZETTEER_PATH", default="")  # CSV or SQLite with name, longitude, latitude
+GAZETTEER_MIN_SIMILARITY = config("GAZETTEER_MIN_SIMILARITY", default=0.75, cast=float)  # Trigram Jaccard
+# A fuzzy match this close to the best one at another place makes the query ambiguous
+GAZETTEER_AMBIGUITY_MARGIN = config("GAZETTEER_AMBIGUITY_MARGIN", default=0.05, cast=float)
+GEOCODE_MIN_CONFIDENCE = config("GEOCODE_MIN_CONFIDENCE", default=0.5, cast=float)  # ORS feature confidence
+
+MIN_PREFIX_LENGTH = 4
+MAX_WORD_CANDIDATES = 256  # Entries sharing rare words that are scored before falling back to a trigram scan
+SAME_PLACE_METERS = 1000  # Fuzzy matches closer than this are aliases of one place, not rival answers
+AMBIGUOUS = object()  # Prefix shared by names at different places
+
+STATE_NAMES = {
+    "al": "alabama", "ak": "alaska", "az": "arizona", "ar": "arkansas", "ca": "california", "co": "colorado",
+    "ct": "connecticut", "de": "delaware", "dc": "dc", "fl": "florida", "ga": "georgia", "hi": "hawaii",
+    "id": "idaho", "il": "illinois", "in": "indiana", "ia": "iowa", "ks": "kansas", "ky": "kentucky",
+    "la": "louisiana", "me": "maine", "md": "maryland", "ma": "massachusetts", "mi": "michigan",
+    "mn": "minnesota", "ms": "mississippi", "mo": "missouri", "mt": "montana", "ne": "nebraska", "nv": "nevada",
+    "nh": "new hampshire", "nj": "new jersey", "nm": "new mexico", "ny": "new york", "nc": "north carolina",
+    "nd": "north dakota", "oh": "ohio", "ok": "oklahoma", "or": "oregon", "pa": "pennsylvania",
+    "ri": "rhode island", "sc": "south carolina", "sd": "south dakota", "tn": "tennessee", "tx": "texas",
+    "ut": "utah", "vt": "vermont", "va": "virginia", "wa": "washington", "wv": "west virginia",
+    "wi": "wisconsin", "wy": "wyoming",
+}
+# Codes and full names of every state, normalized, to its code
+STATES = dict({code: code for code in STATE_NAMES}, **{name: code for code, name in STATE_NAMES.items()})
+
+
+class Geocoder:
+    """Turns an address into [longitude, latitude], or None when it cannot place it.
+
+    remote geocoders call out over the network, their answers are worth keeping in the geocode cache.
+    """
+
+    name = None
+    remote = False
+
+    def geocode(self, location):
+        raise NotImplementedError
+
+    async def ageocode(self, location):
+        return self.geocode(location)
+
+
+class ORSGeocoder(Geocoder):
+    """OpenRouteService geocoding, taking the most confident feature above GEOCODE_MIN_CONFIDENCE"""
+
+    name = "ors"
+    remote = True
+    url = "https://api.openrouteservice.org/geocode/search"
+
+    def __init__(self, api_key, min_confidence=GEOCODE_MIN_CONFIDENCE):
+        self.api_key = api_key
+        self.min_confidence = min_confidence
+
+    def geocode(self, location):
+        try:
+            response = ors_client.get(self.url, params=self._params(location))
+        except (RequestException, UpstreamUnavailable) as error:
+            logger.warning("Geocoding %r failed: %s", location, error)
+            return None
+        return self._coordinates_from(location, response)
+
+    async def ageocode(self, location):
+        import httpx
+
+        try:
+            response = await ors_async_client.get(self.url, params=self._params(location))
+        except (httpx.HTTPError, UpstreamUnavailable) as error:
+            logger.warning("Geocoding %r failed: %s", location, error)
+            return None
+        return self._coordinates_from(location, response)
+
+    def _params(self, location):
+        return {"api_key": self.api_key, "text": location}
+
+    def _coordinates_from(self, location, response):
+        """Coordinates of the most confident result, or None if the lookup failed or was too vague"""
+        if response.status_code != 200:
+            logger.warning("Geocoding %r failed with %s: %s", location, response.status_code, response.text[:500])
+            return None
+
+        features = response.json().get("features") or []
+        if not features:
+            return None
+
+        # Features without a confidence score are trusted, as the first result always used to be
+        best = max(features, key=lambda feature: feature.get("properties", {}).get("confidence", 1))
+        confidence = best.get("properties", {}).get("confidence", 1)
+        if confidence < self.min_confidence:
+            logger.warning("Geocoding %r was too uncertain (confidence %s)", location, confidence)
+            return None
+        return best["geometry"]["coordinates"]
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _constraints(key):
+    """(state code or None, numeric tokens) of a normalized name, which a fuzzy match must agree on.
+
+    The state is the last word or two before any numbers, so "kansas city ks 66101" is in KS and
+    "kansas city" has no state. Numeric tokens are ZIP codes, store and exit numbers.
+    """
+    words = key.split()
+    numbers = frozenset(word for word in words if any(character.isdigit() for character in word))
+    names = [word for word in words if word not in numbers]
+    for size in (2, 1):
+        if len(names) >= size:
+            state = STATES.get(" ".join(names[-size:]))
+            if state is not None:
+                return state, numbers
+    return None, numbers
+
+
+class GazetteerIndex:
+    """In-memory exact, prefix, word and trigram index over normalized place names"""
+
+    def __init__(self, entries):
+        self.names = []
+        self.coordinates = []
+        self.exact = {}
+        self.trigram_counts = array("H")
+        self.postings = {}
+        self.words = {}
+        self.states = []  # State code of every entry, or None
+        self.numbers = []  # Numeric tokens of every entry
+
+        for name, longitude, latitude in entries:
+            key = normalize_address(name)
+            if not key or key in self.exact:
+                continue
+            entry = len(self.names)
+            self.exact[key] = entry
+            self.names.append(key)
+            self.coordinates.append((float(longitude), float(latitude)))
+            state, numbers = _constraints(key)
+            self.states.append(state)
+            self.numbers.append(numbers)
+            trigrams = _trigrams(key)
+            self.trigram_counts.append(min(len(trigrams), 0xFFFF))
+            for trigram in trigrams:
+                self.postings.setdefault(trigram, array("I")).append(entry)
+            for word in set(key.split()):
+                self.words.setdefault(word, array("I")).append(entry)
+
+        self.sorted_names = sorted(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, location, min_similarity=GAZETTEER_MIN_SIMILARITY):
+        """Best matching entry's [longitude, latitude], or None"""
+        key = normalize_address(location)
+        if not key:
+            return None
+
+        entry = self.exact.get(key)
+        if entry is None:
+            entry = self._prefix(key)
+            if entry is AMBIGUOUS:
+                # A fuzzy match would only pick one of the places starting with key
+                return None
+        if entry is None:
+            entry = self._fuzzy(key, min_similarity)
+        return list(self.coordinates[entry]) if entry is not None else None
+
+    def _prefix(self, key):
+        """Shortest name starting with key, so "dallas tx" finds "dallas tx 75201" but not "dal".
+
+        AMBIGUOUS when any two names starting with key are at different places, e.g. "dallas" with
+        both Dallas GA and Dallas TX known, so that the next geocoder decides.
+        """
+        if len(key) < MIN_PREFIX_LENGTH:
+            return None
+        position = bisect_left(self.sorted_names, key)
+        shortest = None
+        while position < len(self.sorted_names) and self.sorted_names[position].startswith(key):
+            entry = self.exact[self.sorted_names[position]]
+            if shortest is None:
+                shortest = entry
+            elif haversine(*self.coordinates[shortest], *self.coordinates[entry]) > SAME_PLACE_METERS:
+                logger.info(
+                    "Gazetteer prefix %r is ambiguous between %r and %r", key, self.names[shortest], self.names[entry]
+                )
+                return AMBIGUOUS
+            elif len(self.names[entry]) < len(self.names[shortest]):
+                shortest = entry
+            position += 1
+        return shortest
+
+    def _fuzzy(self, key, min_similarity):
+        """Entry with the highest trigram Jaccard similarity above min_similarity, or None.
+
+        Candidates in another state or missing one of the query's numbers are never a match, and
+        when a rival place scores within GAZETTEER_AMBIGUITY_MARGIN of the best the query is left
+        to the next geocoder rather than guessed.
+        """
+        trigrams = _trigrams(key)
+        constraints = _constraints(key)
+        # A typo rarely hits every word, so entries sharing the query's rarest words (store numbers,
+        # town names) are tried first and the trigram lists are only scanned when none of them match
+        scored = self._scored(trigrams, constraints, self._word_candidates(key), min_similarity)
+        if not scored:
+            scored = self._scored(
+                trigrams, constraints, self._trigram_candidates(trigrams, min_similarity), min_similarity
+            )
+        return self._unambiguous(key, scored)
+
+    def _word_candidates(self, key):
+        lists = sorted((self.words[word] for word in set(key.split()) if word in self.words), key=len)
+        candidates = set()
+        for entries in lists:
+            if len(candidates) + len(entries) > MAX_WORD_CANDIDATES:
+                break
+            candidates.update(entries)
+        return candidates
+
+    def _trigram_candidates(self, trigrams, min_similarity):
+        lists = sorted((self.postings.get(trigram, ()) for trigram in trigrams), key=len)
+        # A match shares at least min_similarity of the query's trigrams, so it has to appear in one
+        # of the rarest len - needed + 1 lists, only those are scanned for candidates
+        needed = math.ceil(min_similarity * len(trigrams))
+        candidates = set()
+        for entries in lists[:len(lists) - needed + 1]:
+            candidates.update(entries)
+        return candidates
+
+    def _scored(self, trigrams, constraints, candidates, min_similarity):
+        """(score, entry) of every candidate agreeing with the constraints and scoring min_similarity"""
+        state, numbers = constraints
+        scored = []
+        for entry in candidates:
+            if state is not None and self.states[entry] != state:
+                continue
+            if not numbers <= self.numbers[entry]:
+                continue
+            count = len(trigrams & _trigrams(self.names[entry]))
+            score = count / (len(trigrams) + self.trigram_counts[entry] - count)
+            if score >= min_similarity:
+                scored.append((score, entry))
+        return scored
+
+    def _unambiguous(self, key, scored):
+        """Best scored entry, or None when another place scores nearly as well"""
+        if not scored:
+            return None
+        best_score, best = max(scored, key=lambda item: (item[0], -item[1]))
+        lon, lat = self.coordinates[best]
+        for score, entry in scored:
+            if score < best_score - GAZETTEER_AMBIGUITY_MARGIN:
+                continue
+            if haversine(lon, lat, *self.coordinates[entry]) > SAME_PLACE_METERS:
+                logger.info(
+                    "Gazetteer match for %r is ambiguous between %r and %r", key, self.names[best], self.names[entry]
+                )
+                return None
+        return best
+
+
+class GazetteerDataset(LocalDataset):
+    """The gazetteer file, read into a GazetteerIndex on first use"""
+
+    table = "gazetteer"
+    columns = ("name", "longitude", "latitude")
+    description = "gazetteer entries"
+
+    def build(self, rows):
+        return GazetteerIndex(rows)
+
+
+class GazetteerGeocoder(Geocoder):
+    """Answers known places (terminals, truck stops, cities) in-process from a gazetteer file.
+
+    CSV files need name, longitude and latitude columns, SQLite files a gazetteer table with the
+    same columns. The file is read once, on the first lookup.
+    """
+
+    name = "gazetteer"
+
+    def __init__(self, path=GAZETTEER_PATH):
+        self.dataset = GazetteerDataset(path)
+
+    @property
+    def index(self):
+        return self.dataset.index
+
+    def geocode(self, location):
+        return self.index.lookup(location)
+
+
+class GeocoderChain:
+    """Local geocoders first, then remote ones, each only consulted when the previous found nothing"""
+
+    def __init__(self, geocoders):
+        self.local = [geocoder for geocoder in geocoders if not geocoder.remote]
+        self.remote = [geocoder for geocoder in geocoders if geocoder.remote]
+
+    def geocode_local(self, location):
+        for geocoder in self.local:
+            coords = geocoder.geocode(location)
+            if coords is not None:
+                return coords
+        return None
+
+    def geocode_remote(self, location):
+        for geocoder in self.remote:
+            coords = geocoder.geocode(location)
+            if coords is not None:
+                return coords
+        return None
+
+    async def ageocode_local(self, location):
+        """geocode_local off the event loop, the first lookup loads the gazetteer and every one scans its trigrams"""
+        if not self.local:
+            return None
+        return await asyncio.to_thread(self.geocode_local, location)
+
+    async def ageocode_remote(self, location):
+        for geocoder in self.remote:
+            coords = await geocoder.ageocode(location)
+            if coords is not None:
+                return coords
+        return None
+
+
+_chain = None
+_chain_lock = threading.Lock()
+
+
+def get_geocoder(api_key):
+    """Process-wide geocoder chain, so the gazetteer is only loaded once"""
+    global _chain
+    with _chain_lock:
+        if _chain is None:
+            geocoders = []
+            for name in GEOCODER_BACKENDS:
+                if name == ORSGeocoder.name:
+                    geocoders.append(ORSGeocoder(api_key))
+                elif name == GazetteerGeocoder.name:
+                    geocoders.append(GazetteerGeocoder())
+                else:
+                    raise ValueError(f"Unknown geocoder {name!r} in GEOCODER_BACKENDS, expected 'gazetteer' or 'ors'")
+            _chain = GeocoderChain(geocoders)
+        return _chain
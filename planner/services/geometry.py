@@ -0,0 +1,138 @@
+import math
+from array import array
+from itertools import accumulate
+
+EARTH_RADIUS_METERS = 6371008.8
+METERS_TO_MILES = 0.000621371
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """Great-circle distance in meters between two longitude/latitude points"""
+    lon1, lat1, lon2, lat2 = map(math.radians, (lon1, lat1, lon2, lat2))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(h))
+
+
+def segment_lengths(coordinates):
+    """Haversine length in meters of every segment of a [[lon, lat], ...] line"""
+    return RouteGeometry.from_coordinates(coordinates).segment_lengths()
+
+
+def cumulative(values, start=0.0):
+    """Running totals of values, starting with start, so the result has one more item than values"""
+    return array("d", accumulate(values, initial=start))
+
+
+def _planar(coordinates):
+    """Project [[lon, lat], ...] to local x/y meters, accurate enough for point-to-segment offsets"""
+    xs = array("d")
+    ys = array("d")
+    for lon, lat in coordinates:
+        ys.append(math.radians(lat) * EARTH_RADIUS_METERS)
+        xs.append(math.radians(lon) * EARTH_RADIUS_METERS * math.cos(math.radians(lat)))
+    return xs, ys
+
+
+def simplify(coordinates, tolerance):
+    """Douglas-Peucker simplification of a [[lon, lat], ...] line, tolerance in meters"""
+    count = len(coordinates)
+    if count < 3 or not tolerance or tolerance <= 0:
+        return list(coordinates)
+
+    xs, ys = _planar(coordinates)
+    keep = bytearray(count)
+    keep[0] = keep[-1] = 1
+    tolerance_sq = tolerance * tolerance
+
+    # Iterative to stay clear of the recursion limit on routes with tens of thousands of vertices
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        length_sq = dx * dx + dy * dy
+
+        max_sq, farthest = tolerance_sq, None
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            t = (px * dx + py * dy) / length_sq if length_sq else 0.0
+            t = 0.0 if t < 0 else 1.0 if t > 1 else t
+            ex, ey = px - t * dx, py - t * dy
+            dist_sq = ex * ex + ey * ey
+            if dist_sq > max_sq:
+                max_sq, farthest = dist_sq, i
+
+        if farthest is not None:
+            keep[farthest] = 1
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+
+    return [point for point, kept in zip(coordinates, keep) if kept]
+
+
+class RouteGeometry:
+    """A line held as two contiguous arrays of longitudes and latitudes, converted once per route.
+
+    Lengths are computed in one pass with the radians and cosines of every vertex worked out once,
+    instead of four conversions per segment, and cached for the other queries.
+    """
+
+    def __init__(self, lons=None, lats=None):
+        self.lons = lons if lons is not None else array("d")
+        self.lats = lats if lats is not None else array("d")
+        self._lengths = None
+
+    @classmethod
+    def from_coordinates(cls, coordinates):
+        return cls(array("d", [point[0] for point in coordinates]), array("d", [point[1] for point in coordinates]))
+
+    def __len__(self):
+        return len(self.lons)
+
+    def point(self, i):
+        return [self.lons[i], self.lats[i]]
+
+    def segment_lengths(self):
+        """Haversine length in meters of every segment"""
+        if self._lengths is None:
+            lats = list(map(math.radians, self.lats))
+            lons = list(map(math.radians, self.lons))
+            cos_lats = list(map(math.cos, lats))
+            sin, asin, sqrt = math.sin, math.asin, math.sqrt
+            diameter = 2 * EARTH_RADIUS_METERS
+            self._lengths = array("d", [
+                diameter * asin(sqrt(sin((lat2 - lat1) * 0.5) ** 2 + cos1 * cos2 * sin((lon2 - lon1) * 0.5) ** 2))
+                for lat1, lat2, lon1, lon2, cos1, cos2 in zip(lats, lats[1:], lons, lons[1:], cos_lats, cos_lats[1:])
+            ])
+        return self._lengths
+
+    def cumulative_lengths(self):
+        """Meters from the first vertex to every vertex"""
+        return cumulative(self.segment_lengths())
+
+    def bbox(self):
+        """[min lon, min lat, max lon, max lat], or None for an empty line"""
+        if not self.lons:
+            return None
+        return [min(self.lons), min(self.lats), max(self.lons), max(self.lats)]
+
+    def interpolate(self, i, fraction):
+        """Point fraction of the way from vertex i - 1 to vertex i"""
+        if fraction >= 1.0 or i == 0:
+            return self.point(i)
+        lon, lat = self.lons[i - 1], self.lats[i - 1]
+        return [lon + (self.lons[i] - lon) * fraction, lat + (self.lats[i] - lat) * fraction]
+
+    def nearest_vertex(self, lon, lat, start=0, end=None):
+        """Index of the vertex closest to lon/lat among vertices start to end, or None if there are none"""
+        end = len(self.lons) if end is None else end
+        if start >= end:
+            return None
+        # Equirectangular distances are enough to rank vertices near the point
+        scale = math.cos(math.radians(lat)) ** 2
+        best, best_index = math.inf, None
+        for i, vertex_lon, vertex_lat in zip(range(start, end), self.lons[start:end], self.lats[start:end]):
+            distance = (vertex_lon - lon) ** 2 * scale + (vertex_lat - lat) ** 2
+            if distance < best:
+                best, best_index = distance, i
+        return best_index
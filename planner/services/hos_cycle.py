@@ -0,0 +1,79 @@
+MINUTES_PER_DAY = 24 * 60
+
+
+class CycleTracker:
+    """Rolling 70-hour/8-day on-duty total kept in a ring buffer of daily minutes.
+
+    Every update and query is O(1): advancing the clock only clears the day slots that fall out
+    of the window, and 34 consecutive hours off duty or in the sleeper berth restart the cycle.
+    Times are minutes from the start of the plan and must not go backwards.
+    """
+
+    def __init__(self, max_hours=70, days=8, restart_hours=34, day_start=0):
+        self.limit = max_hours * 60
+        self.days = days
+        self.restart = restart_hours * 60
+        self.day_start = day_start  # Minute of the day the plan starts at, aligns slots to midnight
+        self.slots = [0] * days
+        self.total = 0
+        self.current_day = 0
+        self.off_streak = 0  # Consecutive minutes off duty or in the sleeper berth
+        self.restarts = 0
+
+    def seed(self, minutes, days_ago=1):
+        """Add on-duty minutes worked before the plan started, by default all on the previous day"""
+        if days_ago >= self.days:
+            return
+        self.slots[(self.current_day - days_ago) % self.days] += minutes
+        self.total += minutes
+
+    def add(self, start, minutes, on_duty):
+        """Account for a duty period of minutes starting at minute start"""
+        if not on_duty:
+            previous_streak = self.off_streak
+            self.off_streak += minutes
+            if previous_streak < self.restart <= self.off_streak:
+                self._reset()
+            return
+
+        self.off_streak = 0
+        while minutes > 0:
+            day = self._day(start)
+            self._advance(day)
+            # Split at midnight so each day's slot only holds that day's minutes
+            chunk = min(minutes, (day + 1) * MINUTES_PER_DAY - self.day_start - start)
+            self.slots[day % self.days] += chunk
+            self.total += chunk
+            start += chunk
+            minutes -= chunk
+
+    def available(self, at):
+        """On-duty minutes left in the cycle at minute at"""
+        self._advance(self._day(at))
+        return max(0, self.limit - self.total)
+
+    def available_hours(self, at):
+        return self.available(at) / 60
+
+    def _day(self, minute):
+        return (self.day_start + minute) // MINUTES_PER_DAY
+
+    def _advance(self, day):
+        """Roll the window forward so day is its newest slot, dropping the days that fall out"""
+        steps = day - self.current_day
+        if steps <= 0:
+            return
+        if steps >= self.days:
+            self.slots = [0] * self.days
+            self.total = 0
+        else:
+            for rolled in range(self.current_day + 1, day + 1):
+                slot = rolled % self.days
+                self.total -= self.slots[slot]
+                self.slots[slot] = 0
+        self.current_day = day
+
+    def _reset(self):
+        self.slots = [0] * self.days
+        self.total = 0
+        self.restarts += 1
@@ -0,0 +1,173 @@
+from bisect import bisect_right
+from collections import deque, namedtuple
+
+from .hos_cycle import CycleTracker
+
+# One contiguous duty status. start/end are minutes from the start of the plan and driven is the
+# number of minutes driven before the period began, which maps the period back onto the route
+DutyPeriod = namedtuple("DutyPeriod", "start end status driven remarks")
+
+# Where a driver stands in their shift when the plan starts, all in minutes. driving and since_break
+# are minutes driven in the shift and since the last 30-minute break, elapsed is how long ago the
+# 14-hour window opened (None when it is not open) and off_duty the consecutive minutes off so far
+ShiftState = namedtuple("ShiftState", "driving elapsed since_break off_duty")
+RESTED = ShiftState(0, None, 0, 0)
+
+DRIVING = "D"
+ON_DUTY = "ON"
+OFF_DUTY = "OFF"
+SLEEPER_BERTH = "SB"
+
+
+class HOSSimulator:
+    """Discrete-event hours-of-service simulation that jumps straight to the next duty-status change"""
+
+    def __init__(
+        self,
+        max_driving_hours=11,
+        max_on_duty_hours=14,
+        min_off_duty_hours=10,
+        max_cycle_hours=70,
+        break_after_hours=8,
+        break_minutes=30,
+        restart_hours=34,
+        fuel_minutes=30,
+        stop_window_minutes=60,
+    ):
+        self.max_driving = max_driving_hours * 60
+        self.max_window = max_on_duty_hours * 60
+        self.min_off_duty = min_off_duty_hours * 60
+        self.max_cycle = max_cycle_hours * 60
+        self.break_after = break_after_hours * 60
+        self.break_minutes = break_minutes
+        self.restart = restart_hours * 60
+        self.fuel_minutes = fuel_minutes
+        self.stop_window = stop_window_minutes  # Driving given up to stop at a facility instead of the roadside
+
+    def simulate(self, tasks, cycle_used=0, fuel_marks=(), start_minute=0, shift=RESTED, stop_marks=()):
+        """Plan the duty periods for a list of (status, minutes, remarks) tasks.
+
+        Driving tasks are split around 30-minute breaks, 10-hour rests, 34-hour restarts and fuel
+        stops. cycle_used is the number of on-duty minutes already used in the 70-hour cycle,
+        fuel_marks are the driven minutes at which the truck has to refuel and start_minute is the
+        minute of the day the plan starts at, which decides when hours roll out of the cycle.
+        shift is the ShiftState of a driver who is part way through a shift, by default the plan
+        starts after a full rest. stop_marks are the sorted driven minutes at which the truck passes a
+        truck stop or rest area, a break, rest or restart due within stop_window minutes of one is
+        taken there.
+        """
+        periods = []
+        cycle = CycleTracker(
+            max_hours=self.max_cycle // 60, restart_hours=self.restart // 60, day_start=start_minute
+        )
+        cycle.seed(cycle_used)
+        cycle.off_streak = shift.off_duty
+        state = {
+            "now": 0,
+            # Minute the 14-hour window opened, None while off duty
+            "shift_start": -shift.elapsed if shift.elapsed is not None else None,
+            "shift_driving": shift.driving,
+            "since_break": shift.since_break,  # Driving minutes since the last 30-minute interruption
+            "driven": 0,
+        }
+        fuel_marks = deque(mark for mark in sorted(fuel_marks) if mark > 0)
+
+        def record(status, minutes, remarks=None):
+            now = state["now"]
+            last = periods[-1] if periods else None
+            if status == DRIVING and last and last.status == DRIVING and last.end == now:
+                # Driving resumed straight after driving, e.g. across a task boundary
+                periods[-1] = last._replace(end=now + minutes)
+            else:
+                periods.append(DutyPeriod(now, now + minutes, status, state["driven"], remarks))
+            cycle.add(now, minutes, status in (DRIVING, ON_DUTY))
+            state["now"] = now + minutes
+
+        def on_duty(minutes, remarks):
+            if state["shift_start"] is None:
+                state["shift_start"] = state["now"]
+            record(ON_DUTY, minutes, remarks)
+            # Any 30 consecutive minutes not driving satisfies the break requirement
+            if minutes >= self.break_minutes:
+                state["since_break"] = 0
+
+        def rest(restart):
+            if restart:
+                # The tracker sees 34 consecutive hours off and starts a new cycle
+                record(OFF_DUTY, self.restart, "34-hour restart")
+            else:
+                record(SLEEPER_BERTH, self.min_off_duty, "10-hour rest period")
+            state["shift_start"] = None
+            state["shift_driving"] = 0
+            state["since_break"] = 0
+
+        for status, minutes, remarks in tasks:
+            if status != DRIVING:
+                on_duty(minutes, remarks)
+                continue
+
+            remaining = minutes
+            while remaining > 0:
+                cycle_left = cycle.available(state["now"])
+                if cycle_left <= 0:
+                    rest(restart=True)
+                    continue
+
+                if state["shift_start"] is None:
+                    state["shift_start"] = state["now"]
+                drive_left = self.max_driving - state["shift_driving"]
+                window_left = state["shift_start"] + self.max_window - state["now"]
+                if drive_left <= 0 or window_left <= 0:
+                    rest(restart=False)
+                    continue
+
+                if state["since_break"] >= self.break_after:
+                    record(OFF_DUTY, self.break_minutes, "30-minute break")
+                    state["since_break"] = 0
+                    continue
+
+                # Jump to whichever comes first: end of the task or the next limit or fuel stop
+                step = min(
+                    remaining,
+                    drive_left,
+                    window_left,
+                    cycle_left,
+                    self.break_after - state["since_break"],
+                )
+                while fuel_marks and fuel_marks[0] <= state["driven"]:
+                    fuel_marks.popleft()
+                if fuel_marks:
+                    step = min(step, fuel_marks[0] - state["driven"])
+
+                stop = None
+                limit = min(drive_left, window_left, cycle_left, self.break_after - state["since_break"])
+                if stop_marks and step == limit:
+                    # A limit ends this stretch, stop at the last facility before it if one is close enough
+                    position = bisect_right(stop_marks, state["driven"] + step)
+                    mark = stop_marks[position - 1] if position else 0
+                    if state["driven"] < mark and state["driven"] + step - mark <= self.stop_window:
+                        step = mark - state["driven"]
+                        if limit == cycle_left:
+                            stop = "restart"
+                        elif limit in (drive_left, window_left):
+                            stop = "rest"
+                        else:
+                            stop = "break"
+
+                record(DRIVING, step)
+                remaining -= step
+                state["driven"] += step
+                state["shift_driving"] += step
+                state["since_break"] += step
+
+                if fuel_marks and state["driven"] >= fuel_marks[0]:
+                    fuel_marks.popleft()
+                    on_duty(self.fuel_minutes, "Fueling")
+                if stop in ("rest", "restart"):
+                    rest(restart=stop == "restart")
+                elif stop == "break" and state["since_break"]:
+                    # Unless fueling already interrupted the driving for long enough
+                    record(OFF_DUTY, self.break_minutes, "30-minute break")
+                    state["since_break"] = 0
+
+        return periods
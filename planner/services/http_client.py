@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import threading
+import time
+
+import requests
+from decouple import config
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_SIZE = config("HTTP_POOL_SIZE", default=16, cast=int)  # Keep-alive connections per host
+HTTP_CONNECT_TIMEOUT = config("HTTP_CONNECT_TIMEOUT", default=3.05, cast=float)  # Seconds
+HTTP_READ_TIMEOUT = config("HTTP_READ_TIMEOUT", default=15, cast=float)  # Seconds
+HTTP_MAX_RETRIES = config("HTTP_MAX_RETRIES", default=2, cast=int)
+HTTP_RETRY_BACKOFF = config("HTTP_RETRY_BACKOFF", default=0.5, cast=float)  # 0.5s, 1s, 2s...
+HTTP_RETRY_BACKOFF_MAX = config("HTTP_RETRY_BACKOFF_MAX", default=4, cast=float)  # Cap on a single wait
+CIRCUIT_FAILURE_THRESHOLD = config("CIRCUIT_FAILURE_THRESHOLD", default=5, cast=int)
+CIRCUIT_RESET_TIMEOUT = config("CIRCUIT_RESET_TIMEOUT", default=30, cast=float)  # Seconds
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without calling the upstream while its circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Stop calling an upstream after repeated failures and probe it again after a cool-down"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Return True if a call may go out. After the cool-down a single probe is let through"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Circuit opened after %s consecutive upstream failures", self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class UpstreamClient:
+    """Connection-pooled keep-alive HTTP session with timeouts, bounded retries and a circuit breaker"""
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)):
+        self.timeout = timeout
+        self.breaker = CircuitBreaker()
+        self.session = requests.Session()
+
+        retries = Retry(
+            total=HTTP_MAX_RETRIES,
+            backoff_factor=HTTP_RETRY_BACKOFF,
+            backoff_max=HTTP_RETRY_BACKOFF_MAX,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset({"GET"}),
+            respect_retry_after_header=True,
+            # Hand the last response back instead of raising so callers can inspect it
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, timeout=None, **kwargs):
+        """Send a GET through the shared session. Raises UpstreamUnavailable while the circuit is open"""
+        if not self.breaker.allow_request():
+            raise UpstreamUnavailable(f"Upstream circuit is open, not calling {url}")
+
+        metrics.increment("upstream_requests")
+        try:
+            response = self.session.get(url, timeout=timeout or self.timeout, **kwargs)
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
+
+        if response.status_code in RETRY_STATUS_CODES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+
+class AsyncUpstreamClient:
+    """Pooled keep-alive httpx client for async views, with the same timeouts, retries and breaker.
+
+    Connections belong to the event loop that opened them, so every loop gets its own client,
+    closed on that loop when it shuts down its async generators, as asyncio.run() and asgiref's
+    per-request loops under WSGI both do. A long-lived ASGI loop keeps one pool for its lifetime.
+    httpx is only imported on first use, processes that never serve an async view skip loading it.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, breaker=None):
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self._clients = {}  # Event loop -> (httpx.AsyncClient, async generator that closes it)
+        self._lock = threading.Lock()
+
+    async def _get_client(self):
+        loop = asyncio.get_running_loop()
+        # Loops run on different threads, e.g. one per request under WSGI
+        with self._lock:
+            entry = self._clients.get(loop)
+            created = entry is None
+            if created:
+                client = self._new_client()
+                entry = self._clients[loop] = (client, self._close_at_shutdown(loop, client))
+        if created:
+            # Started on the loop, so the loop finalizes it (and closes the client) when it shuts down
+            await entry[1].asend(None)
+        return entry[0]
+
+    def _new_client(self):
+        import httpx
+
+        limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+        # Retries of failed connects only, status codes are retried below
+        transport = httpx.AsyncHTTPTransport(limits=limits, retries=HTTP_MAX_RETRIES)
+        return httpx.AsyncClient(
+            transport=transport, timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+        )
+
+    async def _close_at_shutdown(self, loop, client):
+        """Suspended until loop.shutdown_asyncgens(), then closes the loop's client on the loop"""
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._clients.pop(loop, None)
+            await client.aclose()
+
+    async def get(self, url, timeout=None, **kwargs):
+        """Send a GET through the shared pool. Raises UpstreamUnavailable while the circuit is open"""
+        if not self.breaker.allow_request():
+            raise UpstreamUnavailable(f"Upstream circuit is open, not calling {url}")
+
+        import httpx
+
+        metrics.increment("upstream_requests")
+        client = await self._get_client()
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            try:
+                response = await client.get(url, **kwargs)
+            except httpx.HTTPError:
+                self.breaker.record_failure()
+                raise
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt == HTTP_MAX_RETRIES:
+                break
+            await asyncio.sleep(self._backoff(response, attempt))
+
+        if response.status_code in RETRY_STATUS_CODES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _backoff(self, response, attempt):
+        """Seconds to wait before retrying, honouring Retry-After like the sync client does"""
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(int(retry_after), HTTP_RETRY_BACKOFF_MAX)
+        return min(HTTP_RETRY_BACKOFF * (2 ** attempt), HTTP_RETRY_BACKOFF_MAX)
+
+
+# One pooled session per process, shared by every RouteService
+ors_client = UpstreamClient()
+# Async counterpart for the async views, both clients trip the same circuit breaker
+ors_async_client = AsyncUpstreamClient(breaker=ors_client.breaker)
@@ -0,0 +1,131 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from decouple import config
+
+# Off by default: every span() and increment() is then a single flag check
+PLANNER_METRICS = config("PLANNER_METRICS", default=False, cast=bool)
+
+# Histogram buckets for stage durations, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_disabled_span = nullcontext()
+
+
+class RequestMetrics:
+    """Stage durations and counters of one request, rendered as a Server-Timing header"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}  # Stage name -> total milliseconds
+        self.counters = {}
+        # Stages can run on several worker threads for the same request
+        self._lock = threading.Lock()
+
+    def add_span(self, name, milliseconds):
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + milliseconds
+
+    def increment(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def server_timing(self):
+        entries = [f"{name};dur={milliseconds:.2f}" for name, milliseconds in self.spans.items()]
+        entries += [f'{name};desc="{value}"' for name, value in self.counters.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+
+class MetricsRegistry:
+    """Process-wide stage histograms and counters, exported in the Prometheus text format"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}  # Stage -> [bucket counts..., +Inf count, sum]
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[bisect_left(self.buckets, seconds)] += 1
+            histogram[-1] += seconds
+
+    def increment(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def render(self):
+        with self._lock:
+            histograms = {name: list(values) for name, values in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = [
+            "# HELP planner_stage_seconds Time spent in each planning stage",
+            "# TYPE planner_stage_seconds histogram",
+        ]
+        for name, values in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                lines.append(f'planner_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'planner_stage_seconds_sum{{stage="{name}"}} {values[-1]}')
+            lines.append(f'planner_stage_seconds_count{{stage="{name}"}} {cumulative}')
+
+        lines += [
+            "# HELP planner_events_total Upstream calls, cache hits and work done by the planner",
+            "# TYPE planner_events_total counter",
+        ]
+        for name, value in sorted(counters.items()):
+            lines.append(f'planner_events_total{{event="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+_request_metrics = ContextVar("planner_request_metrics", default=None)
+
+
+def start_request():
+    """Collect the spans of the current request, returning the collector and the token to reset it with"""
+    request_metrics = RequestMetrics()
+    return request_metrics, _request_metrics.set(request_metrics)
+
+
+def end_request(token):
+    _request_metrics.reset(token)
+
+
+def span(name):
+    """Context manager timing a stage, a no-op unless PLANNER_METRICS is on"""
+    if not PLANNER_METRICS:
+        return _disabled_span
+    return _timed(name)
+
+
+@contextmanager
+def _timed(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        registry.observe(name, seconds)
+        request_metrics = _request_metrics.get()
+        if request_metrics is not None:
+            request_metrics.add_span(name, seconds * 1000)
+
+
+def increment(name, value=1):
+    """Add to a counter, e.g. upstream calls or cache hits"""
+    if not PLANNER_METRICS:
+        return
+    registry.increment(name, value)
+    request_metrics = _request_metrics.get()
+    if request_metrics is not None:
+        request_metrics.increment(name, value)
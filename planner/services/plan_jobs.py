@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from decouple import config
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import PlanJob
+from ..serializers import TripSerializer
+from .eld_service import eld_service
+from .plan_memo import PLAN_JOB_STALE_AFTER, reserve_plan_job
+from .route_format import format_trip_details
+from .route_service import get_route_service
+from .trip_routes import trip_routes
+
+logger = logging.getLogger(__name__)
+
+PLAN_JOB_WORKERS = config("PLAN_JOB_WORKERS", default=2, cast=int)
+PLAN_JOB_MAX_ATTEMPTS = config("PLAN_JOB_MAX_ATTEMPTS", default=3, cast=int)
+PLAN_JOB_RETRY_BACKOFF = config("PLAN_JOB_RETRY_BACKOFF", default=5, cast=float)  # 5s, 10s, 20s... between attempts
+PLAN_JOB_RETRY_BACKOFF_MAX = config("PLAN_JOB_RETRY_BACKOFF_MAX", default=300, cast=float)  # Cap on a single wait
+
+
+class PlanningError(Exception):
+    """Raised when a trip cannot be planned, e.g. because it could not be routed"""
+
+
+def build_plan(trip, route_format=None):
+    """Run the whole planning pipeline for a saved Trip and return the planner response body"""
+    route_format = route_format or {}
+    trip_details, route_summary = get_route_service().calculate_trip_details(
+        trip.current_location,
+        trip.pickup_location,
+        trip.dropoff_location,
+        trip.current_cycle_used
+    )
+    if not trip_details['to_pickup'] or not trip_details['pickup_to_dropoff']:
+        raise PlanningError('Could not calculate a route for the given locations')
+    trip_routes.save(trip, route_summary)
+
+    log_sheets = eld_service.generate_log_sheets(
+        trip_details,
+        trip.current_cycle_used,
+        route_summary=route_summary
+    )
+    return {
+        'trip': TripSerializer(trip).data,
+        'route': format_trip_details(
+            trip_details, route_format.get('geometry', 'geojson'), route_format.get('tolerance')
+        ),
+        'log_sheets': log_sheets,
+    }
+
+
+class PlanJobQueue:
+    """Database-backed queue of PlanJobs drained by a local thread pool, no external broker needed.
+
+    Jobs are claimed with a conditional UPDATE from pending to running, so any number of web
+    processes and `manage.py process_plan_jobs` workers can drain the same table safely.
+    """
+
+    def __init__(self, workers=PLAN_JOB_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plan-jobs")
+        self.finished = threading.Condition()
+
+    def submit(self, trip_input, route_format=None, input_hash='', idempotency_key=None):
+        """Save the trip, queue its plan and wake a worker once the job is committed.
+
+        Returns (job, created) like reserve_plan_job, a concurrent submission with the same
+        Idempotency-Key gets the job that was queued first.
+        """
+        job, created = reserve_plan_job(
+            trip_input, input_hash, idempotency_key, route_format, status=PlanJob.PENDING
+        )
+        if created:
+            transaction.on_commit(self.kick)
+        return job, created
+
+    def kick(self):
+        self.executor.submit(self._drain_in_worker)
+
+    def _drain_in_worker(self):
+        try:
+            self.drain()
+        except Exception:
+            logger.exception("Plan job worker crashed")
+        finally:
+            close_old_connections()
+
+    def drain(self):
+        """Run pending jobs until there are none left, returning how many were run"""
+        count = 0
+        while True:
+            job = self.claim_next()
+            if job is None:
+                return count
+            self.run(job)
+            count += 1
+
+    def claim_next(self):
+        """Atomically move the oldest pending job whose backoff is over to running and return it, or None"""
+        while True:
+            job_id = (
+                PlanJob.objects.filter(status=PlanJob.PENDING)
+                .filter(Q(not_before__isnull=True) | Q(not_before__lte=timezone.now()))
+                .order_by('created_at', 'id')
+                .values_list('id', flat=True)
+                .first()
+            )
+            if job_id is None:
+                return None
+
+            claimed = PlanJob.objects.filter(id=job_id, status=PlanJob.PENDING).update(
+                status=PlanJob.RUNNING, started_at=timezone.now()
+            )
+            # Another worker may have taken it between the SELECT and the UPDATE
+            if claimed:
+                return PlanJob.objects.select_related('trip').get(id=job_id)
+
+    def run(self, job):
+        """Compute the plan for a claimed job and store the result or the error"""
+        job.attempts += 1
+        try:
+            job.result = build_plan(job.trip, job.route_format)
+            job.status = PlanJob.DONE
+            job.error = ''
+        except PlanningError as error:
+            job.status = PlanJob.FAILED
+            job.error = str(error)
+        except Exception as error:
+            logger.exception("Plan job %s failed", job.pk)
+            # Unexpected failures (timeouts, open circuit...) go back in the queue a few times
+            job.status = PlanJob.PENDING if job.attempts < PLAN_JOB_MAX_ATTEMPTS else PlanJob.FAILED
+            job.error = str(error)
+
+        retry_in = None
+        if job.status == PlanJob.PENDING:
+            # Back off exponentially so a struggling upstream is not hit again straight away
+            retry_in = min(PLAN_JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1), PLAN_JOB_RETRY_BACKOFF_MAX)
+            job.not_before = timezone.now() + timedelta(seconds=retry_in)
+        else:
+            job.not_before = None
+        job.finished_at = timezone.now() if job.status != PlanJob.PENDING else None
+        job.save(update_fields=['status', 'result', 'error', 'attempts', 'finished_at', 'not_before'])
+        if retry_in is not None:
+            # Nothing else wakes this process's workers when the backoff is over
+            timer = threading.Timer(retry_in, self.kick)
+            timer.daemon = True
+            timer.start()
+        with self.finished:
+            self.finished.notify_all()
+
+    def requeue_stale(self, older_than=PLAN_JOB_STALE_AFTER):
+        """Put back jobs left running by a worker that died, returning how many were requeued"""
+        cutoff = timezone.now() - timedelta(seconds=older_than)
+        return PlanJob.objects.filter(status=PlanJob.RUNNING, started_at__lt=cutoff).update(
+            status=PlanJob.PENDING, started_at=None, not_before=None
+        )
+
+    def wait(self, job, timeout):
+        """Long-poll: block until the job finishes or timeout seconds pass, then return it fresh"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job.refresh_from_db()
+            remaining = deadline - time.monotonic()
+            if job.is_finished or remaining <= 0:
+                return job
+            # Jobs run in this process wake us straight away, the timeout covers other workers
+            with self.finished:
+                self.finished.wait(min(remaining, 0.5))
+
+
+# Shared by every view in the process
+plan_job_queue = PlanJobQueue()
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import timedelta
+
+from decouple import config
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from ..models import PlanJob, Trip
+from .geocode_cache import normalize_address
+
+# Plans start from the time they were computed, so a memoized plan is only reused for a short while
+PLAN_MEMO_TTL = config("PLAN_MEMO_TTL", default=600, cast=int)  # Seconds
+PLAN_IDEMPOTENCY_TTL = config("PLAN_IDEMPOTENCY_TTL", default=24 * 3600, cast=int)  # Seconds
+# Finished jobs are kept for as long as their Idempotency-Key is honoured, then deleted
+PLAN_JOB_RETENTION = config("PLAN_JOB_RETENTION", default=PLAN_IDEMPOTENCY_TTL, cast=int)  # Seconds
+PLAN_PURGE_INTERVAL = config("PLAN_PURGE_INTERVAL", default=300, cast=int)  # Seconds between purges per process
+# Running jobs older than this were abandoned by a request or worker that died
+PLAN_JOB_STALE_AFTER = config("PLAN_JOB_STALE_AFTER", default=600, cast=int)  # Seconds a job may stay running
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an Idempotency-Key is reused with a different trip input"""
+
+
+def plan_input_hash(trip_input, route_format=None):
+    """Content hash of the normalized TripInputSerializer data and the requested route format"""
+    route_format = route_format or {}
+    payload = {
+        "current_location": normalize_address(trip_input["current_location"]),
+        "pickup_location": normalize_address(trip_input["pickup_location"]),
+        "dropoff_location": normalize_address(trip_input["dropoff_location"]),
+        "current_cycle_used": round(float(trip_input["current_cycle_used"]), 2),
+        "geometry": route_format.get("geometry", "geojson"),
+        "tolerance": route_format.get("tolerance"),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def find_plan_job(input_hash, idempotency_key=None):
+    """Return the PlanJob that already answers this request, or None if it has to be computed.
+
+    A job with the same Idempotency-Key is returned whatever its status, unless it failed or was
+    left running for longer than PLAN_JOB_STALE_AFTER, so retries see the original job. Without a
+    key the most recent finished plan for the same input is reused while it is younger than PLAN_MEMO_TTL.
+    """
+    now = timezone.now()
+    jobs = PlanJob.objects.select_related("trip")
+
+    if idempotency_key:
+        job = (
+            jobs.filter(
+                idempotency_key=idempotency_key,
+                created_at__gte=now - timedelta(seconds=PLAN_IDEMPOTENCY_TTL),
+            )
+            .order_by("-created_at")
+            .first()
+        )
+        if job is not None:
+            if job.input_hash != input_hash:
+                raise IdempotencyConflict("Idempotency-Key was already used with a different trip")
+            if job.status == PlanJob.RUNNING and _abandon_stale(job, now):
+                job.status = PlanJob.FAILED
+            if job.status != PlanJob.FAILED:
+                return job
+
+    return (
+        jobs.filter(
+            input_hash=input_hash,
+            status=PlanJob.DONE,
+            finished_at__gte=now - timedelta(seconds=PLAN_MEMO_TTL),
+        )
+        .order_by("-finished_at")
+        .first()
+    )
+
+
+def _abandon_stale(job, now):
+    """Mark a job running since before PLAN_JOB_STALE_AFTER failed, freeing its Idempotency-Key.
+
+    The request that reserved it was killed before it could release it. Returns whether it was stale.
+    """
+    cutoff = now - timedelta(seconds=PLAN_JOB_STALE_AFTER)
+    if job.started_at is None or job.started_at >= cutoff:
+        return False
+    # Conditional, in case the plan was finished or the job requeued in the meantime
+    return bool(PlanJob.objects.filter(pk=job.pk, status=PlanJob.RUNNING, started_at__lt=cutoff).update(
+        status=PlanJob.FAILED, error="Abandoned while running", finished_at=now
+    ))
+
+
+def reserve_plan_job(trip_input, input_hash, idempotency_key=None, route_format=None, status=PlanJob.RUNNING):
+    """Save the Trip and its PlanJob before the plan is computed, so the Idempotency-Key is taken first.
+
+    Returns (job, True) for the new job, or (job, False) with the job of a concurrent request that
+    took the same key first, in which case nothing is saved. Raises IdempotencyConflict like
+    find_plan_job when that request had a different trip input.
+    """
+    now = timezone.now()
+    if idempotency_key:
+        # An expired key is free again, its old job is kept without it until it is purged
+        PlanJob.objects.filter(
+            idempotency_key=idempotency_key, created_at__lt=now - timedelta(seconds=PLAN_IDEMPOTENCY_TTL)
+        ).update(idempotency_key=None)
+
+    while True:
+        try:
+            with transaction.atomic():
+                trip = Trip.objects.create(**trip_input)
+                job = PlanJob.objects.create(
+                    trip=trip,
+                    status=status,
+                    route_format=route_format or {},
+                    input_hash=input_hash,
+                    idempotency_key=idempotency_key,
+                    started_at=now if status == PlanJob.RUNNING else None,
+                )
+            return job, True
+        except IntegrityError:
+            # Unique live key, see PlanJob.Meta.constraints. If its job failed meanwhile the key is free again
+            job = find_plan_job(input_hash, idempotency_key)
+            if job is not None:
+                return job, False
+
+
+def remember_plan(job, result):
+    """Store the plan computed for a reserved job so that duplicate requests can be answered from it"""
+    job.status = PlanJob.DONE
+    job.result = result
+    job.attempts = 1
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "result", "attempts", "finished_at"])
+    purge_plan_jobs()
+    return job
+
+
+def release_plan(job, error):
+    """Mark a reserved job failed, so its Idempotency-Key can be retried"""
+    job.status = PlanJob.FAILED
+    job.error = error
+    job.attempts = 1
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "attempts", "finished_at"])
+    return job
+
+
+_last_purge = None
+_purge_lock = threading.Lock()
+
+
+def purge_plan_jobs(force=False):
+    """Delete jobs finished more than PLAN_JOB_RETENTION ago, returning how many were deleted.
+
+    Called on every write, but each process only runs the DELETE once per PLAN_PURGE_INTERVAL.
+    """
+    global _last_purge
+    with _purge_lock:
+        now = time.monotonic()
+        if not force and _last_purge is not None and now - _last_purge < PLAN_PURGE_INTERVAL:
+            return 0
+        _last_purge = now
+
+    cutoff = timezone.now() - timedelta(seconds=PLAN_JOB_RETENTION)
+    deleted, _ = PlanJob.objects.filter(
+        status__in=[PlanJob.DONE, PlanJob.FAILED], finished_at__lt=cutoff
+    ).delete()
+    return deleted
@@ -0,0 +1,210 @@
+import logging
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+
+from decouple import config
+
+from .datasets import LocalDataset
+from .geometry import EARTH_RADIUS_METERS, METERS_TO_MILES
+
+logger = logging.getLogger(__name__)
+
+# CSV or SQLite with name, longitude, latitude and kind (truck_stop, rest_area or fuel) columns
+POI_DATASET_PATH = config("POI_DATASET_PATH", default="")
+POI_SEARCH_RADIUS_MILES = config("POI_SEARCH_RADIUS_MILES", default=2, cast=float)  # Off the route
+POI_SNAP_WINDOW_MINUTES = config("POI_SNAP_WINDOW_MINUTES", default=60, cast=int)  # Driving to give up
+
+CELL_DEGREES = 0.1  # Roughly 11 km grid cells
+
+TRUCK_STOP = "truck_stop"
+REST_AREA = "rest_area"
+FUEL = "fuel"
+KINDS = (TRUCK_STOP, REST_AREA, FUEL)
+PARKING_KINDS = frozenset((TRUCK_STOP, REST_AREA))  # Somewhere to take a break or a 10-hour rest
+FUEL_KINDS = frozenset((TRUCK_STOP, FUEL))
+
+
+def _meters_per_degree(lat):
+    """Meters per degree of longitude and of latitude around lat, for equirectangular distances"""
+    per_degree = EARTH_RADIUS_METERS * math.pi / 180
+    return per_degree * max(math.cos(math.radians(lat)), 0.01), per_degree
+
+
+class RouteFacilities:
+    """Facilities near one route, in driving order, each keyed by where the truck passes closest to it.
+
+    Built once per route by PoiIndex.along_route, every query after that is a bisection.
+    """
+
+    def __init__(self, pois):
+        self.pois = pois
+        self.times = array("d")  # Seconds of driving to the closest route vertex
+        self.distances = array("d")  # Meters driven to the closest route vertex
+        self.entries = array("I")  # Entry in the PoiIndex
+        self.offsets = array("d")  # Meters between the facility and the route
+
+    def __len__(self):
+        return len(self.entries)
+
+    def describe(self, position):
+        entry = self.entries[position]
+        return {
+            "name": self.pois.names[entry],
+            "kind": KINDS[self.pois.kinds[entry]],
+            "location": [self.pois.lons[entry], self.pois.lats[entry]],
+            "route_miles": round(self.distances[position] * METERS_TO_MILES, 1),
+            "miles_off_route": round(self.offsets[position] * METERS_TO_MILES, 2),
+        }
+
+    def _matches(self, position, kinds):
+        return kinds is None or KINDS[self.pois.kinds[self.entries[position]]] in kinds
+
+    def ahead(self, seconds, limit=5, kinds=None):
+        """The next limit facilities after seconds of driving"""
+        found = []
+        position = bisect_right(self.times, seconds)
+        while position < len(self.entries) and len(found) < limit:
+            if self._matches(position, kinds):
+                found.append(self.describe(position))
+            position += 1
+        return found
+
+    def at_minute(self, minute, kinds=PARKING_KINDS):
+        """The facility a stop planned at this driven minute was pulled back to, or None"""
+        position = bisect_left(self.times, minute * 60 - 30)
+        while position < len(self.entries) and self.times[position] < minute * 60 + 30:
+            if self._matches(position, kinds):
+                return self.describe(position)
+            position += 1
+        return None
+
+    def after(self, seconds, meters):
+        """RouteFacilities from seconds of driving on, rebased to a route starting there, meters into this one"""
+        rest = RouteFacilities(self.pois)
+        for position in range(bisect_left(self.times, seconds), len(self.entries)):
+            rest.times.append(self.times[position] - seconds)
+            rest.distances.append(self.distances[position] - meters)
+            rest.entries.append(self.entries[position])
+            rest.offsets.append(self.offsets[position])
+        return rest
+
+    def stop_marks(self, kinds=PARKING_KINDS):
+        """Driven minutes at which the truck passes a facility, as HOSSimulator takes them"""
+        return [
+            round(self.times[position] / 60) for position in range(len(self.entries)) if self._matches(position, kinds)
+        ]
+
+
+class PoiIndex:
+    """Truck stops, rest areas and fuel stations bucketed in a lat/lon grid"""
+
+    def __init__(self, entries):
+        self.names = []
+        self.lons = array("d")
+        self.lats = array("d")
+        self.kinds = array("B")  # Position in KINDS
+        self.cells = {}
+
+        skipped = 0
+        for name, longitude, latitude, kind in entries:
+            kind = (kind or TRUCK_STOP).strip().lower()
+            try:
+                lon, lat = float(longitude), float(latitude)
+            except (TypeError, ValueError):
+                skipped += 1
+                continue
+            if kind not in KINDS:
+                skipped += 1
+                continue
+            entry = len(self.names)
+            self.names.append(name)
+            self.lons.append(lon)
+            self.lats.append(lat)
+            self.kinds.append(KINDS.index(kind))
+            self.cells.setdefault(self._cell(lon, lat), array("I")).append(entry)
+        if skipped:
+            logger.warning("Skipped %s points of interest without valid coordinates or kind", skipped)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _cell(self, lon, lat):
+        return math.floor(lon / CELL_DEGREES), math.floor(lat / CELL_DEGREES)
+
+    def _near(self, lon, lat, radius):
+        """Entries in the grid cells within radius meters of lon/lat"""
+        lon_meters, lat_meters = _meters_per_degree(lat)
+        min_x, min_y = self._cell(lon - radius / lon_meters, lat - radius / lat_meters)
+        max_x, max_y = self._cell(lon + radius / lon_meters, lat + radius / lat_meters)
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                yield from self.cells.get((x, y), ())
+
+    def along_route(self, route_index, radius=POI_SEARCH_RADIUS_MILES / METERS_TO_MILES):
+        """RouteFacilities of every entry within radius meters of the route of a RouteIndex"""
+        facilities = RouteFacilities(self)
+        count = len(route_index)
+        if not self.names or count < 2:
+            return facilities
+
+        lons, lats = route_index.geometry.lons, route_index.geometry.lats
+        distances = route_index.distances
+        # Look around one vertex every radius meters of road for the closest sample to each facility
+        samples = [0]
+        while samples[-1] < count - 1:
+            following = bisect_left(distances, distances[samples[-1]] + radius)
+            samples.append(min(count - 1, max(samples[-1] + 1, following)))
+
+        nearest_sample = {}  # Entry -> (meters to the sample, position in samples)
+        for k, vertex in enumerate(samples):
+            lon_meters, lat_meters = _meters_per_degree(lats[vertex])
+            for entry in self._near(lons[vertex], lats[vertex], 2 * radius):
+                offset = math.hypot(
+                    (self.lons[entry] - lons[vertex]) * lon_meters, (self.lats[entry] - lats[vertex]) * lat_meters
+                )
+                if offset <= 2 * radius and offset < nearest_sample.get(entry, (math.inf,))[0]:
+                    nearest_sample[entry] = (offset, k)
+
+        # Then measure each one against every vertex between the samples either side of its closest
+        best = []
+        for entry, (_, k) in nearest_sample.items():
+            lon, lat = self.lons[entry], self.lats[entry]
+            lon_meters, lat_meters = _meters_per_degree(lat)
+            offset, vertex = min(
+                (math.hypot((lons[i] - lon) * lon_meters, (lats[i] - lat) * lat_meters), i)
+                for i in range(samples[max(0, k - 1)], samples[min(len(samples) - 1, k + 1)] + 1)
+            )
+            if offset <= radius:
+                best.append((vertex, offset, entry))
+
+        for vertex, offset, entry in sorted(best):
+            facilities.times.append(route_index.times[vertex])
+            facilities.distances.append(distances[vertex])
+            facilities.entries.append(entry)
+            facilities.offsets.append(offset)
+        return facilities
+
+
+class PoiDataset(LocalDataset):
+    """The POI_DATASET_PATH file, read into a PoiIndex on first use.
+
+    CSV files need name, longitude and latitude columns and may have a kind column, SQLite files a
+    pois table with the same columns. Without a dataset every index is empty and stops stay wherever
+    the hours run out.
+    """
+
+    table = "pois"
+    columns = ("name", "longitude", "latitude")
+    optional = ("kind",)
+    description = "points of interest"
+
+    def __init__(self, path=POI_DATASET_PATH):
+        super().__init__(path)
+
+    def build(self, rows):
+        return PoiIndex(rows)
+
+
+# Shared by every route in the process
+poi_dataset = PoiDataset()
@@ -0,0 +1,40 @@
+from decouple import config
+
+from .cache import LRUCache
+
+# Decimal places coordinates are snapped to before keying; 4 places is roughly 11 metres
+ROUTE_CACHE_PRECISION = config("ROUTE_CACHE_PRECISION", default=4, cast=int)
+ROUTE_CACHE_SIZE = config("ROUTE_CACHE_SIZE", default=512, cast=int)
+ROUTE_CACHE_TTL = config("ROUTE_CACHE_TTL", default=24 * 3600, cast=int)  # Seconds
+
+
+class RouteCache:
+    """In-process cache of directions responses keyed by snapped origin/destination and profile"""
+
+    def __init__(self, precision=ROUTE_CACHE_PRECISION, max_entries=ROUTE_CACHE_SIZE, ttl=ROUTE_CACHE_TTL):
+        self.precision = precision
+        self.entries = LRUCache(max_entries=max_entries, ttl=ttl)
+
+    def make_key(self, profile, origin_coords, dest_coords):
+        """Snap both ends to the configured precision so nearby requests share an entry"""
+        return (
+            profile,
+            round(float(origin_coords[0]), self.precision),
+            round(float(origin_coords[1]), self.precision),
+            round(float(dest_coords[0]), self.precision),
+            round(float(dest_coords[1]), self.precision),
+        )
+
+    def get(self, profile, origin_coords, dest_coords):
+        """Return the cached directions response or None. Callers must treat it as read-only"""
+        return self.entries.get(self.make_key(profile, origin_coords, dest_coords))
+
+    def set(self, profile, origin_coords, dest_coords, route):
+        self.entries.set(self.make_key(profile, origin_coords, dest_coords), route)
+
+    def stats(self):
+        return dict(self.entries.stats(), precision=self.precision)
+
+
+# Shared by every RouteService in the process
+route_cache = RouteCache()
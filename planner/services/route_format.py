@@ -0,0 +1,44 @@
+import polyline
+
+from .geometry import simplify
+
+POLYLINE_PRECISION = 5  # Same precision as Google/ORS encoded polylines
+
+
+def compact_route(route, tolerance=None):
+    """Reduce an ORS directions response to its summary and an encoded polyline, dropping segments and steps"""
+    if not route or not route.get("features"):
+        return None
+
+    feature = route["features"][0]
+    properties = feature.get("properties", {})
+    coordinates = feature.get("geometry", {}).get("coordinates", [])
+    if tolerance:
+        coordinates = simplify(coordinates, tolerance)
+
+    return {
+        "summary": properties.get("summary", {}),
+        "bbox": feature.get("bbox", route.get("bbox")),
+        "geometry": polyline.encode(
+            [(point[0], point[1]) for point in coordinates], POLYLINE_PRECISION, geojson=True
+        ),
+        "geometry_format": "polyline",
+        "precision": POLYLINE_PRECISION,
+        "vertices": len(coordinates),
+    }
+
+
+def compact_trip_details(trip_details, tolerance=None):
+    """Copy of the trip details with both legs replaced by their compact form"""
+    return dict(
+        trip_details,
+        to_pickup=compact_route(trip_details["to_pickup"], tolerance),
+        pickup_to_dropoff=compact_route(trip_details["pickup_to_dropoff"], tolerance),
+    )
+
+
+def format_trip_details(trip_details, geometry="geojson", tolerance=None):
+    """Return the trip details with the route geometry in the requested format"""
+    if geometry == "polyline":
+        return compact_trip_details(trip_details, tolerance)
+    return trip_details
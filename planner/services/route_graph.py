@@ -0,0 +1,279 @@
+import heapq
+import math
+import mmap
+import struct
+from array import array
+
+from .geometry import haversine
+
+# File layout, all little-endian: a 40-byte header followed by the CSR arrays and the snap grid
+#   magic "ELDG", version, node count, edge count, max speed (float64 m/s over all edges),
+#   grid origin cell x, y (int32) and grid width, height (uint32) in SNAP_CELL_DEGREES cells
+#   lon[n], lat[n]       int32 microdegrees
+#   offsets[n + 1]       uint32, edges of node i are offsets[i]:offsets[i + 1]
+#   targets[m]           uint32
+#   lengths[m]           float32 meters
+#   durations[m]         float32 seconds
+#   cell_starts[w*h + 1] uint32, nodes of cell (x, y) are cell_nodes[cell_starts[c]:cell_starts[c + 1]]
+#   cell_nodes[n]        uint32 node indexes grouped by cell, c = (y - origin y) * w + (x - origin x)
+GRAPH_MAGIC = b"ELDG"
+GRAPH_VERSION = 2
+HEADER = struct.Struct("<4sIIIdiiII")
+MICRODEGREES = 1_000_000
+
+SNAP_CELL_DEGREES = 0.05  # Roughly 5 km grid cells for snapping coordinates to the nearest node
+SNAP_MAX_RINGS = 10  # Give up snapping beyond this many cells around the point
+
+
+class RouteGraphError(Exception):
+    """Raised when a route graph file is missing or malformed"""
+
+
+def _cell(lon, lat):
+    return math.floor(lon / SNAP_CELL_DEGREES), math.floor(lat / SNAP_CELL_DEGREES)
+
+
+def write_graph(path, nodes, edges):
+    """Write a route graph file.
+
+    nodes is a list of (lon, lat) and edges a list of (source, target, length_m, duration_s)
+    node indexes, directed. Edges are stored grouped by source and the snap grid is built here,
+    so the file can be mapped as is.
+    """
+    edges = sorted(edges, key=lambda edge: edge[0])
+    offsets = array("I", [0] * (len(nodes) + 1))
+    for source, *_ in edges:
+        offsets[source + 1] += 1
+    for i in range(len(nodes)):
+        offsets[i + 1] += offsets[i]
+
+    lons = array("i", (round(lon * MICRODEGREES) for lon, _ in nodes))
+    lats = array("i", (round(lat * MICRODEGREES) for _, lat in nodes))
+    lengths = array("f", (edge[2] for edge in edges))
+    durations = array("f", (edge[3] for edge in edges))
+    # Fastest edge of the graph keeps the A* heuristic admissible, taken over the stored float32 values
+    max_speed = max(
+        (length / duration for length, duration in zip(lengths, durations) if duration > 0), default=1.0
+    )
+
+    # Snap grid over the bounding box of the nodes, cells counted from the south-west corner
+    cells = [_cell(lon / MICRODEGREES, lat / MICRODEGREES) for lon, lat in zip(lons, lats)]
+    origin_x = min((x for x, _ in cells), default=0)
+    origin_y = min((y for _, y in cells), default=0)
+    width = max((x for x, _ in cells), default=origin_x - 1) - origin_x + 1
+    height = max((y for _, y in cells), default=origin_y - 1) - origin_y + 1
+    cell_of = [(y - origin_y) * width + (x - origin_x) for x, y in cells]
+    cell_starts = array("I", [0] * (width * height + 1))
+    for cell in cell_of:
+        cell_starts[cell + 1] += 1
+    for i in range(width * height):
+        cell_starts[i + 1] += cell_starts[i]
+    cell_nodes = array("I", sorted(range(len(nodes)), key=cell_of.__getitem__))
+
+    with open(path, "wb") as graph_file:
+        graph_file.write(HEADER.pack(
+            GRAPH_MAGIC, GRAPH_VERSION, len(nodes), len(edges), max_speed, origin_x, origin_y, width, height
+        ))
+        for values in (
+            lons,
+            lats,
+            offsets,
+            array("I", (edge[1] for edge in edges)),
+            lengths,
+            durations,
+            cell_starts,
+            cell_nodes,
+        ):
+            graph_file.write(values.tobytes())
+
+
+class RouteGraph:
+    """Road graph memory-mapped from a file written by write_graph, queried with A*.
+
+    The arrays and the snap grid are memoryviews over the mapping, so loading costs no parsing
+    and the pages are shared between every worker process on the host.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, "rb") as graph_file:
+                self._map = mmap.mmap(graph_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as error:
+            raise RouteGraphError(f"Cannot open route graph {path}: {error}") from error
+
+        if len(self._map) < HEADER.size:
+            raise RouteGraphError(f"{path} is not a route graph")
+        magic, version, node_count, edge_count, max_speed, origin_x, origin_y, width, height = (
+            HEADER.unpack_from(self._map)
+        )
+        if magic != GRAPH_MAGIC or version != GRAPH_VERSION:
+            raise RouteGraphError(f"{path} is not a version {GRAPH_VERSION} route graph, rebuild it")
+        cell_count = width * height
+        if len(self._map) != HEADER.size + 4 * (4 * node_count + 1 + 3 * edge_count + cell_count + 1):
+            raise RouteGraphError(f"{path} is truncated")
+
+        self.node_count = node_count
+        self.edge_count = edge_count
+        self.max_speed = max_speed
+        self.grid_origin = (origin_x, origin_y)
+        self.grid_size = (width, height)
+        view = memoryview(self._map)
+        position = HEADER.size
+
+        def take(typecode, count):
+            nonlocal position
+            part = view[position:position + 4 * count].cast(typecode)
+            position += 4 * count
+            return part
+
+        self.lons = take("i", node_count)
+        self.lats = take("i", node_count)
+        self.offsets = take("I", node_count + 1)
+        self.targets = take("I", edge_count)
+        self.lengths = take("f", edge_count)
+        self.durations = take("f", edge_count)
+        self.cell_starts = take("I", cell_count + 1)
+        self.cell_nodes = take("I", node_count)
+
+    def coordinates(self, node):
+        return [self.lons[node] / MICRODEGREES, self.lats[node] / MICRODEGREES]
+
+    def _cell_nodes(self, x, y):
+        """Nodes in grid cell x, y, empty outside the grid"""
+        x -= self.grid_origin[0]
+        y -= self.grid_origin[1]
+        width, height = self.grid_size
+        if not (0 <= x < width and 0 <= y < height):
+            return ()
+        cell = y * width + x
+        return self.cell_nodes[self.cell_starts[cell]:self.cell_starts[cell + 1]]
+
+    def nearest_node(self, lon, lat):
+        """Index of the graph node closest to lon/lat, or None if there is none nearby"""
+        cell_x, cell_y = _cell(lon, lat)
+        best = None
+        found_in = None
+        for ring in range(SNAP_MAX_RINGS + 1):
+            for x in range(cell_x - ring, cell_x + ring + 1):
+                for y in range(cell_y - ring, cell_y + ring + 1):
+                    if max(abs(x - cell_x), abs(y - cell_y)) != ring:
+                        continue
+                    for node in self._cell_nodes(x, y):
+                        distance = haversine(lon, lat, *self.coordinates(node))
+                        if best is None or distance < best[0]:
+                            best = (distance, node)
+            # A node in the next ring can still be closer than one found near the corner of this one
+            if best is not None and found_in is None:
+                found_in = ring
+            elif found_in is not None:
+                return best[1]
+        return best[1] if best else None
+
+    def shortest_path(self, source, target):
+        """Fastest path between two nodes as a list of edge indexes, or None if unreachable"""
+        if source == target:
+            return []
+
+        target_lon, target_lat = self.coordinates(target)
+
+        def estimate(node):
+            return haversine(*self.coordinates(node), target_lon, target_lat) / self.max_speed
+
+        best_time = {source: 0.0}
+        via_edge = {}
+        queue = [(estimate(source), source)]
+        settled = set()
+        while queue:
+            _, node = heapq.heappop(queue)
+            if node == target:
+                break
+            if node in settled:
+                continue
+            settled.add(node)
+
+            time_here = best_time[node]
+            for edge in range(self.offsets[node], self.offsets[node + 1]):
+                neighbour = self.targets[edge]
+                time_there = time_here + self.durations[edge]
+                if time_there < best_time.get(neighbour, math.inf):
+                    best_time[neighbour] = time_there
+                    via_edge[neighbour] = edge
+                    heapq.heappush(queue, (time_there + estimate(neighbour), neighbour))
+        else:
+            return None
+
+        path = []
+        node = target
+        while node != source:
+            edge = via_edge[node]
+            path.append(edge)
+            node = self._source_of(edge)
+        path.reverse()
+        return path
+
+    def _source_of(self, edge):
+        """Node an edge leaves from, found by bisecting the CSR offsets"""
+        low, high = 0, self.node_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.offsets[middle + 1] <= edge:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def route(self, origin_coords, dest_coords):
+        """Directions between two [lon, lat] points in the shape of an ORS GeoJSON response"""
+        source = self.nearest_node(*origin_coords)
+        target = self.nearest_node(*dest_coords)
+        if source is None or target is None:
+            return None
+
+        path = self.shortest_path(source, target)
+        if path is None:
+            return None
+
+        coordinates = [self.coordinates(source)]
+        steps = []
+        for edge in path:
+            coordinates.append(self.coordinates(self.targets[edge]))
+            length = self.lengths[edge]
+            duration = self.durations[edge]
+            speed = round(length / duration, 1) if duration > 0 else 0
+            # Consecutive edges at the same speed become one step, like a road in the ORS steps
+            if steps and steps[-1]["speed"] == speed:
+                steps[-1]["distance"] += length
+                steps[-1]["duration"] += duration
+                steps[-1]["way_points"][1] += 1
+            else:
+                vertex = len(coordinates) - 2
+                steps.append({
+                    "distance": length,
+                    "duration": duration,
+                    "speed": speed,
+                    "way_points": [vertex, vertex + 1],
+                })
+        for step in steps:
+            del step["speed"]
+
+        distance = sum(step["distance"] for step in steps)
+        duration = sum(step["duration"] for step in steps)
+        lons = [point[0] for point in coordinates]
+        lats = [point[1] for point in coordinates]
+        bbox = [min(lons), min(lats), max(lons), max(lats)]
+        return {
+            "type": "FeatureCollection",
+            "bbox": bbox,
+            "features": [{
+                "bbox": bbox,
+                "type": "Feature",
+                "properties": {
+                    "segments": [{"distance": distance, "duration": duration, "steps": steps}],
+                    "way_points": [0, len(coordinates) - 1],
+                    "summary": {"distance": distance, "duration": duration},
+                },
+                "geometry": {"coordinates": coordinates, "type": "LineString"},
+            }],
+            "metadata": {"engine": {"name": "local", "graph": str(self.path)}},
+        }
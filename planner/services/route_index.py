@@ -0,0 +1,169 @@
+from array import array
+from bisect import bisect_left
+
+from .geometry import RouteGeometry, cumulative
+
+# Positions are rounded to about 0.1 m, which also hides the float32 noise of routes loaded with from_bytes
+POSITION_DECIMALS = 6
+
+
+def _spread(total, weights):
+    """Split total over weights proportionally, or evenly when the weights are all zero"""
+    weight_sum = sum(weights)
+    if weight_sum > 0:
+        return [total * weight / weight_sum for weight in weights]
+    return [total / len(weights)] * len(weights) if weights else []
+
+
+def _segment_durations(feature, lengths):
+    """Seconds spent on every segment of a leg, taken from the ORS steps when they are present"""
+    properties = feature.get("properties", {})
+    leg_duration = properties.get("summary", {}).get("duration", 0)
+    durations = None
+
+    steps = [step for segment in properties.get("segments", []) for step in segment.get("steps", [])]
+    if steps:
+        durations = [0.0] * len(lengths)
+        for step in steps:
+            start, end = step.get("way_points", (0, 0))
+            end = min(end, len(lengths))
+            if end > start:
+                durations[start:end] = _spread(step.get("duration", 0), lengths[start:end])
+
+        # Steps can be rounded differently from the leg summary, keep the summary as the source of truth
+        step_total = sum(durations)
+        if step_total > 0:
+            return [duration * leg_duration / step_total for duration in durations]
+
+    return _spread(leg_duration, lengths)
+
+
+class RouteIndex:
+    """Cumulative distance and time along the trip geometry, answering position queries by bisection"""
+
+    def __init__(self):
+        self.geometry = RouteGeometry()  # Vertices of every leg, end to end
+        self.distances = array("d")  # Cumulative meters at every vertex
+        self.times = array("d")  # Cumulative seconds of driving at every vertex
+        self.leg_starts = []  # Index of the first vertex of every leg
+
+    @classmethod
+    def from_routes(cls, *routes):
+        index = cls()
+        for route in routes:
+            index.add_leg(route)
+        return index
+
+    def add_leg(self, route):
+        """Append a directions response to the index"""
+        if not route or not route.get("features"):
+            return
+
+        feature = route["features"][0]
+        coordinates = feature.get("geometry", {}).get("coordinates", [])
+        if not coordinates:
+            return
+
+        leg = RouteGeometry.from_coordinates(coordinates)
+        lengths = leg.segment_lengths()
+        # Scale the straight-line lengths so the leg adds up to the road distance ORS reports
+        leg_distance = feature.get("properties", {}).get("summary", {}).get("distance", 0)
+        distances = _spread(leg_distance, lengths)
+        durations = _segment_durations(feature, lengths)
+
+        start_distance = self.distances[-1] if self.distances else 0.0
+        start_time = self.times[-1] if self.times else 0.0
+        self.leg_starts.append(len(self.geometry))
+        self.geometry.lons.extend(leg.lons)
+        self.geometry.lats.extend(leg.lats)
+        self.distances.extend(cumulative(distances, start_distance))
+        self.times.extend(cumulative(durations, start_time))
+
+    def __len__(self):
+        return len(self.geometry)
+
+    @property
+    def total_distance(self):
+        """Meters covered by the indexed geometry"""
+        return self.distances[-1] if self.distances else 0.0
+
+    @property
+    def total_time(self):
+        """Seconds of driving covered by the indexed geometry"""
+        return self.times[-1] if self.times else 0.0
+
+    def position_at_time(self, seconds):
+        """[lon, lat] after seconds of driving, or None if the index is empty or the route is shorter"""
+        return self._position(self.times, seconds)
+
+    def vertex_position(self, vertex):
+        """[lon, lat] of a route vertex, rounded like every other position"""
+        lon, lat = self.geometry.point(vertex)
+        return [round(lon, POSITION_DECIMALS), round(lat, POSITION_DECIMALS)]
+
+    def nearest_vertex(self, lon, lat, start=0, end=None):
+        """Index of the route vertex closest to lon/lat, or None if the index is empty"""
+        return self.geometry.nearest_vertex(lon, lat, start, end)
+
+    def from_vertex(self, vertex):
+        """RouteIndex of the rest of the route from vertex on, with distances and times counted from there"""
+        index = RouteIndex()
+        index.geometry = RouteGeometry(self.geometry.lons[vertex:], self.geometry.lats[vertex:])
+        start_distance, start_time = self.distances[vertex], self.times[vertex]
+        index.distances = array("d", [distance - start_distance for distance in self.distances[vertex:]])
+        index.times = array("d", [seconds - start_time for seconds in self.times[vertex:]])
+        index.leg_starts = [max(0, leg_start - vertex) for leg_start in self.leg_starts]
+        return index
+
+    def to_bytes(self):
+        """Longitudes, latitudes, cumulative meters and cumulative seconds packed one after the other.
+
+        Stored as float32, which keeps positions to about a meter at a quarter of the size of JSON.
+        """
+        packed = array("f", self.geometry.lons)
+        for values in (self.geometry.lats, self.distances, self.times):
+            packed.extend(array("f", values))
+        return packed.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, leg_starts):
+        """RouteIndex from the output of to_bytes and the leg starts of the route it was packed from"""
+        packed = array("f")
+        packed.frombytes(data)
+        count = len(packed) // 4
+        index = cls()
+        index.geometry = RouteGeometry(array("d", packed[:count]), array("d", packed[count:2 * count]))
+        index.distances = array("d", packed[2 * count:3 * count])
+        index.times = array("d", packed[3 * count:])
+        index.leg_starts = list(leg_starts)
+        return index
+
+    def time_at_distance(self, distance):
+        """Seconds of driving needed to cover distance meters, clamped to the ends of the route"""
+        return self._interpolate(self.distances, self.times, distance)
+
+    def _locate(self, keys, target):
+        """Return (i, fraction) such that target lies fraction of the way from vertex i - 1 to vertex i"""
+        i = bisect_left(keys, target)
+        if i <= 0:
+            return 0, 1.0
+        if i >= len(keys):
+            return len(keys) - 1, 1.0
+        return i, (target - keys[i - 1]) / (keys[i] - keys[i - 1])
+
+    def _position(self, keys, target):
+        # A stop past either end of the route is not on it, rather than at the pickup or dropoff
+        if not len(self.geometry) or not 0 <= target <= keys[-1]:
+            return None
+
+        lon, lat = self.geometry.interpolate(*self._locate(keys, target))
+        return [round(lon, POSITION_DECIMALS), round(lat, POSITION_DECIMALS)]
+
+    def _interpolate(self, keys, values, target):
+        if not values:
+            return 0.0
+
+        i, fraction = self._locate(keys, target)
+        if fraction >= 1.0:
+            return values[i]
+        return values[i - 1] + (values[i] - values[i - 1]) * fraction
@@ -1,255 +1,315 @@
-import requests
-import math
+import asyncio
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from decouple import config
+from django.db import close_old_connections
+
+from . import metrics
+from .geocode_cache import geocode_cache, normalize_address
+from .geocoders import get_geocoder
+from .eld_service import eld_service, plan_start_time
+from .route_cache import route_cache
+from .route_summary import RouteSummary
+from .routing_backends import get_routing_backend
+
+logger = logging.getLogger(__name__)
+
+# Upstream lookups are I/O bound, so a small shared pool lets independent calls overlap
+ROUTE_SERVICE_WORKERS = config("ROUTE_SERVICE_WORKERS", default=8, cast=int)
+# Read once per process rather than on every request
+OPEN_ROUTE_API = config("OPEN_ROUTE_API", default="")  # Get from https://openrouteservice.org/
+_executor = ThreadPoolExecutor(max_workers=ROUTE_SERVICE_WORKERS, thread_name_prefix="route-service")
+
+
+def _call_in_worker(func, args):
+    try:
+        return func(*args)
+    finally:
+        # Worker threads outlive the request, release any connection a task opened
+        close_old_connections()
+
+
+def map_concurrently(func, args_list):
+    """Run func for every argument tuple on the shared pool and return the results in order"""
+    # Each task runs in a copy of the caller's context so its spans are counted for the request
+    futures = [
+        _executor.submit(contextvars.copy_context().run, _call_in_worker, func, args) for args in args_list
+    ]
+    return [future.result() for future in futures]
 
 
 class RouteService:
+    """Geocodes and routes trips. Holds no per-request state, so one instance serves every thread,
+    see get_route_service()
+    """
+
     def __init__(self):
         # Using OpenRouteService free and alternative frim Google Maps
-        self.api_key = config("OPEN_ROUTE_API")  # Get from https://openrouteservice.org/
-        self.base_url = "https://api.openrouteservice.org/v2/directions/driving-hgv"
-        self.thirty_min_rest_coordinates = None
-        self.ten_hours_rest_coordinates = None
-        self.fuel_stop_coordinates = None
+        self.api_key = OPEN_ROUTE_API
+        self.profile = "driving-hgv"
+        # Gazetteer and/or ORS, chosen with GEOCODER_BACKENDS
+        self.geocoder = get_geocoder(self.api_key)
+        # ORS or the local graph engine, chosen with ROUTING_BACKEND
+        self.backend = get_routing_backend(self.api_key)
+        # Lanes routed by different engines must not share route cache entries
+        self.cache_profile = f"{self.backend.name}:{self.profile}"
 
     def get_coordinates(self, location):
-        """Convert address to coordinates using OpenRouteService geocoding API"""
-        geocode_url = "https://api.openrouteservice.org/geocode/search"
-        params = {"api_key": self.api_key, "text": location}
-        response = requests.get(geocode_url, params=params)
-        data = response.json()
-
-        if "features" in data and len(data["features"]) > 0:
-            # Get the first result's coordinates (longitude, latitude)
-            coords = data["features"][0]["geometry"]["coordinates"]
+        """Convert address to coordinates, from the local gazetteer when it knows the place, else OpenRouteService"""
+        with metrics.span("geocode"):
+            coords = self._known_coordinates(location)
+            if coords is None:
+                coords = self.geocoder.geocode_remote(location)
+                if coords is not None:
+                    geocode_cache.set(location, coords)
+        return coords
+
+    def geocode_many(self, locations):
+        """get_coordinates of every location, the remote lookups made concurrently on the shared pool.
+
+        The gazetteer and both cache tiers are read, and the remote answers cached, on the calling
+        thread, so the worker threads never touch the database.
+        """
+        with metrics.span("geocode"):
+            coordinates = [self._known_coordinates(location) for location in locations]
+        missing = [position for position, coords in enumerate(coordinates) if coords is None]
+        fetched = map_concurrently(self._geocode_remote, [(locations[position],) for position in missing])
+        for position, coords in zip(missing, fetched):
+            coordinates[position] = coords
+            if coords is not None:
+                geocode_cache.set(locations[position], coords)
+        return coordinates
+
+    def _known_coordinates(self, location):
+        """Coordinates from the gazetteer or the geocode cache, None when the remote geocoder has to be asked"""
+        # Known terminals and truck stops are answered in-process, faster than any cache tier
+        coords = self.geocoder.geocode_local(location)
+        if coords is not None:
+            metrics.increment("geocode_local_hits")
             return coords
+
+        # Repeat addresses (depots, terminals) are served from the cache without calling the geocoder
+        cached_coords = geocode_cache.get(location)
+        if cached_coords is not None:
+            metrics.increment("geocode_cache_hits")
+            return cached_coords
         return None
 
+    def _geocode_remote(self, location):
+        with metrics.span("geocode"):
+            return self.geocoder.geocode_remote(location)
+
+    async def aget_coordinates(self, location):
+        """Async get_coordinates, the request waits on the event loop instead of holding a thread"""
+        with metrics.span("geocode"):
+            return await self._aget_coordinates(location)
+
+    async def _aget_coordinates(self, location):
+        coords = await self.geocoder.ageocode_local(location)
+        if coords is not None:
+            metrics.increment("geocode_local_hits")
+            return coords
+
+        cached_coords = await geocode_cache.aget(location)
+        if cached_coords is not None:
+            metrics.increment("geocode_cache_hits")
+            return cached_coords
+
+        coords = await self.geocoder.ageocode_remote(location)
+        if coords is not None:
+            await geocode_cache.aset(location, coords)
+        return coords
+
     def calculate_route(self, origin, destination):
         """Calculate route between two 
-        NB: OPen service only provides distance of less 6000km apart on free tier
+        NB: OPen service only provides distance of less 6000km apart on free tier, set
+        ROUTING_BACKEND=local to route on a local graph instead
         """
         origin_coords = self.get_coordinates(origin)
         dest_coords = self.get_coordinates(destination)
 
+        return self._route_between(origin_coords, dest_coords)
+
+    def _route_between(self, origin_coords, dest_coords):
+        """Get the directions for a leg whose ends have already been geocoded"""
         if not origin_coords or not dest_coords:
             return None
 
-        params = {
-            "api_key": self.api_key,
-            "start": f"{origin_coords[0]}, {origin_coords[1]}",
-            "end": f"{dest_coords[0]}, {dest_coords[1]}",
-        }
+        return self.get_directions(origin_coords, dest_coords)
 
-        headers = {
-            "Accept": "application/json, application/geo+json, application/gpx+xml",
-            "Content-Type": "application/json; charset=utf-8",
-        }
+    def get_directions(self, origin_coords, dest_coords):
+        """Get the directions between two coordinates, reusing recently routed lanes"""
+        cached_route = route_cache.get(self.cache_profile, origin_coords, dest_coords)
+        if cached_route is not None:
+            metrics.increment("route_cache_hits")
+            return cached_route
 
-        response = requests.get(self.base_url, params=params, headers=headers)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(response.json())
+        with metrics.span("directions"):
+            route = self.backend.directions(origin_coords, dest_coords)
+        if route is not None:
+            route_cache.set(self.cache_profile, origin_coords, dest_coords, route)
+        return route
 
-        return None
+    async def aget_directions(self, origin_coords, dest_coords):
+        """Async get_directions sharing the same route cache"""
+        cached_route = route_cache.get(self.cache_profile, origin_coords, dest_coords)
+        if cached_route is not None:
+            metrics.increment("route_cache_hits")
+            return cached_route
+
+        with metrics.span("directions"):
+            route = await self.backend.adirections(origin_coords, dest_coords)
+        if route is not None:
+            route_cache.set(self.cache_profile, origin_coords, dest_coords, route)
+        return route
+
+    async def _aroute_between(self, origin_coords, dest_coords):
+        if not origin_coords or not dest_coords:
+            return None
+
+        return await self.aget_directions(origin_coords, dest_coords)
 
     def calculate_trip_details(
         self, current_location, pickup_location, dropoff_location, current_cycle_used
     ):
-        """Calculate the full trip with"""
-        # Get route to pickup
-        to_pickup = self.calculate_route(current_location, pickup_location)
-
-        # Get route from pickup to dropoff
-        pickup_to_dropoff = self.calculate_route(pickup_location, dropoff_location)
-      
-        # Process routes and calculate required stops
-        return {
+        """Calculate the full trip, returning (trip_details, route_summary)"""
+        # Geocode the three stops at once, the pickup is shared by both legs so it is only looked up once
+        current_coords, pickup_coords, dropoff_coords = self.geocode_many(
+            [current_location, pickup_location, dropoff_location]
+        )
+
+        # Route to pickup and from pickup to dropoff at once
+        to_pickup, pickup_to_dropoff = map_concurrently(
+            self._route_between,
+            [(current_coords, pickup_coords), (pickup_coords, dropoff_coords)],
+        )
+
+        # Walk the geometry once for the distances, durations and stop locations
+        summary = self._summarize(to_pickup, pickup_to_dropoff)
+        trip_details = self._build_trip_details(
+            to_pickup, pickup_to_dropoff, summary, current_cycle_used, plan_start_time()
+        )
+        return trip_details, summary
+
+    async def acalculate_trip_details(
+        self, current_location, pickup_location, dropoff_location, current_cycle_used
+    ):
+        """Async calculate_trip_details, the lookups of each stage run concurrently on the event loop"""
+        current_coords, pickup_coords, dropoff_coords = await asyncio.gather(
+            self.aget_coordinates(current_location),
+            self.aget_coordinates(pickup_location),
+            self.aget_coordinates(dropoff_location),
+        )
+
+        to_pickup, pickup_to_dropoff = await asyncio.gather(
+            self._aroute_between(current_coords, pickup_coords),
+            self._aroute_between(pickup_coords, dropoff_coords),
+        )
+
+        # Indexing the geometry, loading the POIs and simulating the stops are CPU work, kept off the event loop
+        summary = await asyncio.to_thread(self._summarize, to_pickup, pickup_to_dropoff)
+        trip_details = await asyncio.to_thread(
+            self._build_trip_details, to_pickup, pickup_to_dropoff, summary, current_cycle_used, plan_start_time()
+        )
+        return trip_details, summary
+
+    def calculate_batch_trip_details(self, trips, stops=True):
+        """Calculate many trips at once, looking up every distinct address and leg only once.
+
+        trips is a list of dicts with the TripInputSerializer fields. Returns a list of
+        (trip_details, route_summary) pairs in the same order. Without stops the HOS plan of each
+        trip is not simulated and its trip details have no stops.
+        """
+        start_time = plan_start_time()
+        # Distinct addresses across the whole batch, geocoded concurrently
+        addresses = {}
+        for trip in trips:
+            for field in ("current_location", "pickup_location", "dropoff_location"):
+                addresses.setdefault(normalize_address(trip[field]), trip[field])
+        address_keys = list(addresses)
+        coordinates = dict(zip(
+            address_keys,
+            self.geocode_many([addresses[key] for key in address_keys]),
+        ))
+
+        def leg_key(origin, destination):
+            origin_coords = coordinates[normalize_address(origin)]
+            dest_coords = coordinates[normalize_address(destination)]
+            if not origin_coords or not dest_coords:
+                return None
+            return route_cache.make_key(self.cache_profile, origin_coords, dest_coords), origin_coords, dest_coords
+
+        # Distinct legs, keyed the same way as the route cache, routed concurrently
+        trip_legs = []
+        legs = {}
+        for trip in trips:
+            pair = (
+                leg_key(trip["current_location"], trip["pickup_location"]),
+                leg_key(trip["pickup_location"], trip["dropoff_location"]),
+            )
+            trip_legs.append(tuple(leg[0] if leg else None for leg in pair))
+            for leg in pair:
+                if leg:
+                    legs.setdefault(leg[0], leg[1:])
+        leg_keys = list(legs)
+        routes = dict(zip(leg_keys, map_concurrently(self.get_directions, [legs[key] for key in leg_keys])))
+
+        results = []
+        summaries = {}
+        for trip, (first_key, second_key) in zip(trips, trip_legs):
+            to_pickup = routes.get(first_key)
+            pickup_to_dropoff = routes.get(second_key)
+            # Trips on the same lane share their summary and index
+            summary = summaries.get((first_key, second_key))
+            if summary is None:
+                summary = summaries[(first_key, second_key)] = self._summarize(to_pickup, pickup_to_dropoff)
+            results.append((
+                self._build_trip_details(
+                    to_pickup, pickup_to_dropoff, summary, trip["current_cycle_used"], start_time, stops
+                ),
+                summary,
+            ))
+        return results
+
+    def _summarize(self, to_pickup, pickup_to_dropoff):
+        with metrics.span("route_index"):
+            summary = RouteSummary(to_pickup, pickup_to_dropoff)
+        metrics.increment("route_coordinates", len(summary.index))
+        return summary
+
+    def _build_trip_details(self, to_pickup, pickup_to_dropoff, summary, current_cycle_used, start_time, stops=True):
+        """Process routes and calculate required stops"""
+        trip_details = {
             "to_pickup": to_pickup,
             "pickup_to_dropoff": pickup_to_dropoff,
-            "total_distance": self._calculate_total_distance(
-                to_pickup, pickup_to_dropoff
-            ),
-            "total_duration": self._calculate_total_duration(
-                to_pickup, pickup_to_dropoff
-            ),
-            "stops": self._calculate_required_stops(
-                to_pickup, pickup_to_dropoff, current_cycle_used
-            ),
+            "total_distance": summary.total_distance,
+            "total_duration": summary.total_duration,
+            # Log sheets are built from this start, see ELDService.iter_log_sheets
+            "start_time": start_time.isoformat(),
         }
+        # A trip missing a leg cannot be planned, it has no stops
+        if stops and summary.durations:
+            with metrics.span("stops"):
+                trip_details["stops"] = self._calculate_required_stops(summary, current_cycle_used, start_time)
+        return trip_details
 
-    def _calculate_total_distance(self, route1, route2):
-        """Calculate total distance of the routes in miles"""
-        if not route1 or not route2:
-            return 0
-        
-        distance1 = 0
-        distance2 = 0
-        
-        # Check if route1 has the expected structure
-        if "features" in route1 and route1["features"] and "properties" in route1["features"][0]:
-            if "summary" in route1["features"][0]["properties"]:
-                distance1 = route1["features"][0]["properties"]["summary"]["distance"]
-        
-        # Check if route2 has the expected structure
-        if "features" in route2 and route2["features"] and "properties" in route2["features"][0]:
-            if "summary" in route2["features"][0]["properties"]:
-                distance2 = route2["features"][0]["properties"]["summary"]["distance"]
-
-        self.fuel_stop_coordinates = self._calculate_fuel_stop_location(route1, route2, distance1, distance2)
-        
-        # Convert from meters to miles since US uses miles but we can use KM depending on location LOL
-        return (distance1 + distance2) * 0.000621371
-
-    def _calculate_total_duration(self, route1, route2):
-        """Calculate total duration of the routes in hours"""
-        if not route1 or not route2:
-            return 0
-
-        duration1 = 0
-        duration2 = 0
-        
-        # Check if route1 has the expected structure
-        if "features" in route1 and route1["features"] and "properties" in route1["features"][0]:
-            if "summary" in route1["features"][0]["properties"]:
-                duration1 = route1["features"][0]["properties"]["summary"]["duration"]
-        
-        # Check if route2 has the expected structure
-        if "features" in route2 and route2["features"] and "properties" in route2["features"][0]:
-            if "summary" in route2["features"][0]["properties"]:
-                duration2 = route2["features"][0]["properties"]["summary"]["duration"]
-
-        self.thirty_min_rest_coordinates = self._calculate_30_min_stop_location(route1, route2, duration1, duration2)
-        
-        self.ten_hours_rest_coordinates = self._calculate_10_hour_stop_location(route1, route2, duration1, duration2)
-        
-        # Convert from seconds to hours
-        return (duration1 + duration2) / 3600
-
-    def _calculate_required_stops(self, route1, route2, current_cycle_used):
-        """Calculate required stops based on the total duration and distance of the routes"""
-        total_duration = self._calculate_total_duration(route1, route2)
-        total_distance = self._calculate_total_distance(route1, route2)
-
-        # Add 1 hour each for pickup and dropoff
-        total_duration += 2
-
-        # Remaining drive time in the current cycle
-        remaining_drive_time = 11 - current_cycle_used
-
-        # Stops needed for 30-minute breaks (required after 8 hours of driving)
-        thirty_min_breaks = math.floor(total_duration / 8)
-
-        # Stops needed for 10-hour breaks (required after 11 hours of driving)
-        ten_hour_breaks = math.ceil(
-            max(0, (total_duration - remaining_drive_time)) / 11
-        )
+    def _calculate_required_stops(self, summary, current_cycle_used, start_time):
+        """Stops of the HOS plan the log sheets are built from, so both describe the same schedule"""
+        periods = eld_service.plan_duty_periods(summary, current_cycle_used, start_time.hour * 60 + start_time.minute)
+        return eld_service.plan_stops(summary, periods, current_cycle_used)
 
-        # Stops needed for fueling (at least once every 1,000 miles)
-        fuel_stops = math.floor(total_distance / 1000)
-
-        stops = []
-
-        # This is a simplified calculation - a real implementation would need to map these to specific
-        # points along the route and calculate the exact timing this should be marked as a TODO for future
-        # improvements since I might miss out on the interview submission deadline
-
-        return {
-            "thirty_min_breaks": {
-                "number_of_breaks":thirty_min_breaks,
-                "location": self.thirty_min_rest_coordinates
-                },
-            "ten_hour_breaks": {
-                "number_of_breaks": ten_hour_breaks,
-                "location": self.ten_hours_rest_coordinates
-                },
-            "fuel_stops": {
-                "number_of_fuel_stops":fuel_stops,
-                "location": self.fuel_stop_coordinates
-            },
-        }
-        
-    def  _calculate_30_min_stop_location(self, route1, route2, duration1, duration2):
-        """Calculate the location for a one-hour stop"""
-        # check if rest is needed for 30min after 8 hours of driving of driving and get the location
-        total_duration = duration1 + duration2
-        # Check if duration one is more than 8 hours to use its coordinates
-        if duration1 > 28800:
-            # Get the midpoint of the route
-            coordinates = route1["features"][0]["geometry"]["coordinates"]
-        else:
-            # Get the midpoint of the route
-            coordinates = route2["features"][0]["geometry"]["coordinates"]        
-        
-            # Find the location at the given duration
-        traveled_time = 0
-        for i in range(len(coordinates) - 1):
-            # Get distance and duration between points
-            point_a, point_b = coordinates[i], coordinates[i + 1]
-            segment_duration = total_duration / len(coordinates)  # Approximate time per segment
-
-            traveled_time += segment_duration
-            
-            # Check if the dirst duration total time and the traveled time is greater than 8 hours
-            if (duration1 + traveled_time) >= 28800:  # Check if we have traveled for an hour
-                return point_b  # Return the approximate location
-        
- 
-        return None
-    
-    def  _calculate_10_hour_stop_location(self, route1, route2, duration1, duration2):
-        """Calculate the location for a one-hour stop"""
-        # check if rest is needed for 30min after 8 hours of driving of driving and get the location
-        total_duration = duration1 + duration2
-        # Check if duration one is more than 10 hours to use its coordinates
-        if duration1 > 36000:
-            # Get the midpoint of the route
-            coordinates = route1["features"][0]["geometry"]["coordinates"]
-        else:
-            # Get the midpoint of the route
-            coordinates = route2["features"][0]["geometry"]["coordinates"]        
-        
-            # Find the location at the given duration
-        traveled_time = 0
-        for i in range(len(coordinates) - 1):
-            # Get distance and duration between points
-            point_a, point_b = coordinates[i], coordinates[i + 1]
-            segment_duration = total_duration / len(coordinates)  # Approximate time per segment
-
-            traveled_time += segment_duration
-            
-            # Check if the dirst duration total time and the traveled time is greater than 10 hours
-            if (duration1 + traveled_time) >= 36000:
-                return point_b  # Return the approximate location
-        
- 
-        return None
-    
-    def  _calculate_fuel_stop_location(self, route1, route2, distance1, distance2):
-        """Calculate the location for a one-hour stop"""
-        # check if fuel stop is needed in 1000 miles and get the location
-        total_duration = (distance1 + distance2) * 0.000621371
-        # Check if distance1 is more than 1000 miles to use its coordinates
-        
-        if (distance1 * 0.000621371) > 1000:
-            # Get the midpoint of the route
-            coordinates = route1["features"][0]["geometry"]["coordinates"]
-        else:
-            # Get the midpoint of the route
-            coordinates = route2["features"][0]["geometry"]["coordinates"]        
-        
-        # Find the location at the given distance
-        travelled_distance = 0
-        for i in range(len(coordinates) - 1):
-            # Get distance and duration between points
-            point_a, point_b = coordinates[i], coordinates[i + 1]
-            segment_distance = total_duration / len(coordinates)
-
-            travelled_distance += segment_distance
-            if (distance1 + travelled_distance) *  0.000621371 >= 1000:
-                return point_b  # Return the approximate location
-        
- 
-        return None
\ No newline at end of file
+
+_route_service = None
+_route_service_lock = threading.Lock()
+
+
+def get_route_service():
+    """Process-wide RouteService, built on first use so a bad backend setting surfaces on the first request"""
+    global _route_service
+    with _route_service_lock:
+        if _route_service is None:
+            _route_service = RouteService()
+        return _route_service
@@ -0,0 +1,80 @@
+from .geometry import METERS_TO_MILES
+from .poi_index import poi_dataset
+from .route_index import RouteIndex
+
+
+def _leg_summary(route):
+    """Return (distance in meters, duration in seconds) of a directions response"""
+    if not route or not route.get("features"):
+        return 0, 0
+
+    summary = route["features"][0].get("properties", {}).get("summary", {})
+    return summary.get("distance", 0), summary.get("duration", 0)
+
+
+class RouteSummary:
+    """Distances and durations of a two-leg trip plus the cumulative index used to place its stops"""
+
+    def __init__(self, to_pickup, pickup_to_dropoff):
+        self.distances = []  # Meters per leg
+        self.durations = []  # Seconds per leg
+        self.index = RouteIndex()
+        self._facilities = None
+
+        # Both legs are needed to plan anything
+        if not to_pickup or not pickup_to_dropoff:
+            return
+
+        legs = [_leg_summary(to_pickup), _leg_summary(pickup_to_dropoff)]
+        self.distances = [leg[0] for leg in legs]
+        self.durations = [leg[1] for leg in legs]
+        # Built in a single pass over the geometry, every stop query after that is a bisection
+        self.index = RouteIndex.from_routes(to_pickup, pickup_to_dropoff)
+
+    @classmethod
+    def from_index(cls, index, distances, durations, facilities=None):
+        """RouteSummary of an already built RouteIndex and its per-leg meters and seconds"""
+        summary = cls(None, None)
+        summary.index = index
+        summary.distances = list(distances)
+        summary.durations = list(durations)
+        summary._facilities = facilities
+        return summary
+
+    def remaining(self, vertex):
+        """RouteSummary of the rest of the trip from a route vertex on, for re-planning it mid-trip.
+
+        The index and facilities are rebased so that driving starts at the vertex, and the leg the
+        vertex is on is cut down to what is left of it.
+        """
+        index = self.index
+        pickup = index.leg_starts[1] if len(index.leg_starts) > 1 else len(index)
+        start_distance, start_time = index.distances[vertex], index.times[vertex]
+        if vertex < pickup:
+            # Leg ends are read from the index, whose legs are scaled to add up to the ORS summaries
+            pickup_distance, pickup_time = index.distances[pickup - 1], index.times[pickup - 1]
+            distances = [pickup_distance - start_distance, index.total_distance - pickup_distance]
+            durations = [pickup_time - start_time, index.total_time - pickup_time]
+        else:
+            distances = [0.0, index.total_distance - start_distance]
+            durations = [0.0, index.total_time - start_time]
+        return RouteSummary.from_index(
+            index.from_vertex(vertex), distances, durations, self.facilities.after(start_time, start_distance)
+        )
+
+    @property
+    def facilities(self):
+        """RouteFacilities of the truck stops and rest areas along the trip, found on first use"""
+        if self._facilities is None:
+            self._facilities = poi_dataset.index.along_route(self.index)
+        return self._facilities
+
+    @property
+    def total_distance(self):
+        """Total distance of the trip in miles"""
+        return sum(self.distances) * METERS_TO_MILES
+
+    @property
+    def total_duration(self):
+        """Total driving duration of the trip in hours"""
+        return sum(self.durations) / 3600
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import threading
+
+from decouple import config
+from requests import RequestException
+
+from .http_client import UpstreamUnavailable, ors_async_client, ors_client
+from .route_graph import RouteGraph, RouteGraphError
+
+logger = logging.getLogger(__name__)
+
+ROUTING_BACKEND = config("ROUTING_BACKEND", default="ors")  # "ors" or "local"
+ROUTE_GRAPH_PATH = config("ROUTE_GRAPH_PATH", default="route_graph.bin")
+
+DIRECTIONS_HEADERS = {
+    "Accept": "application/json, application/geo+json, application/gpx+xml",
+    "Content-Type": "application/json; charset=utf-8",
+}
+
+
+class RoutingBackend:
+    """Engine RouteService gets directions from. Both methods return an ORS-shaped GeoJSON
+    FeatureCollection with summary, segments/steps and a LineString geometry, or None on failure
+    """
+
+    name = None
+
+    def directions(self, origin_coords, dest_coords):
+        raise NotImplementedError
+
+    async def adirections(self, origin_coords, dest_coords):
+        # In-process engines are CPU-bound, run them off the event loop
+        return await asyncio.to_thread(self.directions, origin_coords, dest_coords)
+
+
+class ORSBackend(RoutingBackend):
+    """OpenRouteService directions over the shared pooled HTTP clients.
+    NB: OPen service only provides distance of less 6000km apart on free tier
+    """
+
+    name = "ors"
+
+    def __init__(self, api_key, profile="driving-hgv"):
+        self.api_key = api_key
+        self.base_url = f"https://api.openrouteservice.org/v2/directions/{profile}"
+
+    def directions(self, origin_coords, dest_coords):
+        try:
+            response = ors_client.get(
+                self.base_url, params=self._params(origin_coords, dest_coords), headers=DIRECTIONS_HEADERS
+            )
+        except (RequestException, UpstreamUnavailable) as error:
+            logger.warning("Directions request failed: %s", error)
+            return None
+        return self._route_from(response)
+
+    async def adirections(self, origin_coords, dest_coords):
+        import httpx
+
+        try:
+            response = await ors_async_client.get(
+                self.base_url, params=self._params(origin_coords, dest_coords), headers=DIRECTIONS_HEADERS
+            )
+        except (httpx.HTTPError, UpstreamUnavailable) as error:
+            logger.warning("Directions request failed: %s", error)
+            return None
+        return self._route_from(response)
+
+    def _params(self, origin_coords, dest_coords):
+        return {
+            "api_key": self.api_key,
+            "start": f"{origin_coords[0]}, {origin_coords[1]}",
+            "end": f"{dest_coords[0]}, {dest_coords[1]}",
+        }
+
+    def _route_from(self, response):
+        """Directions response body, or None if the request failed"""
+        if response.status_code == 200:
+            return response.json()
+
+        logger.warning("Directions request failed with %s: %s", response.status_code, response.text[:500])
+        return None
+
+
+class LocalGraphBackend(RoutingBackend):
+    """In-process A* over a memory-mapped road graph built with `manage.py build_route_graph`.
+    No network and no distance cap, the graph decides which roads an HGV may use
+    """
+
+    name = "local"
+
+    def __init__(self, path=ROUTE_GRAPH_PATH):
+        self.path = path
+        self._graph = None
+        self._lock = threading.Lock()
+
+    @property
+    def graph(self):
+        # Mapped on first use so that processes which never route do not open the file
+        if self._graph is None:
+            with self._lock:
+                if self._graph is None:
+                    self._graph = RouteGraph(self.path)
+        return self._graph
+
+    def directions(self, origin_coords, dest_coords):
+        try:
+            return self.graph.route(origin_coords, dest_coords)
+        except RouteGraphError as error:
+            logger.warning("Local routing failed: %s", error)
+            return None
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_routing_backend(api_key, name=ROUTING_BACKEND):
+    """Process-wide backend instance for name, so the local graph is only mapped once"""
+    with _backends_lock:
+        if name not in _backends:
+            if name == ORSBackend.name:
+                _backends[name] = ORSBackend(api_key)
+            elif name == LocalGraphBackend.name:
+                _backends[name] = LocalGraphBackend()
+            else:
+                raise ValueError(f"Unknown ROUTING_BACKEND {name!r}, expected 'ors' or 'local'")
+        return _backends[name]
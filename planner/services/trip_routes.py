@@ -0,0 +1,67 @@
+from decouple import config
+
+from ..models import TripRoute
+from . import metrics
+from .cache import LRUCache
+from .route_index import RouteIndex
+from .route_summary import RouteSummary
+
+TRIP_ROUTE_CACHE_SIZE = config("TRIP_ROUTE_CACHE_SIZE", default=128, cast=int)
+
+
+class TripRouteStore:
+    """Route summaries of planned trips, saved with the trip so it can be re-planned without routing it again.
+
+    Loaded summaries are kept in an in-process LRU, so a truck sending a position every few minutes
+    only reads its route from the database once per process.
+    """
+
+    def __init__(self, max_entries=TRIP_ROUTE_CACHE_SIZE):
+        self.summaries = LRUCache(max_entries=max_entries)
+
+    def save(self, trip, route_summary):
+        self.save_many([(trip, route_summary)])
+
+    def save_many(self, planned):
+        """Store the route of every (Trip, RouteSummary) pair that could be routed, in one INSERT"""
+        routes = []
+        for trip, route_summary in planned:
+            if not len(route_summary.index):
+                continue
+            routes.append(TripRoute(
+                trip=trip,
+                leg_distances=route_summary.distances,
+                leg_durations=route_summary.durations,
+                leg_starts=route_summary.index.leg_starts,
+                index=route_summary.index.to_bytes(),
+            ))
+            self.summaries.set(trip.pk, route_summary)
+        if routes:
+            with metrics.span("trip_route_insert"):
+                # A plan job retried after saving its route replaces it
+                TripRoute.objects.bulk_create(
+                    routes,
+                    update_conflicts=True,
+                    unique_fields=["trip"],
+                    update_fields=["leg_distances", "leg_durations", "leg_starts", "index"],
+                )
+
+    def load(self, trip_id):
+        """RouteSummary of a planned trip, or None if its route was never stored"""
+        route_summary = self.summaries.get(trip_id)
+        if route_summary is not None:
+            metrics.increment("trip_route_cache_hits")
+            return route_summary
+
+        route = TripRoute.objects.filter(trip_id=trip_id).first()
+        if route is None:
+            return None
+        route_summary = RouteSummary.from_index(
+            RouteIndex.from_bytes(bytes(route.index), route.leg_starts), route.leg_distances, route.leg_durations
+        )
+        self.summaries.set(trip_id, route_summary)
+        return route_summary
+
+
+# Shared by every view and plan job in the process
+trip_routes = TripRouteStore()
@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from planner.services.cache import LRUCache
+from planner.services.route_cache import RouteCache
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire_after_their_ttl(self):
+        cache = LRUCache(ttl=10)
+        with mock.patch("planner.services.cache.time.monotonic", return_value=100):
+            cache.set("a", 1)
+            cache.set("b", 2, ttl=60)
+        with mock.patch("planner.services.cache.time.monotonic", return_value=120):
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("b"), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+class RouteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = RouteCache(precision=4)
+
+    def test_nearby_coordinates_share_an_entry(self):
+        route = {"features": []}
+        self.cache.set("driving-hgv", [-87.62981, 41.87811], [-96.79699, 32.77666], route)
+        self.assertIs(self.cache.get("driving-hgv", [-87.629812, 41.878114], [-96.796988, 32.776664]), route)
+
+    def test_direction_profile_and_distance_are_part_of_the_key(self):
+        self.cache.set("driving-hgv", [-87.6298, 41.8781], [-96.797, 32.7767], {"features": []})
+        self.assertIsNone(self.cache.get("driving-hgv", [-96.797, 32.7767], [-87.6298, 41.8781]))
+        self.assertIsNone(self.cache.get("driving-car", [-87.6298, 41.8781], [-96.797, 32.7767]))
+        self.assertIsNone(self.cache.get("driving-hgv", [-87.6299, 41.8781], [-96.797, 32.7767]))
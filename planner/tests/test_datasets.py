@@ -0,0 +1,46 @@
+import os
+import sqlite3
+import tempfile
+
+from django.test import SimpleTestCase
+
+from planner.services.geocoders import GazetteerGeocoder
+from planner.services.poi_index import PoiDataset
+
+
+class LocalDatasetTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_csv_optional_columns_may_be_missing(self):
+        path = self.path("pois.csv")
+        with open(path, "w") as csv_file:
+            csv_file.write("name,longitude,latitude\nPilot 4521,-101.7687,35.1919\n")
+        index = PoiDataset(path).index
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.names, ["Pilot 4521"])
+
+    def test_sqlite_table(self):
+        path = self.path("places.sqlite3")
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE gazetteer (name TEXT, longitude REAL, latitude REAL)")
+        connection.execute("INSERT INTO gazetteer VALUES ('Amarillo TX', -101.8313, 35.222)")
+        connection.commit()
+        connection.close()
+        self.assertEqual(GazetteerGeocoder(path).geocode("amarillo tx"), [-101.8313, 35.222])
+
+    def test_unreadable_file_gives_an_empty_index(self):
+        with self.assertLogs("planner.services.datasets", "WARNING"):
+            self.assertEqual(len(PoiDataset(self.path("missing.csv")).index), 0)
+        self.assertIsNone(GazetteerGeocoder("").geocode("amarillo tx"))
+
+    def test_file_is_read_once(self):
+        path = self.path("pois.csv")
+        with open(path, "w") as csv_file:
+            csv_file.write("name,longitude,latitude,kind\nRest area,-101.7,35.1,rest_area\n")
+        dataset = PoiDataset(path)
+        self.assertIs(dataset.index, dataset.index)
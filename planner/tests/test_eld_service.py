@@ -0,0 +1,127 @@
+import csv
+from datetime import datetime
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from planner.benchmarks.fixtures import FIXTURES_DIR, Scenario
+from planner.services.eld_service import eld_service
+from planner.services.hos_engine import DRIVING, DutyPeriod
+from planner.services.poi_index import PoiIndex
+from planner.services.route_index import RouteIndex
+from planner.services.route_summary import RouteSummary
+from planner.tests.test_route_index import TO_DROPOFF, TO_PICKUP
+
+POI_FIXTURE = Path(__file__).resolve().parent / "fixtures" / "pois.csv"
+
+# Regional fixture started at 08:00 with 30 hours of the cycle used: (start, end, status, remarks)
+REGIONAL_PERIODS = [
+    (0, 365, "D", None),
+    (365, 425, "ON", "Pickup location"),
+    (425, 720, "D", None),
+    (720, 1320, "SB", "10-hour rest period"),
+    (1320, 1800, "D", None),
+    (1800, 1830, "OFF", "30-minute break"),
+    (1830, 2010, "D", None),
+    (2010, 2610, "SB", "10-hour rest period"),
+    (2610, 2730, "D", None),
+    (2730, 2760, "ON", "Fueling"),
+    (2760, 3240, "D", None),
+    (3240, 3270, "OFF", "30-minute break"),
+    (3270, 3330, "D", None),
+    (3330, 3930, "SB", "10-hour rest period"),
+    (3930, 4260, "D", None),
+    (4260, 6300, "OFF", "34-hour restart"),
+    (6300, 6780, "D", None),
+    (6780, 6810, "OFF", "30-minute break"),
+    (6810, 6825, "D", None),
+    (6825, 6855, "ON", "Fueling"),
+    (6855, 6864, "D", None),
+    (6864, 6924, "ON", "Dropoff location"),
+]
+
+
+class RegionalGoldenTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        scenario = Scenario.load(FIXTURES_DIR / "regional.json")
+        cls.route_summary = RouteSummary(*scenario.directions.values())
+
+    def test_duty_periods(self):
+        periods = eld_service.plan_duty_periods(self.route_summary, 30, start_minute=8 * 60)
+        self.assertEqual([(p.start, p.end, p.status, p.remarks) for p in periods], REGIONAL_PERIODS)
+
+    def test_restart_is_taken_with_the_cycle_at_70_hours(self):
+        periods = eld_service.plan_duty_periods(self.route_summary, 30, start_minute=8 * 60)
+        restart = next(period for period in periods if period.remarks == "34-hour restart")
+        worked = sum(p.end - p.start for p in periods if p.end <= restart.start and p.status in ("D", "ON"))
+        self.assertEqual(30 + worked / 60, 70.0)
+
+
+class PoiSnappingTests(SimpleTestCase):
+    """Regional fixture with the truck stops and fuel station of the POI fixture along its route"""
+
+    def route_summary(self, without=()):
+        with open(POI_FIXTURE, newline="") as poi_file:
+            pois = PoiIndex(
+                (row["name"], row["longitude"], row["latitude"], row["kind"])
+                for row in csv.DictReader(poi_file) if row["name"] not in without
+            )
+        route_summary = RouteSummary(*Scenario.load(FIXTURES_DIR / "regional.json").directions.values())
+        return RouteSummary.from_index(
+            route_summary.index, route_summary.distances, route_summary.durations,
+            pois.along_route(route_summary.index),
+        )
+
+    def test_rest_is_pulled_back_to_a_truck_stop_within_the_window(self):
+        route_summary = self.route_summary()
+        # The truck stop 7 miles off the route is not a facility along it
+        self.assertEqual(
+            [facility["name"] for facility in route_summary.facilities.ahead(0)],
+            ["Pilot Travel Center Terre Haute", "Marathon Fuel Staunton"],
+        )
+        periods = eld_service.plan_duty_periods(route_summary, 30, start_minute=8 * 60)
+        rest = next(period for period in periods if period.remarks == "10-hour rest period")
+        # Due after 660 minutes of driving, the truck stop is passed at 630
+        self.assertEqual(rest.driven, 630)
+
+        stops = eld_service.plan_stops(route_summary, periods, 30)["ten_hour_breaks"]
+        self.assertEqual(stops["facilities"][0]["name"], "Pilot Travel Center Terre Haute")
+        self.assertEqual(stops["locations"][0], [-87.797519, 39.453733])
+
+    def test_stops_without_a_facility_in_reach_are_left_alone(self):
+        route_summary = self.route_summary(without=["Pilot Travel Center Terre Haute"])
+        periods = eld_service.plan_duty_periods(route_summary, 30, start_minute=8 * 60)
+        self.assertEqual([(p.start, p.end, p.status, p.remarks) for p in periods], REGIONAL_PERIODS)
+
+        stops = eld_service.plan_stops(route_summary, periods, 30)
+        for kind in ("thirty_min_breaks", "ten_hour_breaks", "fuel_stops"):
+            self.assertEqual(stops[kind]["facilities"], [None] * len(stops[kind]["locations"]), kind)
+
+
+class LogSheetTests(SimpleTestCase):
+    def setUp(self):
+        self.index = RouteIndex.from_routes(TO_PICKUP, TO_DROPOFF)
+
+    def sheets(self, start_time, periods):
+        return list(eld_service._build_log_sheets(start_time, periods, self.index))
+
+    def test_periods_are_split_at_midnight(self):
+        # Two hours of driving from 23:00
+        sheets = self.sheets(datetime(2026, 3, 1, 23, 0), [DutyPeriod(0, 120, DRIVING, 0, None)])
+
+        self.assertEqual([sheet["date"] for sheet in sheets], ["2026-03-01", "2026-03-02"])
+        self.assertEqual(sheets[0]["totals"]["driving"], 1)
+        self.assertEqual(sheets[1]["totals"]["driving"], 1)
+        self.assertEqual([event["time"] for event in sheets[0]["events"]], ["23:00"])
+        self.assertEqual([event["time"] for event in sheets[1]["events"]], ["00:00", "01:00"])
+        # The status carried over midnight is logged where the truck is after an hour of driving
+        self.assertEqual(sheets[1]["events"][0]["location"], self.index.position_at_time(3600))
+        self.assertEqual(sheets[1]["events"][1]["remarks"], "End of trip")
+
+    def test_trip_ending_at_midnight_ends_on_the_next_day(self):
+        sheets = self.sheets(datetime(2026, 3, 1, 22, 0), [DutyPeriod(0, 120, DRIVING, 0, None)])
+        self.assertEqual([sheet["date"] for sheet in sheets], ["2026-03-01", "2026-03-02"])
+        self.assertEqual(sheets[0]["totals"]["driving"], 2)
+        self.assertEqual([event["remarks"] for event in sheets[1]["events"]], ["End of trip"])
@@ -0,0 +1,63 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase
+from django.utils import timezone
+
+from planner.models import GeocodedLocation
+from planner.services.geocode_cache import GeocodeCache, normalize_address
+
+CHICAGO = [-87.6298, 41.8781]
+DALLAS = [-96.797, 32.7767]
+
+
+class NormalizeAddressTests(TestCase):
+    def test_punctuation_case_and_spacing_are_ignored(self):
+        self.assertEqual(normalize_address("  Chicago,   IL. "), "chicago il")
+
+
+class GeocodeCacheTests(TestCase):
+    def setUp(self):
+        self.cache = GeocodeCache(memory_size=8, db_size=2)
+
+    def test_database_tier_is_shared_and_promoted_to_memory(self):
+        self.cache.set("Chicago, IL", CHICAGO)
+        other_process = GeocodeCache()
+        self.assertEqual(other_process.get("chicago il"), CHICAGO)
+        with self.assertNumQueries(0):
+            self.assertEqual(other_process.get("CHICAGO, IL"), CHICAGO)
+
+    def test_expired_rows_are_misses(self):
+        self.cache.set("Chicago, IL", CHICAGO)
+        GeocodedLocation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(GeocodeCache().get("Chicago, IL"))
+
+    def test_hits_only_touch_rows_not_used_recently(self):
+        self.cache.set("Chicago, IL", CHICAGO)
+        with self.assertNumQueries(1):
+            GeocodeCache().get("Chicago, IL")
+
+        long_ago = timezone.now() - timedelta(days=1)
+        GeocodedLocation.objects.update(last_used_at=long_ago)
+        with self.assertNumQueries(2):
+            GeocodeCache().get("Chicago, IL")
+        self.assertGreater(GeocodedLocation.objects.get().last_used_at, long_ago)
+
+    def test_failed_touch_still_returns_the_hit(self):
+        self.cache.set("Chicago, IL", CHICAGO)
+        GeocodedLocation.objects.update(last_used_at=timezone.now() - timedelta(days=1))
+        with self.assertLogs("planner.services.geocode_cache", "WARNING"), \
+                mock.patch("django.db.models.QuerySet.update", side_effect=DatabaseError):
+            self.assertEqual(GeocodeCache().get("Chicago, IL"), CHICAGO)
+
+    def test_least_recently_used_rows_are_evicted_every_n_writes(self):
+        self.cache.evict_every = 3
+        for number in range(3):
+            self.cache.set(f"Stop {number}", CHICAGO)
+        self.assertEqual(
+            sorted(GeocodedLocation.objects.values_list("query", flat=True)), ["stop 1", "stop 2"]
+        )
+
+        self.cache.set("Dallas, TX", DALLAS)
+        self.assertEqual(GeocodedLocation.objects.count(), 3)
@@ -0,0 +1,110 @@
+from django.test import SimpleTestCase
+
+from planner.services.geocoders import Geocoder, GeocoderChain, GazetteerIndex, _constraints
+
+SPRINGFIELD_IL = [-89.6501, 39.7817]
+SPRINGFIELD_MO = [-93.2923, 37.2090]
+KANSAS_CITY_MO = [-94.5786, 39.0997]
+KANSAS_CITY_KS = [-94.6275, 39.1142]
+PILOT_4521 = [-101.7687, 35.1919]
+PILOT_4523 = [-97.4417, 35.4634]
+DALLAS_GA = [-84.8405, 33.9237]
+DALLAS_TX = [-96.797, 32.7767]
+
+
+def index_of(*entries):
+    return GazetteerIndex([(name, *coordinates) for name, coordinates in entries])
+
+
+class FakeGeocoder(Geocoder):
+    def __init__(self, name, coords, remote):
+        self.name = name
+        self.coords = coords
+        self.remote = remote
+        self.calls = []
+
+    def geocode(self, location):
+        self.calls.append(location)
+        return self.coords
+
+
+class IndexGeocoder(Geocoder):
+    name = "gazetteer"
+
+    def __init__(self, index):
+        self.index = index
+
+    def geocode(self, location):
+        return self.index.lookup(location)
+
+
+class ConstraintsTests(SimpleTestCase):
+    def test_state_is_read_from_the_last_words(self):
+        self.assertEqual(_constraints("kansas city ks 66101"), ("ks", frozenset({"66101"})))
+        self.assertEqual(_constraints("albany new york"), ("ny", frozenset()))
+        self.assertEqual(_constraints("kansas city"), (None, frozenset()))
+
+
+class GazetteerIndexTests(SimpleTestCase):
+    def test_exact_and_typo_matches(self):
+        index = index_of(
+            ("Pilot Travel Center 4521 Amarillo TX", PILOT_4521),
+            ("Springfield, IL", SPRINGFIELD_IL),
+        )
+        self.assertEqual(index.lookup("springfield il"), SPRINGFIELD_IL)
+        self.assertEqual(index.lookup("Pilot Travl Center 4521 Amarillo TX"), PILOT_4521)
+
+    def test_other_state_is_never_matched(self):
+        index = index_of(("Springfield IL", SPRINGFIELD_IL))
+        self.assertIsNone(index.lookup("Springfield, MA"))
+        self.assertIsNone(index.lookup("Springfield MO"))
+
+    def test_state_picks_between_namesakes(self):
+        index = index_of(("Kansas City MO", KANSAS_CITY_MO))
+        self.assertIsNone(index.lookup("Kansas City KS"))
+
+        index = index_of(("Kansas City MO", KANSAS_CITY_MO), ("Kansas City KS", KANSAS_CITY_KS))
+        self.assertEqual(index.lookup("Kansas Citty KS"), KANSAS_CITY_KS)
+
+    def test_different_store_number_is_never_matched(self):
+        index = index_of(("Pilot Travel Center 4521", PILOT_4521))
+        self.assertIsNone(index.lookup("Pilot Travel Center 4522"))
+
+    def test_different_zip_is_never_matched(self):
+        index = index_of(("Springfield IL 62701", SPRINGFIELD_IL))
+        self.assertIsNone(index.lookup("Springfeld IL 62702"))
+        self.assertEqual(index.lookup("Springfeld IL 62701"), SPRINGFIELD_IL)
+
+    def test_close_scores_at_different_places_are_ambiguous(self):
+        north = ("Loves Travel Stop Oklahoma City North OK", [-97.5164, 35.5634])
+        south = ("Loves Travel Stop Oklahoma City South OK", [-97.5164, 35.3634])
+        query = "Loves Travel Stop Oklahoma Cty OK"
+        self.assertEqual(index_of(north).lookup(query, min_similarity=0.6), north[1])
+        self.assertIsNone(index_of(north, south).lookup(query, min_similarity=0.6))
+
+    def test_prefix_shared_by_different_places_is_ambiguous(self):
+        index = index_of(("Pilot Travel Center 4521", PILOT_4521), ("Pilot Travel Center 4523", PILOT_4523))
+        self.assertIsNone(index.lookup("Pilot Travel Center"))
+        self.assertEqual(index.lookup("Pilot Travel Centr 4521"), PILOT_4521)
+
+    def test_every_place_starting_with_the_prefix_is_compared(self):
+        index = index_of(("Dallas GA", DALLAS_GA), ("Dallas TX 75201", DALLAS_TX))
+        self.assertIsNone(index.lookup("Dallas"))
+        self.assertEqual(index.lookup("Dallas TX"), DALLAS_TX)
+        self.assertEqual(index.lookup("Dallas GA"), DALLAS_GA)
+
+    def test_aliases_of_one_place_are_not_ambiguous(self):
+        index = index_of(("Springfield Illinois", SPRINGFIELD_IL), ("Springfield Illinois USA", SPRINGFIELD_IL))
+        self.assertEqual(index.lookup("Springfeld Illinois"), SPRINGFIELD_IL)
+        self.assertEqual(index.lookup("Springfield Illi"), SPRINGFIELD_IL)
+
+
+class GeocoderChainTests(SimpleTestCase):
+    def test_falls_through_to_remote_when_the_gazetteer_has_no_safe_match(self):
+        index = index_of(("Springfield IL", SPRINGFIELD_IL), ("Springfield MO", SPRINGFIELD_MO))
+        remote = FakeGeocoder("ors", [-72.5898, 42.1015], remote=True)
+        chain = GeocoderChain([IndexGeocoder(index), remote])
+
+        coords = chain.geocode_local("Springfield MA") or chain.geocode_remote("Springfield MA")
+        self.assertEqual(coords, [-72.5898, 42.1015])
+        self.assertEqual(remote.calls, ["Springfield MA"])
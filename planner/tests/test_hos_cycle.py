@@ -0,0 +1,65 @@
+from django.test import SimpleTestCase
+
+from planner.services.hos_cycle import MINUTES_PER_DAY, CycleTracker
+
+HOUR = 60
+DAY = MINUTES_PER_DAY
+
+
+class CycleTrackerTests(SimpleTestCase):
+    def test_hours_roll_off_after_8_days(self):
+        cycle = CycleTracker()
+        cycle.add(0, 10 * HOUR, on_duty=True)
+        cycle.add(DAY, 10 * HOUR, on_duty=True)
+        self.assertEqual(cycle.available_hours(2 * DAY), 50)
+        # Day 0 is still in the window on day 7 and drops out on day 8
+        self.assertEqual(cycle.available_hours(7 * DAY + 23 * HOUR), 50)
+        self.assertEqual(cycle.available_hours(8 * DAY), 60)
+        self.assertEqual(cycle.available_hours(9 * DAY), 70)
+
+    def test_window_is_aligned_to_midnight_of_the_start_day(self):
+        # Plan starts at 20:00, so its 6 hours on duty fall 4 on day 0 and 2 on day 1
+        cycle = CycleTracker(day_start=20 * HOUR)
+        cycle.add(0, 6 * HOUR, on_duty=True)
+        self.assertEqual(cycle.slots[:2], [4 * HOUR, 2 * HOUR])
+        self.assertEqual(cycle.available_hours(8 * DAY - 20 * HOUR), 68)
+
+    def test_long_gap_clears_the_whole_window(self):
+        cycle = CycleTracker()
+        cycle.add(0, 12 * HOUR, on_duty=True)
+        self.assertEqual(cycle.available_hours(30 * DAY), 70)
+
+    def test_34_hours_off_restarts_the_cycle(self):
+        cycle = CycleTracker()
+        cycle.add(0, 14 * HOUR, on_duty=True)
+        cycle.add(14 * HOUR, 33 * HOUR, on_duty=False)
+        self.assertEqual(cycle.available_hours(47 * HOUR), 56)
+
+        cycle.add(47 * HOUR, HOUR, on_duty=False)
+        self.assertEqual(cycle.available_hours(48 * HOUR), 70)
+        self.assertEqual(cycle.restarts, 1)
+
+    def test_on_duty_time_breaks_the_off_duty_streak(self):
+        cycle = CycleTracker()
+        cycle.add(0, 20 * HOUR, on_duty=False)
+        cycle.add(20 * HOUR, HOUR, on_duty=True)
+        cycle.add(21 * HOUR, 20 * HOUR, on_duty=False)
+        self.assertEqual(cycle.restarts, 0)
+        self.assertEqual(cycle.available_hours(41 * HOUR), 69)
+
+    def test_seeded_hours_count_against_the_cycle(self):
+        cycle = CycleTracker()
+        cycle.seed(65 * HOUR)
+        self.assertEqual(cycle.available_hours(0), 5)
+        cycle.add(0, 5 * HOUR, on_duty=True)
+        self.assertEqual(cycle.available(5 * HOUR), 0)
+
+    def test_seeded_hours_roll_off_with_their_day(self):
+        cycle = CycleTracker()
+        cycle.seed(30 * HOUR)  # Worked the day before the plan
+        self.assertEqual(cycle.available_hours(6 * DAY), 40)
+        self.assertEqual(cycle.available_hours(7 * DAY), 70)
+
+        cycle = CycleTracker()
+        cycle.seed(30 * HOUR, days_ago=8)  # Already out of the window
+        self.assertEqual(cycle.available_hours(0), 70)
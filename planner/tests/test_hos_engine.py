@@ -0,0 +1,81 @@
+from django.test import SimpleTestCase
+
+from planner.services.hos_engine import DRIVING, OFF_DUTY, ON_DUTY, SLEEPER_BERTH, HOSSimulator, ShiftState
+
+HOUR = 60
+
+
+def summary(periods):
+    return [(period.start, period.end, period.status, period.remarks) for period in periods]
+
+
+class HOSSimulatorTests(SimpleTestCase):
+    def setUp(self):
+        self.simulator = HOSSimulator()
+
+    def test_break_after_8_hours_of_driving(self):
+        periods = self.simulator.simulate([(DRIVING, 9 * HOUR, None)])
+        self.assertEqual(summary(periods), [
+            (0, 8 * HOUR, DRIVING, None),
+            (8 * HOUR, 8 * HOUR + 30, OFF_DUTY, "30-minute break"),
+            (8 * HOUR + 30, 9 * HOUR + 30, DRIVING, None),
+        ])
+
+    def test_on_duty_half_hour_counts_as_the_break(self):
+        tasks = [(DRIVING, 5 * HOUR, None), (ON_DUTY, HOUR, "Pickup location"), (DRIVING, 5 * HOUR, None)]
+        periods = self.simulator.simulate(tasks)
+        self.assertNotIn("30-minute break", [period.remarks for period in periods])
+
+    def test_rest_after_11_hours_of_driving(self):
+        periods = self.simulator.simulate([(DRIVING, 12 * HOUR, None)])
+        self.assertEqual(summary(periods), [
+            (0, 8 * HOUR, DRIVING, None),
+            (8 * HOUR, 8 * HOUR + 30, OFF_DUTY, "30-minute break"),
+            (8 * HOUR + 30, 11 * HOUR + 30, DRIVING, None),
+            (11 * HOUR + 30, 21 * HOUR + 30, SLEEPER_BERTH, "10-hour rest period"),
+            (21 * HOUR + 30, 22 * HOUR + 30, DRIVING, None),
+        ])
+
+    def test_rest_at_the_end_of_the_14_hour_window(self):
+        tasks = [(ON_DUTY, 4 * HOUR, "Pickup location"), (DRIVING, 11 * HOUR, None)]
+        periods = self.simulator.simulate(tasks)
+        self.assertEqual(summary(periods), [
+            (0, 4 * HOUR, ON_DUTY, "Pickup location"),
+            (4 * HOUR, 12 * HOUR, DRIVING, None),
+            (12 * HOUR, 12 * HOUR + 30, OFF_DUTY, "30-minute break"),
+            # Only 9.5 hours driven, but the window that opened at the pickup is closed
+            (12 * HOUR + 30, 14 * HOUR, DRIVING, None),
+            (14 * HOUR, 24 * HOUR, SLEEPER_BERTH, "10-hour rest period"),
+            (24 * HOUR, 25 * HOUR + 30, DRIVING, None),
+        ])
+
+    def test_restart_when_the_cycle_runs_out(self):
+        periods = self.simulator.simulate([(DRIVING, 2 * HOUR, None)], cycle_used=69 * HOUR)
+        self.assertEqual(summary(periods), [
+            (0, HOUR, DRIVING, None),
+            (HOUR, 35 * HOUR, OFF_DUTY, "34-hour restart"),
+            (35 * HOUR, 36 * HOUR, DRIVING, None),
+        ])
+
+    def test_driving_stops_to_fuel(self):
+        periods = self.simulator.simulate([(DRIVING, 3 * HOUR, None)], fuel_marks=[2 * HOUR])
+        self.assertEqual(summary(periods), [
+            (0, 2 * HOUR, DRIVING, None),
+            (2 * HOUR, 2 * HOUR + 30, ON_DUTY, "Fueling"),
+            (2 * HOUR + 30, 3 * HOUR + 30, DRIVING, None),
+        ])
+
+    def test_shift_in_progress_is_continued(self):
+        shift = ShiftState(driving=10 * HOUR, elapsed=12 * HOUR, since_break=2 * HOUR, off_duty=0)
+        periods = self.simulator.simulate([(DRIVING, 2 * HOUR, None)], shift=shift)
+        self.assertEqual(summary(periods)[:2], [
+            (0, HOUR, DRIVING, None),
+            (HOUR, 11 * HOUR, SLEEPER_BERTH, "10-hour rest period"),
+        ])
+
+    def test_breaks_are_taken_at_a_facility_within_the_window(self):
+        periods = self.simulator.simulate([(DRIVING, 9 * HOUR, None)], stop_marks=[7 * HOUR + 30])
+        self.assertEqual(summary(periods)[:2], [
+            (0, 7 * HOUR + 30, DRIVING, None),
+            (7 * HOUR + 30, 8 * HOUR, OFF_DUTY, "30-minute break"),
+        ])
@@ -0,0 +1,120 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+
+from planner.services.http_client import (
+    HTTP_MAX_RETRIES, AsyncUpstreamClient, CircuitBreaker, UpstreamClient, UpstreamUnavailable
+)
+
+
+class StatusAdapter(HTTPAdapter):
+    """Answers every request with the next of the given status codes"""
+
+    def __init__(self, *status_codes):
+        super().__init__()
+        self.status_codes = list(status_codes)
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        response = Response()
+        response.request = request
+        response.status_code = self.status_codes.pop(0)
+        response._content = b"{}"
+        return response
+
+
+def at(seconds):
+    return mock.patch("planner.services.http_client.time.monotonic", return_value=seconds)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    def fail(self, times):
+        for _ in range(times):
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        with at(100):
+            self.fail(2)
+            self.assertTrue(self.breaker.allow_request())
+            self.breaker.record_success()
+            self.fail(2)
+            self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+            with self.assertLogs("planner.services.http_client", "WARNING"):
+                self.fail(1)
+            self.assertFalse(self.breaker.allow_request())
+
+    def test_single_probe_after_the_cool_down(self):
+        with at(100), self.assertLogs("planner.services.http_client", "WARNING"):
+            self.fail(3)
+        with at(129):
+            self.assertFalse(self.breaker.allow_request())
+        with at(130):
+            self.assertTrue(self.breaker.allow_request())
+            self.assertFalse(self.breaker.allow_request())
+            self.breaker.record_success()
+            self.assertTrue(self.breaker.allow_request())
+
+    def test_failed_probe_opens_again(self):
+        with at(100), self.assertLogs("planner.services.http_client", "WARNING"):
+            self.fail(3)
+        with at(130), self.assertLogs("planner.services.http_client", "WARNING"):
+            self.assertTrue(self.breaker.allow_request())
+            self.fail(1)
+        with at(159):
+            self.assertFalse(self.breaker.allow_request())
+
+
+class UpstreamClientTests(SimpleTestCase):
+    def setUp(self):
+        self.client = UpstreamClient()
+        self.client.breaker = CircuitBreaker(failure_threshold=2)
+
+    def test_retries_are_bounded_to_idempotent_gets(self):
+        retries = self.client.session.get_adapter("https://api.openrouteservice.org").max_retries
+        self.assertEqual(retries.total, HTTP_MAX_RETRIES)
+        self.assertIn(503, retries.status_forcelist)
+        self.assertEqual(retries.allowed_methods, frozenset({"GET"}))
+
+    def test_upstream_errors_open_the_circuit(self):
+        adapter = StatusAdapter(503, 502)
+        self.client.session.mount("https://", adapter)
+        self.assertEqual(self.client.get("https://upstream.test/a").status_code, 503)
+        with self.assertLogs("planner.services.http_client", "WARNING"):
+            self.client.get("https://upstream.test/a")
+
+        with self.assertRaises(UpstreamUnavailable):
+            self.client.get("https://upstream.test/a")
+        self.assertEqual(adapter.requests, 2)
+
+    def test_client_errors_do_not_count_as_failures(self):
+        self.client.session.mount("https://", StatusAdapter(404, 404, 404))
+        for _ in range(3):
+            self.assertEqual(self.client.get("https://upstream.test/a").status_code, 404)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+
+class AsyncUpstreamClientTests(SimpleTestCase):
+    def test_each_loop_gets_one_client_closed_when_the_loop_shuts_down(self):
+        upstream = AsyncUpstreamClient()
+        clients = []
+
+        async def request():
+            client = await upstream._get_client()
+            self.assertIs(await upstream._get_client(), client)
+            self.assertFalse(client.is_closed)
+            clients.append(client)
+
+        async_to_sync(request)()
+        asyncio.run(request())
+
+        self.assertIsNot(clients[0], clients[1])
+        self.assertTrue(all(client.is_closed for client in clients))
+        self.assertEqual(upstream._clients, {})
@@ -0,0 +1,48 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from planner.services import metrics
+from planner.services.metrics import MetricsRegistry
+from planner.services.route_service import map_concurrently
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry(buckets=(0.01, 0.1))
+        for seconds in (0.005, 0.05, 0.5):
+            registry.observe("directions", seconds)
+        registry.increment("route_cache_hits", 2)
+        lines = registry.render().splitlines()
+        self.assertIn('planner_stage_seconds_bucket{stage="directions",le="0.01"} 1', lines)
+        self.assertIn('planner_stage_seconds_bucket{stage="directions",le="0.1"} 2', lines)
+        self.assertIn('planner_stage_seconds_bucket{stage="directions",le="+Inf"} 3', lines)
+        self.assertIn('planner_stage_seconds_count{stage="directions"} 3', lines)
+        self.assertIn('planner_events_total{event="route_cache_hits"} 2', lines)
+
+
+@mock.patch.object(metrics, "PLANNER_METRICS", True)
+class RequestMetricsTests(SimpleTestCase):
+    def test_spans_on_worker_threads_count_for_the_request(self):
+        def lookup(location):
+            with metrics.span("geocode"):
+                metrics.increment("geocode_cache_hits")
+
+        request_metrics, token = metrics.start_request()
+        try:
+            map_concurrently(lookup, [("a",), ("b",)])
+        finally:
+            metrics.end_request(token)
+        self.assertEqual(set(request_metrics.spans), {"geocode"})
+        self.assertEqual(request_metrics.counters, {"geocode_cache_hits": 2})
+        self.assertIn('geocode_cache_hits;desc="2"', request_metrics.server_timing())
+
+    def test_nothing_is_collected_when_disabled(self):
+        request_metrics, token = metrics.start_request()
+        try:
+            with mock.patch.object(metrics, "PLANNER_METRICS", False):
+                with metrics.span("geocode"):
+                    metrics.increment("geocode_cache_hits")
+        finally:
+            metrics.end_request(token)
+        self.assertEqual((request_metrics.spans, request_metrics.counters), ({}, {}))
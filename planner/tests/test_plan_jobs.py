@@ -0,0 +1,62 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from planner.models import PlanJob
+from planner.services.plan_jobs import PLAN_JOB_MAX_ATTEMPTS, PlanJobQueue, PlanningError
+from planner.services.plan_memo import reserve_plan_job
+
+TRIP = {
+    "current_location": "Chicago, IL",
+    "pickup_location": "St. Louis, MO",
+    "dropoff_location": "Dallas, TX",
+    "current_cycle_used": 12.5,
+}
+
+
+@mock.patch("planner.services.plan_jobs.threading.Timer")
+class PlanJobQueueTests(TestCase):
+    def setUp(self):
+        self.queue = PlanJobQueue(workers=1)
+        self.job, _ = reserve_plan_job(TRIP, "hash", status=PlanJob.PENDING)
+
+    def run_failing(self, error):
+        job = self.queue.claim_next()
+        # Unexpected errors are logged with their traceback
+        with mock.patch("planner.services.plan_jobs.build_plan", side_effect=error), \
+                mock.patch("planner.services.plan_jobs.logger"):
+            self.queue.run(job)
+        job.refresh_from_db()
+        return job
+
+    def test_failed_attempt_is_retried_after_a_backoff(self, timer):
+        job = self.run_failing(TimeoutError("ORS timed out"))
+        self.assertEqual(job.status, PlanJob.PENDING)
+        self.assertGreater(job.not_before, timezone.now())
+        self.assertIsNone(self.queue.claim_next())
+        timer.assert_called_once()
+
+        PlanJob.objects.filter(pk=job.pk).update(not_before=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.queue.claim_next().pk, job.pk)
+
+    def test_backoff_doubles_with_each_attempt(self, timer):
+        self.run_failing(TimeoutError())
+        PlanJob.objects.update(not_before=None)
+        self.run_failing(TimeoutError())
+        first, second = [call.args[0] for call in timer.call_args_list]
+        self.assertEqual(second, 2 * first)
+
+    def test_job_fails_for_good_after_the_last_attempt(self, timer):
+        for _ in range(PLAN_JOB_MAX_ATTEMPTS):
+            PlanJob.objects.update(not_before=None)
+            job = self.run_failing(TimeoutError())
+        self.assertEqual(job.status, PlanJob.FAILED)
+        self.assertIsNone(job.not_before)
+        self.assertEqual(timer.call_count, PLAN_JOB_MAX_ATTEMPTS - 1)
+
+    def test_planning_errors_are_not_retried(self, timer):
+        job = self.run_failing(PlanningError("Could not calculate a route"))
+        self.assertEqual(job.status, PlanJob.FAILED)
+        timer.assert_not_called()
@@ -0,0 +1,124 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from planner.models import PlanJob
+from planner.services import plan_memo
+from planner.services.plan_memo import (
+    IdempotencyConflict, find_plan_job, plan_input_hash, purge_plan_jobs, release_plan, remember_plan, reserve_plan_job
+)
+
+TRIP = {
+    "current_location": "Chicago, IL",
+    "pickup_location": "St. Louis, MO",
+    "dropoff_location": "Dallas, TX",
+    "current_cycle_used": 12.5,
+}
+OTHER_TRIP = dict(TRIP, dropoff_location="Houston, TX")
+
+
+def hours_ago(hours):
+    return timezone.now() - timedelta(hours=hours)
+
+
+class PlanInputHashTests(TestCase):
+    def test_normalized_addresses_hash_the_same(self):
+        shouted = dict(TRIP, current_location="  CHICAGO,  IL ")
+        self.assertEqual(plan_input_hash(TRIP), plan_input_hash(shouted))
+        self.assertNotEqual(plan_input_hash(TRIP), plan_input_hash(OTHER_TRIP))
+        self.assertNotEqual(plan_input_hash(TRIP), plan_input_hash(TRIP, {"geometry": "polyline"}))
+
+
+class ReservePlanJobTests(TestCase):
+    def setUp(self):
+        self.input_hash = plan_input_hash(TRIP)
+
+    def test_key_is_taken_before_the_plan_is_computed(self):
+        job, created = reserve_plan_job(TRIP, self.input_hash, "key-1")
+        self.assertTrue(created)
+        self.assertEqual(job.status, PlanJob.RUNNING)
+
+        again, created = reserve_plan_job(TRIP, self.input_hash, "key-1")
+        self.assertFalse(created)
+        self.assertEqual(again.pk, job.pk)
+        self.assertEqual(PlanJob.objects.count(), 1)
+
+    def test_key_reused_with_another_trip_conflicts(self):
+        reserve_plan_job(TRIP, self.input_hash, "key-1")
+        with self.assertRaises(IdempotencyConflict):
+            reserve_plan_job(OTHER_TRIP, plan_input_hash(OTHER_TRIP), "key-1")
+
+    def test_failed_plan_frees_its_key(self):
+        job, _ = reserve_plan_job(TRIP, self.input_hash, "key-1")
+        release_plan(job, "Could not route")
+        retried, created = reserve_plan_job(TRIP, self.input_hash, "key-1")
+        self.assertTrue(created)
+        self.assertNotEqual(retried.pk, job.pk)
+
+    def test_key_of_an_abandoned_plan_is_free_again(self):
+        job, _ = reserve_plan_job(TRIP, self.input_hash, "key-1")
+        PlanJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(minutes=5))
+        self.assertFalse(reserve_plan_job(TRIP, self.input_hash, "key-1")[1])
+
+        # Killed before it could release the key
+        PlanJob.objects.filter(pk=job.pk).update(started_at=hours_ago(1))
+        retried, created = reserve_plan_job(TRIP, self.input_hash, "key-1")
+        self.assertTrue(created)
+        job.refresh_from_db()
+        self.assertEqual(job.status, PlanJob.FAILED)
+        self.assertEqual(find_plan_job(self.input_hash, "key-1").pk, retried.pk)
+
+    def test_expired_key_is_free_again(self):
+        job, _ = reserve_plan_job(TRIP, self.input_hash, "key-1")
+        remember_plan(job, {"log_sheets": []})
+        PlanJob.objects.filter(pk=job.pk).update(created_at=hours_ago(25))
+
+        reused, created = reserve_plan_job(OTHER_TRIP, plan_input_hash(OTHER_TRIP), "key-1")
+        self.assertTrue(created)
+        job.refresh_from_db()
+        self.assertIsNone(job.idempotency_key)
+
+
+class FindPlanJobTests(TestCase):
+    def setUp(self):
+        self.input_hash = plan_input_hash(TRIP)
+        self.job, _ = reserve_plan_job(TRIP, self.input_hash)
+
+    def test_running_plan_is_only_found_by_its_key(self):
+        self.assertIsNone(find_plan_job(self.input_hash))
+
+    def test_recent_plan_is_reused_without_a_key(self):
+        remember_plan(self.job, {"log_sheets": []})
+        self.assertEqual(find_plan_job(self.input_hash).pk, self.job.pk)
+
+        PlanJob.objects.filter(pk=self.job.pk).update(finished_at=hours_ago(1))
+        self.assertIsNone(find_plan_job(self.input_hash))
+
+
+class PurgePlanJobsTests(TestCase):
+    def setUp(self):
+        plan_memo._last_purge = None
+
+    def finished_job(self, status, finished_at):
+        job, _ = reserve_plan_job(TRIP, plan_input_hash(TRIP))
+        PlanJob.objects.filter(pk=job.pk).update(status=status, finished_at=finished_at)
+        return job
+
+    def test_jobs_finished_past_the_retention_are_deleted(self):
+        old_done = self.finished_job(PlanJob.DONE, hours_ago(25))
+        old_failed = self.finished_job(PlanJob.FAILED, hours_ago(25))
+        recent = self.finished_job(PlanJob.DONE, hours_ago(1))
+        running, _ = reserve_plan_job(TRIP, plan_input_hash(TRIP))
+
+        self.assertEqual(purge_plan_jobs(), 2)
+        remaining = set(PlanJob.objects.values_list("pk", flat=True))
+        self.assertEqual(remaining, {recent.pk, running.pk})
+        self.assertNotIn(old_done.pk, remaining)
+        self.assertNotIn(old_failed.pk, remaining)
+
+    def test_purge_runs_once_per_interval(self):
+        purge_plan_jobs()
+        self.finished_job(PlanJob.DONE, hours_ago(25))
+        self.assertEqual(purge_plan_jobs(), 0)
+        self.assertEqual(purge_plan_jobs(force=True), 1)
@@ -0,0 +1,324 @@
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+
+from planner.benchmarks.fixtures import FixtureAdapter, load_scenarios
+from planner.models import GeocodedLocation, PlanJob, Trip
+from planner.serializers import FleetDriverSerializer
+from planner.services import metrics
+from planner.services.eld_service import eld_service
+from planner.services.geocode_cache import geocode_cache, normalize_address
+from planner.services.http_client import ors_client
+from planner.services.route_cache import route_cache
+from planner.services.route_service import get_route_service
+from planner.services.route_summary import RouteSummary
+from planner.services.trip_routes import trip_routes
+from planner.tests.test_route_index import TO_PICKUP
+from planner.views import ROUTE_ERROR
+
+# Stops block -> (log event remarks, count field)
+STOPS = {
+    "thirty_min_breaks": ("30-minute break", "number_of_breaks"),
+    "ten_hour_breaks": ("10-hour rest period", "number_of_breaks"),
+    "fuel_stops": ("Fueling", "number_of_fuel_stops"),
+    "cycle_restarts": ("34-hour restart", "number_of_restarts"),
+}
+
+
+class PlannerFixtureTestCase(TestCase):
+    """Plans the recorded benchmark scenarios without calling ORS"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.scenarios = {scenario.name: scenario for scenario in load_scenarios()}
+        cls.adapters = dict(ors_client.session.adapters)
+        cls.fixture_adapter = FixtureAdapter(list(cls.scenarios.values()))
+        ors_client.session.mount("https://", cls.fixture_adapter)
+
+    @classmethod
+    def tearDownClass(cls):
+        for prefix, adapter in cls.adapters.items():
+            ors_client.session.mount(prefix, adapter)
+        super().tearDownClass()
+
+    def setUp(self):
+        route_cache.entries.clear()
+        geocode_cache.memory.clear()
+
+    def plan(self, name, **headers):
+        response = self.client.post(
+            reverse("spotter-planner"), data=self.scenarios[name].trip, content_type="application/json",
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+
+class TripPlannerViewTests(PlannerFixtureTestCase):
+    def test_stops_describe_the_same_plan_as_the_log_sheets(self):
+        for name in self.scenarios:
+            with self.subTest(name):
+                result = self.plan(name)
+                events = [event for sheet in result["log_sheets"] for event in sheet["events"]]
+                stops = result["route"]["stops"]
+                for key, (remarks, count) in STOPS.items():
+                    logged = [event["location"] for event in events if event.get("remarks") == remarks]
+                    self.assertEqual(stops[key]["locations"], logged, key)
+                    self.assertEqual(stops[key][count], len(logged), key)
+
+    def test_geocoded_addresses_are_stored_in_the_database_tier(self):
+        trip = self.scenarios["short"].trip
+        addresses = [trip[field] for field in ("current_location", "pickup_location", "dropoff_location")]
+        coordinates = get_route_service().geocode_many(addresses)
+        self.assertEqual(
+            set(GeocodedLocation.objects.values_list("query", flat=True)),
+            {normalize_address(address) for address in addresses},
+        )
+
+        # A worker that has not seen the addresses reads them back instead of geocoding them again
+        geocode_cache.memory.clear()
+        geocoder = get_route_service().geocoder
+        with mock.patch.object(geocoder, "geocode_remote", side_effect=AssertionError("geocoded again")):
+            self.assertEqual(get_route_service().geocode_many(addresses), coordinates)
+
+    def test_cycle_hours_outside_the_70_hour_limit_are_rejected(self):
+        for hours in (-1, 70.5):
+            response = self.client.post(
+                reverse("spotter-planner"), data=dict(self.scenarios["short"].trip, current_cycle_used=hours),
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("current_cycle_used", response.json())
+        self.assertFalse(Trip.objects.exists())
+
+    def test_short_trip_has_no_break(self):
+        stops = self.plan("short")["route"]["stops"]
+        self.assertEqual(stops["thirty_min_breaks"]["number_of_breaks"], 0)
+        self.assertIsNone(stops["thirty_min_breaks"]["location"])
+
+
+@mock.patch.object(metrics, "PLANNER_METRICS", True)
+class MetricsTests(PlannerFixtureTestCase):
+    def test_server_timing_names_the_stages_of_the_request(self):
+        response = self.client.post(
+            reverse("spotter-planner"), data=self.scenarios["short"].trip, content_type="application/json",
+        )
+        stages = {entry.split(";")[0] for entry in response["Server-Timing"].split(", ")}
+        self.assertTrue(
+            {"plan_memo", "trip_insert", "geocode", "directions", "route_index", "hos_simulation", "total"} <= stages,
+            stages,
+        )
+
+    def test_metrics_endpoint_counts_cache_hits(self):
+        self.plan("short")
+        # Same addresses and legs for another cycle, so nothing is memoized but everything is cached
+        response = self.client.post(
+            reverse("spotter-planner"), data=dict(self.scenarios["short"].trip, current_cycle_used=40),
+            content_type="application/json",
+        )
+        self.assertIn('geocode_cache_hits;desc="3"', response["Server-Timing"])
+        self.assertIn('route_cache_hits;desc="2"', response["Server-Timing"])
+
+        exported = self.client.get(reverse("planner-metrics")).content.decode()
+        self.assertIn('planner_events_total{event="geocode_cache_hits"}', exported)
+        self.assertIn('planner_events_total{event="route_cache_hits"}', exported)
+        self.assertIn('planner_stage_seconds_count{stage="directions"}', exported)
+
+    def test_metrics_endpoint_is_hidden_when_disabled(self):
+        with mock.patch.object(metrics, "PLANNER_METRICS", False):
+            response = self.client.get(reverse("planner-metrics"))
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn("Server-Timing", response)
+
+
+class IdempotencyTests(PlannerFixtureTestCase):
+    def test_retry_with_the_same_key_is_replayed(self):
+        first = self.plan("short", idempotency_key="retry-1")
+        response = self.client.post(
+            reverse("spotter-planner"), data=self.scenarios["short"].trip, content_type="application/json",
+            headers={"idempotency-key": "retry-1"},
+        )
+        self.assertEqual(response["Idempotent-Replayed"], "true")
+        self.assertEqual(response.json(), first)
+        self.assertEqual(PlanJob.objects.get().status, PlanJob.DONE)
+
+    def test_streamed_plan_is_remembered_once_sent(self):
+        response = self.client.post(
+            reverse("spotter-planner") + "?stream=true", data=self.scenarios["short"].trip,
+            content_type="application/json", headers={"idempotency-key": "stream-1"},
+        )
+        b"".join(response.streaming_content)
+        job = PlanJob.objects.get()
+        self.assertEqual(job.status, PlanJob.DONE)
+        self.assertTrue(job.result["log_sheets"])
+
+    async def test_async_stream_sends_records_as_they_are_made(self):
+        first = await sync_to_async(self.plan)("short", idempotency_key="stream-2")
+        response = await self.async_client.post(
+            reverse("spotter-planner-async") + "?stream=true", data=self.scenarios["short"].trip,
+            content_type="application/json", headers={"idempotency-key": "stream-2"},
+        )
+        # An async iterator, so ASGI servers do not read the whole plan before sending it
+        self.assertTrue(response.is_async)
+        records = [json.loads(line) async for line in response.streaming_content]
+        self.assertEqual([record["type"] for record in records[:2]], ["trip", "summary"])
+        self.assertEqual([record["log_sheet"] for record in records[2:-1]], first["log_sheets"])
+
+    def test_queued_job_keeps_its_key(self):
+        responses = [
+            self.client.post(
+                reverse("spotter-planner-jobs"), data=self.scenarios["short"].trip, content_type="application/json",
+                headers={"idempotency-key": "job-1"},
+            )
+            for _ in range(2)
+        ]
+        self.assertEqual([response.status_code for response in responses], [202, 200])
+        self.assertEqual(responses[0].json()["id"], responses[1].json()["id"])
+
+
+class TripBatchPlannerViewTests(PlannerFixtureTestCase):
+    def batch(self, trips, query=""):
+        return self.client.post(
+            reverse("spotter-planner-batch") + query, data={"trips": trips}, content_type="application/json",
+        )
+
+    def batch_with_unknown(self, trips, query=""):
+        """Post a batch with a trip from an address nothing is recorded for, so it cannot be routed"""
+        unknown = dict(self.scenarios["short"].trip, current_location="Nowhere, ZZ")
+        with self.assertLogs("planner.services.geocoders", "WARNING"):
+            return self.batch(trips[:1] + [unknown] + trips[1:], query)
+
+    def test_invalid_trip_rejects_the_batch_with_its_errors(self):
+        invalid = dict(self.scenarios["short"].trip, current_cycle_used=80)
+        response = self.batch([self.scenarios["short"].trip, invalid])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()["trips"]
+        self.assertEqual(errors[0], {})
+        self.assertIn("current_cycle_used", errors[1])
+        self.assertFalse(Trip.objects.exists())
+
+    def test_trips_that_cannot_be_routed_get_their_own_error(self):
+        response = self.batch_with_unknown([self.scenarios["short"].trip, self.scenarios["regional"].trip])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([bool(result.get("log_sheets")) for result in results], [True, False, True])
+        self.assertEqual(results[1]["error"], ROUTE_ERROR)
+        self.assertEqual(results[1]["trip"]["current_location"], "Nowhere, ZZ")
+        self.assertEqual(Trip.objects.count(), 3)
+
+    def test_shared_addresses_and_legs_are_looked_up_once(self):
+        short, regional = self.scenarios["short"].trip, self.scenarios["regional"].trip
+        requests = self.fixture_adapter.requests
+        response = self.batch([short, dict(short, current_location="  chicago,  IL"), regional])
+        self.assertEqual(response.status_code, 200)
+        # Chicago, Joliet, Indianapolis and Dallas, then Chicago-Joliet, Joliet-Indianapolis,
+        # Chicago-Indianapolis and Indianapolis-Dallas
+        self.assertEqual(self.fixture_adapter.requests - requests, 8)
+        results = response.json()["results"]
+        self.assertEqual(results[0]["route"], results[1]["route"])
+        self.assertEqual(results[0]["log_sheets"], results[1]["log_sheets"])
+
+    def test_streamed_records_are_tagged_with_their_trip(self):
+        response = self.batch_with_unknown([self.scenarios["short"].trip], query="?stream=true")
+        self.assertEqual(response.status_code, 200)
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        first = [record["type"] for record in records if record["index"] == 0]
+        self.assertEqual(first[:2] + first[-1:], ["trip", "summary", "route"])
+        self.assertEqual(set(first[2:-1]), {"log_sheet"})
+        self.assertEqual(
+            [(record["type"], record["error"]) for record in records if record["index"] == 1], [("error", ROUTE_ERROR)]
+        )
+
+
+class FleetFeasibilityViewTests(PlannerFixtureTestCase):
+    START = datetime(2026, 3, 2, 8, 0, tzinfo=dt_timezone.utc)
+    DRIVERS = [
+        {"driver_id": "rested", "current_location": "Chicago, IL", "current_cycle_used": 30},
+        {"driver_id": "rested-too", "current_location": "chicago il", "current_cycle_used": 30},
+        {
+            "driver_id": "late-in-shift", "current_location": "Chicago, IL", "current_cycle_used": 60,
+            "drive_remaining": 2, "duty_remaining": 3, "driving_since_break": 7.5, "off_duty_hours": 0,
+        },
+        {"driver_id": "restarted", "current_location": "Chicago, IL", "current_cycle_used": 69, "off_duty_hours": 34},
+    ]
+
+    def evaluate(self, drivers, deadline):
+        load = self.scenarios["regional"].trip
+        return self.client.post(reverse("spotter-planner-fleet"), data={
+            "pickup_location": load["pickup_location"],
+            "dropoff_location": load["dropoff_location"],
+            "start_time": self.START.isoformat(),
+            "deadline": deadline.isoformat(),
+            "drivers": drivers,
+        }, content_type="application/json")
+
+    def test_each_driver_matches_a_simulation_of_its_own(self):
+        deadline = self.START + timedelta(days=5)
+        response = self.evaluate(self.DRIVERS, deadline)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+
+        route_summary = RouteSummary(*self.scenarios["regional"].directions.values())
+        arrivals = {}
+        for driver, result in zip(self.DRIVERS, results):
+            serializer = FleetDriverSerializer(data=driver)
+            self.assertTrue(serializer.is_valid())
+            cycle_used, shift = eld_service.driver_state(serializer.validated_data)
+            periods = eld_service.plan_duty_periods(route_summary, cycle_used / 60, 8 * 60, shift)
+            dropoff = next(period.start for period in periods if period.remarks == "Dropoff location")
+            arrivals[driver["driver_id"]] = self.START + timedelta(minutes=dropoff)
+            self.assertEqual(result["driver_id"], driver["driver_id"])
+            self.assertEqual(parse_datetime(result["dropoff_arrival"]), arrivals[driver["driver_id"]])
+            self.assertEqual(result["feasible"], arrivals[driver["driver_id"]] <= deadline)
+
+        # Earliest arrival first, the driver still on a long shift misses the deadline
+        self.assertEqual(response.json()["feasible_drivers"], ["restarted", "rested", "rested-too"])
+
+    def test_invalid_drivers_are_rejected(self):
+        drivers = [
+            self.DRIVERS[0],
+            dict(self.DRIVERS[0], current_cycle_used=71),
+            dict(self.DRIVERS[0], drive_remaining=12),
+            {"current_location": "Chicago, IL", "current_cycle_used": 30},
+        ]
+        response = self.evaluate(drivers, self.START + timedelta(days=3))
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()["drivers"]
+        self.assertEqual(errors[0], {})
+        self.assertEqual([list(error) for error in errors[1:]], [
+            ["current_cycle_used"], ["drive_remaining"], ["driver_id"]
+        ])
+
+
+class TripReplanViewTests(PlannerFixtureTestCase):
+    def replan(self, trip_id, **update):
+        return self.client.post(
+            reverse("spotter-planner-replan", args=[trip_id]),
+            data=dict({"current_cycle_used": 30}, **update), content_type="application/json",
+        )
+
+    def test_positions_from_the_stored_route_are_rounded(self):
+        trip_id = self.plan("regional")["trip"]["id"]
+        # Loaded back from the float32 copy in the database
+        trip_routes.summaries.clear()
+        response = self.replan(trip_id, longitude=-86.8155, latitude=36.1623)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        locations = [result["position"]["location"]] + [
+            event["location"] for sheet in result["log_sheets"] for event in sheet["events"]
+        ]
+        for location in locations:
+            self.assertEqual(location, [round(coordinate, 6) for coordinate in location])
+
+    def test_update_matching_no_part_of_the_route_is_a_conflict(self):
+        trip = Trip.objects.create(**self.scenarios["short"].trip)
+        # Routed to the pickup only, so there is nothing left once picked up
+        trip_routes.save(trip, RouteSummary(TO_PICKUP, {"features": []}))
+        response = self.replan(trip.pk, longitude=0.0, latitude=0.5, picked_up=True)
+        self.assertEqual(response.status_code, 409)
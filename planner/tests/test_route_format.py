@@ -0,0 +1,47 @@
+import polyline
+from django.test import SimpleTestCase
+
+from planner.benchmarks.fixtures import FIXTURES_DIR, Scenario
+from planner.services.geometry import simplify
+from planner.services.route_format import POLYLINE_PRECISION, compact_route, format_trip_details
+from planner.tests.test_route_index import directions
+
+# Example from Google's encoded polyline algorithm documentation, as [lon, lat] pairs
+GOOGLE_COORDINATES = [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]
+GOOGLE_POLYLINE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+class CompactRouteTests(SimpleTestCase):
+    def test_polyline_matches_the_reference_encoding(self):
+        compact = compact_route(directions(GOOGLE_COORDINATES, 1000, 60))
+        self.assertEqual(compact["geometry"], GOOGLE_POLYLINE)
+        self.assertEqual(compact["vertices"], 3)
+        decoded = polyline.decode(compact["geometry"], POLYLINE_PRECISION, geojson=True)
+        self.assertEqual([list(point) for point in decoded], GOOGLE_COORDINATES)
+
+    def test_geojson_is_returned_untouched(self):
+        trip_details = {"to_pickup": directions(GOOGLE_COORDINATES, 1000, 60), "pickup_to_dropoff": None}
+        self.assertIs(format_trip_details(trip_details), trip_details)
+        self.assertIsNone(format_trip_details(trip_details, "polyline")["pickup_to_dropoff"])
+
+
+class SimplifyTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        route = Scenario.load(FIXTURES_DIR / "regional.json").directions
+        cls.coordinates = next(iter(route.values()))["features"][0]["geometry"]["coordinates"]
+
+    def test_tolerance_keeps_the_endpoints_and_drops_vertices(self):
+        simplified = simplify(self.coordinates, 50)
+        self.assertEqual(simplified[0], self.coordinates[0])
+        self.assertEqual(simplified[-1], self.coordinates[-1])
+        self.assertLess(len(simplified), len(self.coordinates))
+        # Every kept vertex is one of the originals, in the same order
+        positions = [self.coordinates.index(point) for point in simplified]
+        self.assertEqual(positions, sorted(positions))
+        self.assertLess(len(simplify(self.coordinates, 500)), len(simplified))
+
+    def test_without_tolerance_nothing_is_dropped(self):
+        self.assertEqual(simplify(self.coordinates, 0), self.coordinates)
+        self.assertEqual(simplify(self.coordinates[:2], 1000), self.coordinates[:2])
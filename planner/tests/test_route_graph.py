@@ -0,0 +1,66 @@
+import os
+import struct
+import tempfile
+
+from django.test import SimpleTestCase
+
+from planner.services.geometry import haversine
+from planner.services.route_graph import RouteGraph, RouteGraphError, write_graph
+
+# 5 x 5 grid of nodes 0.1 degrees apart, with a fast road along the bottom row
+NODES = [(-90 + 0.1 * x, 35 + 0.1 * y) for y in range(5) for x in range(5)]
+
+
+def grid_edges():
+    edges = []
+    for node, (lon, lat) in enumerate(NODES):
+        for neighbour in (node + 1 if node % 5 < 4 else None, node + 5 if node < 20 else None):
+            if neighbour is None:
+                continue
+            length = haversine(lon, lat, *NODES[neighbour])
+            speed = 30 if node < 5 and neighbour < 5 else 15
+            edges += [(node, neighbour, length, length / speed), (neighbour, node, length, length / speed)]
+    return edges
+
+
+class RouteGraphTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        handle, cls.path = tempfile.mkstemp(suffix=".bin")
+        os.close(handle)
+        write_graph(cls.path, NODES, grid_edges())
+        cls.graph = RouteGraph(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.path)
+        super().tearDownClass()
+
+    def test_header_holds_the_fastest_edge_speed(self):
+        self.assertAlmostEqual(self.graph.max_speed, 30, places=4)
+        self.assertEqual((self.graph.node_count, self.graph.edge_count), (25, 80))
+
+    def test_snapping_finds_the_closest_node(self):
+        for lon, lat in [(-89.97, 35.02), (-89.64, 35.36), (-89.55, 35.41), (-90.2, 34.9)]:
+            closest = min(range(len(NODES)), key=lambda node: haversine(lon, lat, *NODES[node]))
+            self.assertEqual(self.graph.nearest_node(lon, lat), closest)
+
+    def test_nothing_to_snap_to_far_away(self):
+        self.assertIsNone(self.graph.nearest_node(-80, 45))
+
+    def test_fastest_path_takes_the_fast_road(self):
+        path = self.graph.shortest_path(20, 4)
+        nodes = [20] + [self.graph.targets[edge] for edge in path]
+        self.assertEqual(nodes, [20, 15, 10, 5, 0, 1, 2, 3, 4])
+
+    def test_other_versions_are_rejected(self):
+        with open(self.path, "rb") as graph_file:
+            data = bytearray(graph_file.read())
+        struct.pack_into("<I", data, 4, 1)
+        handle, old_path = tempfile.mkstemp(suffix=".bin")
+        with os.fdopen(handle, "wb") as old_file:
+            old_file.write(data)
+        self.addCleanup(os.remove, old_path)
+        with self.assertRaisesMessage(RouteGraphError, "rebuild it"):
+            RouteGraph(old_path)
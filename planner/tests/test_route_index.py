@@ -0,0 +1,42 @@
+from django.test import SimpleTestCase
+
+from planner.services.route_index import RouteIndex
+
+
+def directions(coordinates, distance, duration):
+    """Minimal ORS directions response for a leg"""
+    return {
+        "features": [{
+            "geometry": {"coordinates": coordinates},
+            "properties": {"summary": {"distance": distance, "duration": duration}},
+        }]
+    }
+
+
+TO_PICKUP = directions([[0.0, 0.0], [0.0, 1.0]], 100000, 3600)
+TO_DROPOFF = directions([[0.0, 1.0], [0.0, 2.0], [0.0, 3.0]], 200000, 7200)
+
+
+class RouteIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = RouteIndex.from_routes(TO_PICKUP, TO_DROPOFF)
+
+    def test_legs_are_indexed_end_to_end(self):
+        self.assertEqual(self.index.leg_starts, [0, 2])
+        self.assertAlmostEqual(self.index.total_distance, 300000)
+        self.assertAlmostEqual(self.index.total_time, 10800)
+
+    def test_positions_are_interpolated(self):
+        lon, lat = self.index.position_at_time(1800)
+        self.assertAlmostEqual(lat, 0.5)
+        self.assertEqual(self.index.position_at_time(0), [0.0, 0.0])
+        self.assertEqual(self.index.position_at_time(10800), [0.0, 3.0])
+
+    def test_positions_past_the_end_are_none(self):
+        self.assertIsNone(self.index.position_at_time(10801))
+        self.assertIsNone(self.index.position_at_time(-1))
+        self.assertIsNone(RouteIndex().position_at_time(0))
+
+    def test_interpolation_is_clamped(self):
+        self.assertAlmostEqual(self.index.time_at_distance(150000), 5400)
+        self.assertAlmostEqual(self.index.time_at_distance(400000), 10800)
@@ -1,6 +1,22 @@
 from django.urls import path
-from .views import TripPlannerView
+from .views import (
+    AsyncTripPlannerView,
+    FleetFeasibilityView,
+    MetricsView,
+    PlanJobDetailView,
+    PlanJobListView,
+    TripBatchPlannerView,
+    TripPlannerView,
+    TripReplanView,
+)
 
 urlpatterns = [
     path('api/spotter-planner/', TripPlannerView.as_view(), name='spotter-planner'),
+    path('api/spotter-planner/async/', AsyncTripPlannerView.as_view(), name='spotter-planner-async'),
+    path('api/spotter-planner/batch/', TripBatchPlannerView.as_view(), name='spotter-planner-batch'),
+    path('api/spotter-planner/fleet/', FleetFeasibilityView.as_view(), name='spotter-planner-fleet'),
+    path('api/spotter-planner/<int:trip_id>/replan/', TripReplanView.as_view(), name='spotter-planner-replan'),
+    path('api/spotter-planner/jobs/', PlanJobListView.as_view(), name='spotter-planner-jobs'),
+    path('api/spotter-planner/jobs/<int:job_id>/', PlanJobDetailView.as_view(), name='spotter-planner-job'),
+    path('api/metrics/', MetricsView.as_view(), name='planner-metrics'),
 ]
\ No newline at end of file
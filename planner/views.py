@@ -1,42 +1,591 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import TripInputSerializer, TripSerializer
-from .models import Trip
-from .services.route_service import RouteService
-from .services.eld_service import ELDService
+from rest_framework.utils.encoders import JSONEncoder
+from .serializers import (
+    FleetFeasibilitySerializer,
+    PlanJobSerializer,
+    PlanJobWaitSerializer,
+    RouteFormatSerializer,
+    TripBatchInputSerializer,
+    TripInputSerializer,
+    TripReplanSerializer,
+    TripSerializer,
+)
+from .models import PlanJob, Trip
+from .services.route_service import get_route_service
+from .services.route_summary import METERS_TO_MILES
+from .services.eld_service import eld_service
+from .services.geometry import haversine
+from .services.trip_routes import trip_routes
+from .services.route_format import format_trip_details
+from .services.plan_jobs import plan_job_queue
+from .services.plan_memo import (
+    IdempotencyConflict, find_plan_job, plan_input_hash, release_plan, remember_plan, reserve_plan_job
+)
+from .services import metrics
+
+ROUTE_ERROR = 'Could not calculate a route for the given locations'
+
+
+def _route_for_response(trip_details, route_format):
+    """Return the route in the format requested with ?geometry= and ?tolerance="""
+    return format_trip_details(trip_details, route_format['geometry'], route_format.get('tolerance'))
+
+
+def _stream_records(records, asynchronous=False):
+    """Stream records as newline-delimited JSON, one line per record.
+
+    ASGI servers read a synchronous iterator to the end before sending anything, so under ASGI
+    the records are produced one at a time in a worker thread instead.
+    """
+    if asynchronous:
+        return StreamingHttpResponse(_async_lines(iter(records)), content_type='application/x-ndjson')
+    lines = (json.dumps(record, cls=JSONEncoder) + '\n' for record in records)
+    return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+
+_END = object()
+
+
+async def _async_lines(records):
+    """NDJSON lines of records, each record made by sync_to_async so the event loop is never blocked"""
+    step = sync_to_async(next)
+    try:
+        while (record := await step(records, _END)) is not _END:
+            yield json.dumps(record, cls=JSONEncoder) + '\n'
+    finally:
+        # Closing the generators early releases the reserved plan job, see _remembered_log_sheets
+        close = getattr(records, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
+
+
+def _plan_records(trip, route, log_sheets, **extra):
+    """Trip record, route summary, one record per log sheet as it is generated, then the route geometry"""
+    yield dict(extra, type='trip', trip=trip)
+    yield dict(extra, type='summary', summary={
+        'total_distance': route['total_distance'],
+        'total_duration': route['total_duration'],
+        'stops': route['stops'],
+    })
+    for log_sheet in log_sheets:
+        yield dict(extra, type='log_sheet', log_sheet=log_sheet)
+
+    yield dict(extra, type='route', route={
+        'to_pickup': route['to_pickup'],
+        'pickup_to_dropoff': route['pickup_to_dropoff'],
+    })
+
+
+def _remembered_log_sheets(job, result, log_sheets):
+    """Pass streamed log sheets through, then remember the plan they complete on its reserved job"""
+    sent = []
+    try:
+        for log_sheet in log_sheets:
+            sent.append(log_sheet)
+            yield log_sheet
+    except GeneratorExit:
+        # The client went away mid-stream, the key may be retried
+        release_plan(job, 'Stream closed before the plan was sent')
+        raise
+    remember_plan(job, dict(result, log_sheets=sent))
+
+
+def _route_format(validated_data):
+    """The part of the query parameters that shapes the stored result"""
+    return {'geometry': validated_data['geometry'], 'tolerance': validated_data.get('tolerance')}
+
 
 class TripPlannerView(APIView):
     def post(self, request):
+        # ?geometry=polyline returns encoded polylines, optionally simplified to ?tolerance= meters
+        format_serializer = RouteFormatSerializer(data=request.query_params)
+        if not format_serializer.is_valid():
+            return Response(format_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
         serializer = TripInputSerializer(data=request.data)
         if serializer.is_valid():
-            # Save trip to database
-            trip_data = Trip.objects.create(
-                current_location=serializer.validated_data['current_location'],
-                pickup_location=serializer.validated_data['pickup_location'],
-                dropoff_location=serializer.validated_data['dropoff_location'],
-                current_cycle_used=serializer.validated_data['current_cycle_used']
-            )
+            route_format = _route_format(format_serializer.validated_data)
+            stream = format_serializer.validated_data['stream']
+
+            # Identical submissions and client retries are answered from the stored plan
+            input_hash = plan_input_hash(serializer.validated_data, route_format)
+            idempotency_key = request.headers.get('Idempotency-Key')
+            try:
+                with metrics.span('plan_memo'):
+                    memoized = find_plan_job(input_hash, idempotency_key)
+            except IdempotencyConflict as error:
+                return Response({'error': str(error)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if memoized is not None:
+                metrics.increment('plan_memo_hits')
+                return self._replay(memoized, stream)
+
+            # Save trip to database, with the job that takes the Idempotency-Key before the plan is computed
+            try:
+                with metrics.span('trip_insert'):
+                    job, created = reserve_plan_job(
+                        serializer.validated_data, input_hash, idempotency_key, route_format
+                    )
+            except IdempotencyConflict as error:
+                return Response({'error': str(error)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if not created:
+                # A concurrent request with the same key got there first
+                return self._replay(job, stream)
+            trip_data = job.trip
             # print(f"trip_data {trip_data}")
             # Calculate route and the ditances and time required
-            route_service = RouteService()
-            trip_details = route_service.calculate_trip_details(
+            try:
+                trip_details, route_summary = get_route_service().calculate_trip_details(
+                    serializer.validated_data['current_location'],
+                    serializer.validated_data['pickup_location'],
+                    serializer.validated_data['dropoff_location'],
+                    serializer.validated_data['current_cycle_used']
+                )
+            except Exception as error:
+                release_plan(job, str(error))
+                raise
+            if not trip_details['to_pickup'] or not trip_details['pickup_to_dropoff']:
+                # Geocoding or routing failed upstream, there is nothing to build logs from
+                release_plan(job, ROUTE_ERROR)
+                return Response({'error': ROUTE_ERROR}, status=status.HTTP_502_BAD_GATEWAY)
+            # Kept so that position updates can re-plan the trip without routing it again
+            trip_routes.save(trip_data, route_summary)
+            # Generate trip logs
+            if stream:
+                # Log sheets are generated while the response is being sent
+                log_sheets = eld_service.iter_log_sheets(
+                    trip_details,
+                    serializer.validated_data['current_cycle_used'],
+                    route_summary=route_summary
+                )
+                result = {
+                    'trip': TripSerializer(trip_data).data,
+                    'route': _route_for_response(trip_details, route_format),
+                }
+                return _stream_records(_plan_records(
+                    result['trip'], result['route'], _remembered_log_sheets(job, result, log_sheets)
+                ))
+
+            log_sheets = eld_service.generate_log_sheets(
+                trip_details,
+                serializer.validated_data['current_cycle_used'],
+                route_summary=route_summary
+            )
+
+            result = {
+                'trip': TripSerializer(trip_data).data,
+                'route': _route_for_response(trip_details, route_format),
+                'log_sheets': log_sheets
+            }
+            with metrics.span('plan_memo'):
+                remember_plan(job, result)
+            return Response(result, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def _replay(self, job, stream):
+        """Answer with a stored plan instead of computing it again"""
+        if job.status != PlanJob.DONE:
+            # Same Idempotency-Key as a job that is still being computed
+            return Response(
+                {'error': 'A request with this Idempotency-Key is still being processed', 'job': job.pk},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        headers = {'Idempotent-Replayed': 'true'}
+        if stream:
+            response = _stream_records(_plan_records(
+                job.result['trip'], job.result['route'], job.result['log_sheets']
+            ))
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        return Response(job.result, status=status.HTTP_200_OK, headers=headers)
+
+
+def _json_response(data, status_code, headers=None):
+    return JsonResponse(data, status=status_code, headers=headers, encoder=JSONEncoder, safe=False)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncTripPlannerView(View):
+    """Same contract as TripPlannerView, served natively async so waiting on ORS holds no thread.
+
+    DRF views are synchronous, so this is a plain Django view that reuses the DRF serializers.
+    """
+
+    async def post(self, request):
+        format_serializer = RouteFormatSerializer(data=request.GET)
+        if not format_serializer.is_valid():
+            return _json_response(format_serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError as error:
+            return _json_response({'detail': f'JSON parse error - {error}'}, status.HTTP_400_BAD_REQUEST)
+
+        serializer = TripInputSerializer(data=data)
+        if not serializer.is_valid():
+            return _json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        route_format = _route_format(format_serializer.validated_data)
+        stream = format_serializer.validated_data['stream']
+
+        input_hash = plan_input_hash(serializer.validated_data, route_format)
+        idempotency_key = request.headers.get('Idempotency-Key')
+        try:
+            with metrics.span('plan_memo'):
+                memoized = await sync_to_async(find_plan_job)(input_hash, idempotency_key)
+        except IdempotencyConflict as error:
+            return _json_response({'error': str(error)}, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if memoized is not None:
+            metrics.increment('plan_memo_hits')
+            return self._replay(memoized, stream)
+
+        try:
+            with metrics.span('trip_insert'):
+                job, created = await sync_to_async(reserve_plan_job)(
+                    serializer.validated_data, input_hash, idempotency_key, route_format
+                )
+        except IdempotencyConflict as error:
+            return _json_response({'error': str(error)}, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if not created:
+            return self._replay(job, stream)
+        trip_data = job.trip
+        try:
+            trip_details, route_summary = await get_route_service().acalculate_trip_details(
                 serializer.validated_data['current_location'],
                 serializer.validated_data['pickup_location'],
                 serializer.validated_data['dropoff_location'],
                 serializer.validated_data['current_cycle_used']
             )
-            # Generate trip logs
-            eld_service = ELDService()
-            log_sheets = eld_service.generate_log_sheets(
+        except Exception as error:
+            await sync_to_async(release_plan)(job, str(error))
+            raise
+        if not trip_details['to_pickup'] or not trip_details['pickup_to_dropoff']:
+            await sync_to_async(release_plan)(job, ROUTE_ERROR)
+            return _json_response({'error': ROUTE_ERROR}, status.HTTP_502_BAD_GATEWAY)
+        await sync_to_async(trip_routes.save)(trip_data, route_summary)
+
+        if stream:
+            log_sheets = eld_service.iter_log_sheets(
                 trip_details,
-                serializer.validated_data['current_cycle_used']
+                serializer.validated_data['current_cycle_used'],
+                route_summary=route_summary
             )
-            
-            return Response({
+            result = {
                 'trip': TripSerializer(trip_data).data,
-                'route': trip_details,
+                'route': _route_for_response(trip_details, route_format),
+            }
+            return _stream_records(_plan_records(
+                result['trip'], result['route'], _remembered_log_sheets(job, result, log_sheets)
+            ), asynchronous=True)
+
+        # The simulation is CPU-bound, it runs in a thread so the event loop keeps serving other requests
+        log_sheets = await asyncio.to_thread(
+            eld_service.generate_log_sheets,
+            trip_details,
+            serializer.validated_data['current_cycle_used'],
+            route_summary=route_summary
+        )
+        result = {
+            'trip': TripSerializer(trip_data).data,
+            'route': _route_for_response(trip_details, route_format),
+            'log_sheets': log_sheets
+        }
+        with metrics.span('plan_memo'):
+            await sync_to_async(remember_plan)(job, result)
+        with metrics.span('render'):
+            return _json_response(result, status.HTTP_200_OK)
+
+    def _replay(self, job, stream):
+        if job.status != PlanJob.DONE:
+            return _json_response(
+                {'error': 'A request with this Idempotency-Key is still being processed', 'job': job.pk},
+                status.HTTP_409_CONFLICT
+            )
+
+        if stream:
+            response = _stream_records(_plan_records(
+                job.result['trip'], job.result['route'], job.result['log_sheets']
+            ), asynchronous=True)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        return _json_response(job.result, status.HTTP_200_OK, headers={'Idempotent-Replayed': 'true'})
+
+
+class TripBatchPlannerView(APIView):
+    def post(self, request):
+        format_serializer = RouteFormatSerializer(data=request.query_params)
+        if not format_serializer.is_valid():
+            return Response(format_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = TripBatchInputSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        trips_data = serializer.validated_data['trips']
+        # Identical addresses and legs are looked up once for the whole batch
+        planned_trips = get_route_service().calculate_batch_trip_details(trips_data)
+
+        # One INSERT for every trip in the batch
+        with metrics.span('trip_insert'):
+            trips = Trip.objects.bulk_create([Trip(**trip_data) for trip_data in trips_data])
+        trip_routes.save_many(
+            (trip, route_summary) for trip, (_, route_summary) in zip(trips, planned_trips)
+        )
+
+        if format_serializer.validated_data['stream']:
+            return _stream_records(self._stream_batch(
+                trips, trips_data, planned_trips, format_serializer.validated_data
+            ), asynchronous=isinstance(request._request, ASGIRequest))
+
+        results = []
+        for trip, trip_data, (trip_details, route_summary) in zip(trips, trips_data, planned_trips):
+            if not trip_details['to_pickup'] or not trip_details['pickup_to_dropoff']:
+                results.append({'trip': TripSerializer(trip).data, 'error': ROUTE_ERROR})
+                continue
+
+            log_sheets = eld_service.generate_log_sheets(
+                trip_details,
+                trip_data['current_cycle_used'],
+                route_summary=route_summary
+            )
+            results.append({
+                'trip': TripSerializer(trip).data,
+                'route': _route_for_response(trip_details, format_serializer.validated_data),
                 'log_sheets': log_sheets
-            }, status=status.HTTP_200_OK)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            })
+
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    def _stream_batch(self, trips, trips_data, planned_trips, route_format):
+        """Records of every trip in turn, each tagged with its position in the batch"""
+        for index, (trip, trip_data, (trip_details, route_summary)) in enumerate(
+            zip(trips, trips_data, planned_trips)
+        ):
+            if not trip_details['to_pickup'] or not trip_details['pickup_to_dropoff']:
+                yield {'index': index, 'type': 'error', 'trip': TripSerializer(trip).data, 'error': ROUTE_ERROR}
+                continue
+
+            log_sheets = eld_service.iter_log_sheets(
+                trip_details,
+                trip_data['current_cycle_used'],
+                route_summary=route_summary
+            )
+            yield from _plan_records(
+                TripSerializer(trip).data,
+                _route_for_response(trip_details, route_format),
+                log_sheets,
+                index=index
+            )
+
+
+class FleetFeasibilityView(APIView):
+    def post(self, request):
+        """Which drivers can legally reach the dropoff of a load by its deadline, and when"""
+        serializer = FleetFeasibilitySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        load = serializer.validated_data
+        drivers = load['drivers']
+        start_time = load.get('start_time') or timezone.now()
+        local_start = timezone.localtime(start_time)
+        start_minute = local_start.hour * 60 + local_start.minute
+
+        # Drivers at the same place share a lane, every distinct address and leg is looked up once.
+        # Their schedules are simulated by evaluate_drivers, so the per-trip stops are skipped
+        planned_trips = get_route_service().calculate_batch_trip_details([
+            {
+                'current_location': driver['current_location'],
+                'pickup_location': load['pickup_location'],
+                'dropoff_location': load['dropoff_location'],
+                'current_cycle_used': driver['current_cycle_used'],
+            }
+            for driver in drivers
+        ], stops=False)
+
+        results = [
+            {'driver_id': driver['driver_id'], 'feasible': False, 'error': ROUTE_ERROR} for driver in drivers
+        ]
+        lanes = {}
+        for position, (trip_details, route_summary) in enumerate(planned_trips):
+            if trip_details['to_pickup'] and trip_details['pickup_to_dropoff']:
+                lanes.setdefault(route_summary, []).append(position)
+
+        for route_summary, positions in lanes.items():
+            outcomes = eld_service.evaluate_drivers(
+                route_summary, [drivers[position] for position in positions], start_minute
+            )
+            for position, outcome in zip(positions, outcomes):
+                results[position] = self._driver_result(
+                    drivers[position], outcome, route_summary, start_time, load['deadline']
+                )
+
+        feasible = sorted(
+            (result for result in results if result['feasible']), key=lambda result: result['dropoff_arrival']
+        )
+        return Response({
+            'start_time': start_time,
+            'deadline': load['deadline'],
+            'feasible_drivers': [result['driver_id'] for result in feasible],
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+    def _driver_result(self, driver, outcome, route_summary, start_time, deadline):
+        dropoff_arrival = start_time + timedelta(minutes=outcome['dropoff_minute'])
+        return {
+            'driver_id': driver['driver_id'],
+            'feasible': dropoff_arrival <= deadline,
+            'pickup_arrival': start_time + timedelta(minutes=outcome['pickup_minute']),
+            'dropoff_arrival': dropoff_arrival,
+            'finish': start_time + timedelta(minutes=outcome['finish_minute']),
+            'total_distance': route_summary.total_distance,
+            'driving_hours': outcome['driving_minutes'] / 60,
+            'rest_periods': outcome['rest_periods'],
+            'breaks': outcome['breaks'],
+            'restarts': outcome['restarts'],
+            'fuel_stops': outcome['fuel_stops'],
+        }
+
+
+class TripReplanView(APIView):
+    def post(self, request, trip_id):
+        """Re-plan the rest of a planned trip from the driver's reported position and hours.
+
+        The stored route is reused: the position is projected onto it and only the remaining HOS
+        schedule and stops are worked out again, without any geocoding or routing.
+        """
+        serializer = TripReplanSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        trip = get_object_or_404(Trip, pk=trip_id)
+        route_summary = trip_routes.load(trip.pk)
+        if route_summary is None:
+            return Response(
+                {'error': 'This trip has no stored route to re-plan, plan it again'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        update = serializer.validated_data
+        reported_at = timezone.localtime(update.get('reported_at') or timezone.now())
+        reported_at = reported_at.replace(second=0, microsecond=0)
+        index = route_summary.index
+        pickup_vertex = index.leg_starts[1] if len(index.leg_starts) > 1 else len(index)
+        with metrics.span('replan_projection'):
+            # A leg driven back along the same road would match too, so search the leg the driver is on when known
+            if update['picked_up'] is None:
+                vertex = index.nearest_vertex(update['longitude'], update['latitude'])
+            elif update['picked_up']:
+                vertex = index.nearest_vertex(update['longitude'], update['latitude'], pickup_vertex)
+            else:
+                vertex = index.nearest_vertex(update['longitude'], update['latitude'], 0, pickup_vertex)
+            if vertex is None:
+                # e.g. picked_up on a route that has no leg after the pickup
+                return Response(
+                    {'error': 'No part of the stored route matches this update, plan the trip again'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            picked_up = vertex >= pickup_vertex
+            remaining = route_summary.remaining(vertex)
+
+        cycle_minutes, shift = eld_service.driver_state(update)
+        log_sheets, outcome = eld_service.replan(
+            remaining, cycle_minutes, reported_at, shift, picked_up, update['miles_since_fuel']
+        )
+
+        location = index.vertex_position(vertex)
+        return Response({
+            'trip': TripSerializer(trip).data,
+            'reported_at': reported_at,
+            'position': {
+                'location': location,
+                'route_miles': round(index.distances[vertex] * METERS_TO_MILES, 1),
+                'miles_off_route': round(
+                    haversine(update['longitude'], update['latitude'], *location) * METERS_TO_MILES, 2
+                ),
+                'picked_up': picked_up,
+            },
+            'remaining_distance': remaining.total_distance,
+            'remaining_duration': remaining.total_duration,
+            'pickup_arrival': (
+                None if picked_up else reported_at + timedelta(minutes=outcome['pickup_minute'])
+            ),
+            'dropoff_arrival': reported_at + timedelta(minutes=outcome['dropoff_minute']),
+            'facilities_ahead': remaining.facilities.ahead(0),
+            'log_sheets': log_sheets,
+        }, status=status.HTTP_200_OK)
+
+
+class PlanJobListView(APIView):
+    def post(self, request):
+        """Queue a trip plan and return its job straight away"""
+        format_serializer = RouteFormatSerializer(data=request.query_params)
+        if not format_serializer.is_valid():
+            return Response(format_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = TripInputSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        route_format = _route_format(format_serializer.validated_data)
+        # A retry with the same Idempotency-Key, or a recently finished identical plan, reuses its job
+        input_hash = plan_input_hash(serializer.validated_data, route_format)
+        idempotency_key = request.headers.get('Idempotency-Key')
+        try:
+            job = find_plan_job(input_hash, idempotency_key)
+        except IdempotencyConflict as error:
+            return Response({'error': str(error)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        response_status = status.HTTP_200_OK
+        if job is None:
+            try:
+                job, created = plan_job_queue.submit(
+                    serializer.validated_data, route_format, input_hash, idempotency_key
+                )
+            except IdempotencyConflict as error:
+                return Response({'error': str(error)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if created:
+                response_status = status.HTTP_202_ACCEPTED
+
+        return Response(
+            PlanJobSerializer(job).data,
+            status=response_status,
+            headers={'Location': reverse('spotter-planner-job', args=[job.pk])}
+        )
+
+
+class PlanJobDetailView(APIView):
+    def get(self, request, job_id):
+        """Return the job, waiting up to ?wait= seconds for it to finish"""
+        wait_serializer = PlanJobWaitSerializer(data=request.query_params)
+        if not wait_serializer.is_valid():
+            return Response(wait_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        job = get_object_or_404(PlanJob.objects.select_related('trip'), pk=job_id)
+        if wait_serializer.validated_data['wait'] and not job.is_finished:
+            job = plan_job_queue.wait(job, wait_serializer.validated_data['wait'])
+        return Response(PlanJobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+class MetricsView(View):
+    def get(self, request):
+        """Planner stage timings and counters of this process in the Prometheus text format"""
+        if not metrics.PLANNER_METRICS:
+            raise Http404('Metrics are disabled, set PLANNER_METRICS=True')
+        return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')